@@ -18,22 +18,24 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 
-import json
 import sys
 import time
-import uuid
 from termcolor import colored
-from watchdog.observers import Observer
 
 from mlt.commands import Command
 from mlt.event_handler import EventHandler
-from mlt.utils import config_helpers, files, progress_bar, process_helpers
+from mlt.scheduler import BuildScheduler
+from mlt.utils import (config_helpers, docker_helpers, progress_bar,
+                       process_helpers, state_helpers)
 
 
 class BuildCommand(Command):
     def __init__(self, args):
         super(BuildCommand, self).__init__(args)
         self.config = config_helpers.load_config()
+        self.state = state_helpers.load_state()
+        self._build_process = None
+        self._build_cancelled = False
 
     def action(self):
         """creates docker images
@@ -42,47 +44,83 @@ class BuildCommand(Command):
         self._watch_and_build() if self.args['--watch'] else self._build()
 
     def _build(self):
-        last_build_duration = files.fetch_action_arg(
-            'build', 'last_build_duration')
+        """builds the image and returns its name, or None if the build
+           failed or got cancelled in watch mode
+        """
+        last_build_duration = self.state.expected_duration('build')
 
         started_build_time = time.time()
 
-        container_name = "{}:{}".format(self.config['name'], uuid.uuid4())
+        # tag images by the digest of their build context, so an unchanged
+        # project maps onto an image we've already built
+        container_name = "{}:{}".format(
+            self.config['name'], docker_helpers.context_digest()[:16])
+        if docker_helpers.image_exists(container_name):
+            self.state.record_build(container_name)
+            print("Build context unchanged, using existing image {}".format(
+                container_name))
+            return container_name
+
         print("Starting build {}".format(container_name))
 
-        # Add bar
-        build_process = process_helpers.run_popen(
-            "CONTAINER_NAME={} make build".format(container_name),
-            shell=True)
-
-        progress_bar.duration_progress(
-            'Building', last_build_duration,
-            lambda: build_process.poll() is not None)
-        if build_process.poll() != 0:
-            print(colored(build_process.communicate()[0].decode("utf-8"),
-                          'red'))
+        build_progress = docker_helpers.BuildProgress()
+        # in watch mode builds get cancelled, which has to stop docker too
+        self._build_cancelled = False
+        self._build_process = build_process = \
+            process_helpers.StreamingProcess(
+                "CONTAINER_NAME={} make build".format(container_name),
+                '.build.log', shell=True, verbose=self.args['--verbose'],
+                on_line=build_progress.update,
+                process_group=self.args['--watch'])
+
+        # a progress bar would garble the live build output
+        if not self.args['--verbose']:
+            progress_bar.process_progress(
+                'Building', last_build_duration, build_process,
+                build_progress)
+        if build_process.wait() != 0:
+            if self._build_cancelled:
+                print("Build cancelled, files changed since it started")
+                return
+            if not self.args['--verbose']:
+                print(colored(build_process.output_tail(), 'red'))
+            print("Build failed, full output is in .build.log")
+            if self.args['--watch']:
+                # keep watching, the next change gets another try
+                return
             sys.exit(1)
 
         built_time = time.time()
 
-        # Write last container to file
-        with open('.build.json', 'w') as f:
-            f.write(json.dumps({
-                "last_container": container_name,
-                "last_build_duration": built_time - started_build_time
-            }))
+        self.state.record_build(
+            container_name, built_time - started_build_time,
+            image_id=docker_helpers.image_id(container_name))
 
         print("Built {}".format(container_name))
+        return container_name
+
+    def _cancel_build(self):
+        if self._build_process and self._build_process.poll() is None:
+            self._build_cancelled = True
+            self._build_process.terminate()
 
     def _watch_and_build(self):
-        event_handler = EventHandler(self._build)
-        observer = Observer()
-        observer.schedule(event_handler, './', recursive=True)
-        observer.start()
-        try:
-            while True:
-                time.sleep(1)
+        # watchdog is only needed in watch mode, so it's imported lazily
+        from mlt.watcher import Watcher
 
+        scheduler = BuildScheduler(
+            self._build,
+            cancel=self._cancel_build if self.args['--cancel-stale'] else None)
+        event_handler = EventHandler(scheduler.notify)
+        watcher = Watcher(event_handler, './',
+                          ignore_matcher=event_handler.ignore_matcher)
+        watcher.start()
+        try:
+            scheduler.run()
         except KeyboardInterrupt:
-            observer.stop()
-        observer.join()
+            # builds run in their own process group, so ctrl-c misses them
+            self._cancel_build()
+        finally:
+            scheduler.stop()
+            watcher.stop()
+        watcher.join()
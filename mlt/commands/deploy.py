@@ -17,46 +17,99 @@
 #
 # SPDX-License-Identifier: EPL-2.0
 #
+
+from __future__ import print_function
+
 import json
 import os
+import socket
 import sys
 import time
 import uuid
 import yaml
 from string import Template
-from subprocess import Popen, PIPE
 from termcolor import colored
 
+try:
+    # python 3
+    from http.client import HTTPException
+except ImportError:
+    # python 2
+    from httplib import HTTPException
+
 from mlt.commands import Command
-from mlt.utils import (build_helpers, config_helpers, files,
-                       kubernetes_helpers, progress_bar, process_helpers)
+from mlt.task_graph import TaskGraph
+from mlt.utils import (build_helpers, change_helpers, config_helpers,
+                       constants, docker_api, docker_helpers,
+                       kubernetes_helpers, progress_bar, process_helpers,
+                       registry_helpers, state_helpers, sweep_helpers)
+
+# the C yaml parser, where pyyaml was built with it, is much faster at
+# parsing the many manifests of a sweep
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 
 class DeployCommand(Command):
     def __init__(self, args):
         super(DeployCommand, self).__init__(args)
         self.config = config_helpers.load_config()
-        build_helpers.verify_build(self.args)
+        self.state = state_helpers.load_state()
+        # (run id, kinds) of what the last watch cycle applied
+        self._cycle_run = None
+        # in watch mode the first cycle of the pipeline builds
+        if not self.args['--watch']:
+            build_helpers.verify_build(self.args)
 
     def action(self):
-        skip_crd_check = self.args['--skip-crd-check']
-        if not skip_crd_check:
-            kubernetes_helpers.check_crds(exit_on_failure=True)
+        if self.args['--watch']:
+            self._watch_and_deploy()
+            return
 
+        self.started_deploy_time = time.time()
+        # only apply depends on the rest, which runs side by side
+        graph = TaskGraph()
+        if not self.args['--skip-crd-check']:
+            graph.add('crds', lambda: kubernetes_helpers.check_crds(
+                exit_on_failure=True))
         if self.args['--no-push']:
             print("Skipping image push")
+            remote_container_name = None
         else:
-            self._push()
-
-        self._deploy_new_container()
-
-    def _push(self):
-        last_push_duration = files.fetch_action_arg(
-            'push', 'last_push_duration')
-        self.container_name = files.fetch_action_arg(
-            'build', 'last_container')
+            graph.add('push', self._push)
+            # known up front, so the templates needn't wait for the push
+            self.container_name = self.state.last_build()['image']
+            remote_container_name = self._remote_container_name()
+        graph.add('namespace', lambda: kubernetes_helpers.
+                  ensure_namespace_exists(self.config['namespace']))
+        if self.args['--sweep']:
+            render, apply = self._render_sweep, self._submit_sweep
+        else:
+            render, apply = (self._render_templates,
+                             self._apply_rendered_templates)
+        graph.add('render', lambda: render(remote_container_name))
+        graph.add('apply', apply, after=graph.tasks())
+        graph.run()
+        print(graph.report())
+        self._connect_interactively()
+
+    def _push(self, container_name=None):
+        """pushes the given image, or the last one built"""
+        last_push_duration = self.state.expected_duration('push')
+        self.container_name = container_name or \
+            self.state.last_build()['image']
 
         self.started_push_time = time.time()
+        self.remote_container_name = self._remote_container_name()
+        if registry_helpers.has_image(self.remote_container_name,
+                                      self.container_name):
+            # later `--no-push` deploys still go for this image
+            self.state.record_push(self.container_name,
+                                   self.remote_container_name)
+            print("{} is already in the registry, skipping push".format(
+                self.remote_container_name))
+            return
+
+        self.push_progress = docker_helpers.PushProgress()
         # TODO: unify these commands by factoring out docker command
         # based on config
         if 'gceProject' in self.config:
@@ -64,64 +117,99 @@ class DeployCommand(Command):
         else:
             self._push_docker()
 
-        progress_bar.duration_progress(
-            'Pushing ', last_push_duration,
-            lambda: self.push_process.poll() is not None)
-        if self.push_process.poll() != 0:
-            push_error = self.push_process.communicate()
-            print(colored(push_error[0], 'red'))
-            print(colored(push_error[1], 'red'))
+        # in watch mode a build may be drawing its progress bar right now
+        if not self.args['--watch']:
+            progress_bar.process_progress(
+                'Pushing ', last_push_duration, self.push_process,
+                self.push_progress)
+        if self.push_process.wait() != 0:
+            print(colored(self.push_process.output_tail(), 'red'))
+            print("Push failed, full output is in .push.log")
             sys.exit(1)
 
-        with open('.push.json', 'w') as f:
-            f.write(json.dumps({
-                "last_remote_container": self.remote_container_name,
-                "last_push_duration": time.time() - self.started_push_time
-            }))
+        self.state.record_push(
+            self.container_name, self.remote_container_name,
+            time.time() - self.started_push_time,
+            digest=self.push_progress.digest)
+        pushed = self.push_progress.bytes_pushed()
+        if pushed:
+            print("Pushed to {} ({:.1f} MB at {:.1f} MB/s)".format(
+                self.remote_container_name, pushed / 1e6,
+                self.push_progress.throughput() / 1e6))
+        else:
+            print("Pushed to {}".format(self.remote_container_name))
 
-        print("Pushed to {}".format(self.remote_container_name))
+    def _remote_container_name(self):
+        if 'gceProject' in self.config:
+            return "gcr.io/{}/{}".format(
+                self.config['gceProject'], self.container_name)
+        return "{}/{}".format(self.config['registry'], self.container_name)
 
     def _push_gke(self):
-        self.remote_container_name = "gcr.io/{}/{}".format(
-            self.config['gceProject'], self.container_name)
         self._tag()
-        self.push_process = Popen(["gcloud", "docker", "--", "push",
-                                   self.remote_container_name],
-                                  stdout=PIPE, stderr=PIPE)
+        self.push_process = process_helpers.StreamingProcess(
+            ["gcloud", "docker", "--", "push", self.remote_container_name],
+            '.push.log', on_line=self.push_progress.update)
 
     def _push_docker(self):
-        self.remote_container_name = "{}/{}".format(
-            self.config['registry'], self.container_name)
+        # the engine api reports bytes pushed, where the cli's output
+        # without a terminal only tells which layers are done
+        client = docker_api.get_client()
+        auth = registry_helpers.push_auth(self.remote_container_name) \
+            if client else None
+        if auth is not None:
+            try:
+                client.tag(self.container_name,
+                           *docker_api.split_tag(self.remote_container_name))
+            except (docker_api.DockerError, HTTPException, socket.error):
+                # the cli below reports the problem, if it persists
+                pass
+            else:
+                self.push_process = docker_api.PushStream(
+                    client, self.remote_container_name, auth, '.push.log',
+                    on_message=self.push_progress.update_message)
+                return
+
         self._tag()
-        self.push_process = Popen(
-            ["docker", "push", self.remote_container_name],
-            stdout=PIPE, stderr=PIPE)
+        self.push_process = process_helpers.StreamingProcess(
+            ["docker", "push", self.remote_container_name], '.push.log',
+            on_line=self.push_progress.update)
 
     def _tag(self):
         process_helpers.run(
             ["docker", "tag", self.container_name, self.remote_container_name])
 
-    def _deploy_new_container(self):
+    def _deploy_new_container(self, remote_container_name=None):
         """Substitutes image, app, run data into k8s-template selected.
            Can also launch user into interactive shell with --interactive flag
+           Deploys the last pushed image unless given another one.
+        """
+        self._render_templates(remote_container_name)
+        kubernetes_helpers.ensure_namespace_exists(self.namespace)
+        self._apply_rendered_templates()
+        self._connect_interactively()
+
+    def _render_templates(self, remote_container_name=None):
+        """renders `k8s-templates` into `k8s` for the given image, or the
+           last pushed one
         """
         app_name = self.config['name']
         self.namespace = self.config['namespace']
-        remote_container_name = files.fetch_action_arg(
-            'push', 'last_remote_container')
-        if remote_container_name is None:
-            raise ValueError("No image found to deploy with. Run a plain "
-                             "`mlt deploy` to fix this. Most common reason "
-                             "for this is a --no-push was used before "
-                             "any image was available to use.")
+        remote_container_name = self._image_to_deploy(remote_container_name)
 
         print("Deploying {}".format(remote_container_name))
-        kubernetes_helpers.ensure_namespace_exists(self.namespace)
+        self.deployed_container_name = remote_container_name
 
         # do template substitution across everything in `k8s-templates` dir
         # replaces things with $ with the vars from template.substitute
         # also patches deployment if interactive mode is set
+        # every object of this deploy is labelled with the same run id, so
+        # its pods can be found by label rather than by listing them all
+        self.run_id = str(uuid.uuid4())
+        labels = {constants.APP_LABEL: app_name,
+                  constants.RUN_LABEL: self.run_id}
         self.interactive_deployment_found = False
+        rendered_filenames = []
         for path, dirs, filenames in os.walk("k8s-templates"):
             self.file_count = len(filenames)
             for filename in filenames:
@@ -129,22 +217,130 @@ class DeployCommand(Command):
                     template = Template(f.read())
                 out = template.substitute(
                     image=remote_container_name,
-                    app=app_name, run=str(uuid.uuid4()),
+                    app=app_name, run=self.run_id,
                     **config_helpers.get_template_parameters(self.config))
+                objects = [obj for obj in yaml.safe_load_all(out) if obj]
+                kubernetes_helpers.add_labels(objects, labels)
+
+                interactive, objects = \
+                    self._check_for_interactive_deployment(objects, filename)
+                self._write_template(objects, filename)
+                rendered_filenames.append(filename)
+        self.rendered_filenames = rendered_filenames
+
+    def _image_to_deploy(self, remote_container_name=None):
+        if remote_container_name is None and self.state.last_push():
+            remote_container_name = self.state.last_push()['remote_image']
+        if remote_container_name is None:
+            raise ValueError("No image found to deploy with. Run a plain "
+                             "`mlt deploy` to fix this. Most common reason "
+                             "for this is a --no-push was used before "
+                             "any image was available to use.")
+        return remote_container_name
 
-                interactive, out = self._check_for_interactive_deployment(
-                    out, filename)
-                self._apply_template(out, filename)
-                if interactive:
-                    interactive_podname = self._get_most_recent_podname()
-
-            print("\nInspect created objects by running:\n"
-                  "$ kubectl get --namespace={} all\n".format(self.namespace))
+    def _render_sweep(self, remote_container_name=None):
+        """renders `k8s-templates` in memory, once for every trial of the
+           sweep. Each run gets a run id of its own and the id of the
+           sweep as labels, and its parameters as an annotation.
+        """
+        trials = sweep_helpers.load_sweep(self.args['--sweep'])
+        self.namespace = self.config['namespace']
+        self.interactive_deployment_found = False
+        remote_container_name = self._image_to_deploy(remote_container_name)
+        self.deployed_container_name = remote_container_name
+        self.sweep_id = str(uuid.uuid4())
+        print("Deploying {} runs of {}".format(
+            len(trials), remote_container_name))
+
+        runs = self._render_runs(remote_container_name, trials,
+                                 {constants.SWEEP_LABEL: self.sweep_id})
+        self.sweep_run_ids = [run_id for run_id, _ in runs]
+        self.sweep_objects = [obj for _, objects in runs for obj in objects]
+
+    def _render_runs(self, remote_container_name, trials, labels=None):
+        """renders `k8s-templates` in memory for every set of template
+           parameters in `trials`, and returns (run id, objects) for each
+        """
+        app_name = self.config['name']
+        # read once, substituted for every trial
+        templates = []
+        for path, dirs, filenames in os.walk("k8s-templates"):
+            for filename in filenames:
+                with open(os.path.join(path, filename)) as f:
+                    templates.append(Template(f.read()))
+
+        parameters = config_helpers.get_template_parameters(self.config)
+        runs = []
+        for trial in trials:
+            run_id = str(uuid.uuid4())
+            run_labels = dict(labels or {}, **{
+                constants.APP_LABEL: app_name, constants.RUN_LABEL: run_id})
+            annotations = {constants.SWEEP_PARAMETERS_ANNOTATION:
+                           json.dumps(trial, sort_keys=True)} if trial else {}
+            run_objects = []
+            for template in templates:
+                out = template.substitute(
+                    image=remote_container_name, app=app_name, run=run_id,
+                    **dict(parameters, **trial))
+                objects = [obj for obj in yaml.load_all(out, YAML_LOADER)
+                           if obj]
+                kubernetes_helpers.add_labels(objects, run_labels)
+                for obj in objects if annotations else ():
+                    obj['metadata']['annotations'] = dict(
+                        obj['metadata'].get('annotations') or {},
+                        **annotations)
+                run_objects.extend(objects)
+            runs.append((run_id, run_objects))
+        return runs
+
+    def _submit_sweep(self):
+        """sends the runs of the sweep to the cluster, a few requests at a
+           time and no faster than --rate-limit
+        """
+        started = time.time()
+        failures = kubernetes_helpers.apply_objects(
+            self.namespace, self.sweep_objects,
+            concurrency=self.args['--concurrency'],
+            rate_limit=self.args['--rate-limit'])
+        failed_runs = set(obj['metadata']['labels'][constants.RUN_LABEL]
+                          for obj, _ in failures)
+        run_ids = [run_id for run_id in self.sweep_run_ids
+                   if run_id not in failed_runs]
+        self.state.record_deploys(
+            self.deployed_container_name, run_ids, self.namespace,
+            time.time() - self.started_deploy_time)
+        print("Submitted {} of {} runs in {:.1f}s".format(
+            len(run_ids), len(self.sweep_run_ids), time.time() - started))
+        print("\nInspect created objects by running:\n"
+              "$ kubectl get --namespace={} all -l {}={}\n".format(
+                  self.namespace, constants.SWEEP_LABEL, self.sweep_id))
+        print("or follow their progress with:\n$ mlt status --watch\n")
+        if failures:
+            for obj, error in failures[:10]:
+                print(colored("{}: {}".format(
+                    obj['metadata']['name'], error), 'red'))
+            if len(failures) > 10:
+                print(colored("...and {} more".format(len(failures) - 10),
+                              'red'))
+            sys.exit(1)
 
+    def _apply_rendered_templates(self):
+        # everything is rendered first so that all of it goes to the
+        # cluster in a single kubectl call
+        self._apply_templates(self.rendered_filenames)
+        self.state.record_deploy(
+            self.deployed_container_name, self.run_id, self.namespace,
+            time.time() - self.started_deploy_time)
+        print("\nInspect created objects by running:\n"
+              "$ kubectl get --namespace={} all\n"
+              "or follow their progress with:\n"
+              "$ mlt status --watch\n".format(self.namespace))
+
+    def _connect_interactively(self):
         # After everything is deployed we'll make a kubectl exec
         # call into our debug container if interactive mode
         if self.args["--interactive"] and self.interactive_deployment_found:
-            self._exec_into_pod(interactive_podname)
+            self._exec_into_pod()
         elif not self.interactive_deployment_found and \
                 self.args['--interactive']:
             raise ValueError("Unable to find deployment to run interactively. "
@@ -169,43 +365,26 @@ class DeployCommand(Command):
                 self.interactive_deployment_found = True
         return interactive, data
 
-    def _apply_template(self, out, filename):
-        """take k8s-template data and create deployment in k8s dir"""
+    def _write_template(self, objects, filename):
+        """take k8s-template objects and write the deployment into k8s dir"""
         with open(os.path.join('k8s', filename), 'w') as f:
-            f.write(out)
-        process_helpers.run(
-            ["kubectl", "--namespace", self.namespace,
-             "apply", "-R", "-f", "k8s"])
-
-    def _get_most_recent_podname(self):
-        """don't know of a better way to do this; grab the pod
-           created by the job we just deployed
-           this gets the most recent pod by name, so we can exec
-           into it once everything is done deploying
-        """
-        pod = process_helpers.run_popen(
-            "kubectl get pods --namespace {} ".format(
-                self.namespace) +
-            "--sort-by=.status.startTime", shell=True
-        ).stdout.read().decode('utf-8').strip().splitlines()
-        if pod:
-            # we want last pod listed, podname is always first
-            return pod[-1].split()[0]
-        else:
-            raise ValueError(
-                "No pods found in namespace: {}".format(
-                    self.namespace))
+            yaml.safe_dump_all(objects, f, default_flow_style=False)
+
+    def _apply_templates(self, filenames):
+        """create everything we just rendered with one `kubectl apply`"""
+        if not filenames:
+            return
+        kubernetes_helpers.apply_files(
+            self.namespace, [os.path.join('k8s', f) for f in filenames])
 
     def _patch_template_spec(self, data):
-        """Makes `command` of template yaml `sleep infinity`.
+        """Makes `command` of template objects `sleep infinity`.
            We will also add a `debug=true` label onto this pod for easy
            discovery later.
            # NOTE: for now we only support basic functionality. Only 1
            container in a deployment for now. If there is > 1 container,
            we'll interactively deploy first one we find.
         """
-        data = yaml.load(data)
-
         # references to locations in `data` that contain template and
         # containers locations. This saves calling recursive function
         # twice; once we find a location we store that and move on
@@ -218,11 +397,12 @@ class DeployCommand(Command):
                              "spec. Unable to deploy interactively without "
                              "these.")
 
-        self.template_location['metadata'] = {'labels': {'debug': 'true'}}
+        metadata = self.template_location.setdefault('metadata', {})
+        metadata.setdefault('labels', {})['debug'] = 'true'
         self.containers_location[0].update(
             {'command':
              ["/bin/bash", "-c", "trap : TERM INT; sleep infinity & wait"]})
-        return json.dumps(data)
+        return data
 
     def _find_metadata_and_container_spec(self, data):
         """recursively finds `metadata` and `containers` location in
@@ -249,39 +429,127 @@ class DeployCommand(Command):
             for elem in data:
                 self._find_metadata_and_container_spec(elem)
 
-    def _exec_into_pod(self, podname):
-        """wait til pod comes up and then exec into it"""
+    def _exec_into_pod(self):
+        """wait til the debug pod of this run comes up and then exec into it
+        """
         print("Connecting to pod...")
-        tries = 0
-        while True:
-            pod = process_helpers.run_popen(
-                "kubectl get pods --namespace {} {} -o json".format(
-                    self.namespace, podname),
-                shell=True).stdout.read().decode('utf-8')
-            if not pod:
-                continue
-
-            # check if pod is in running state
-            # gcr stores an auth token which could be returned as part
-            # of the pod json data
-            pod = json.loads(pod)
-            if pod.get('items') or pod.get('status'):
-                # if there's more than 1 thing returned, we have
-                # `pod['items']['status']` otherwise we will always have
-                # `pod['status'], so by the second if below we're safe
-                # first item is what we care about (or only item)
-                if pod.get('items'):
-                    pod = pod['items'][0]
-                if pod['status']['phase'] == 'Running':
-                    break
-
-            if tries == self.args['--retries']:
-                raise ValueError("Pod {} not Running".format(podname))
-            tries += 1
-            print("Retrying {}/{}".format(
-                tries, self.args['--retries']))
-            time.sleep(1)
+        podname = kubernetes_helpers.wait_for_pod_running(
+            self.namespace, self.args['--timeout'],
+            label_selector='{}={},debug=true'.format(
+                constants.RUN_LABEL, self.run_id))
 
         process_helpers.run_popen(
-            ["kubectl", "exec", "-it", podname,
-             "/bin/bash"], stdout=None, stderr=None).wait()
+            ["kubectl", "exec", "--namespace", self.namespace, "-it",
+             podname, "/bin/bash"], stdout=None, stderr=None).wait()
+
+    def _watch_and_deploy(self):
+        """builds, pushes and applies on every change. Each of these runs
+           on its own, so a new build can start while the previous image is
+           still being pushed; a stage only ever picks up the newest
+           cycle waiting for it, skipping the ones made stale meanwhile.
+           Changes that don't go into the image, like edits of templates or
+           template parameters, only re-render and apply.
+        """
+        # watchdog is only needed in watch mode, so it's imported lazily
+        from mlt.commands.build import BuildCommand
+        from mlt.event_handler import EventHandler
+        from mlt.pipeline import Cycle, pipeline
+        from mlt.scheduler import BuildScheduler
+        from mlt.watcher import Watcher
+
+        if not self.args['--skip-crd-check']:
+            kubernetes_helpers.check_crds(exit_on_failure=True)
+
+        builder = BuildCommand(self.args)
+        classifier = change_helpers.ChangeClassifier()
+        push_stage = pipeline([('push', self._push_cycle),
+                               ('apply', self._apply_cycle),
+                               ('start', self._start_cycle)],
+                              done=lambda cycle: print(cycle.report()))
+        cycles = []
+
+        def build():
+            changes = classifier.classify(scheduler.changed_paths)
+            if not changes:
+                return
+            # mlt.json may have changed, e.g. its template parameters
+            self.config = builder.config = config_helpers.load_config()
+            cycle = Cycle(len(cycles) + 1, scheduler.changed_at)
+            cycles.append(cycle)
+            if change_helpers.IMAGE not in changes and \
+                    self.state.last_push():
+                print("Only templates changed, redeploying the last image")
+                push_stage.next_stage.submit(cycle)
+                return
+
+            started = time.time()
+            cycle.data['image'] = builder._build()
+            cycle.timings['build'] = time.time() - started
+            if cycle.data['image']:
+                push_stage.submit(cycle)
+
+        scheduler = BuildScheduler(
+            build, cancel=builder._cancel_build
+            if self.args['--cancel-stale'] else None)
+        # templates and mlt.json are usually ignored by git and docker,
+        # but they matter for what we deploy
+        event_handler = EventHandler(
+            scheduler.notify,
+            watched=(change_helpers.TEMPLATES_DIR, constants.MLT_CONFIG))
+        watcher = Watcher(event_handler, './',
+                          ignore_matcher=event_handler.ignore_matcher)
+        watcher.start()
+        # bring the cluster up to date with the tree before any edits
+        scheduler.notify()
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            builder._cancel_build()
+        finally:
+            scheduler.stop()
+            watcher.stop()
+            push_stage.stop()
+        watcher.join()
+
+    def _push_cycle(self, cycle):
+        self._push(cycle.data['image'])
+        cycle.data['remote_image'] = self.remote_container_name
+
+    def _apply_cycle(self, cycle):
+        """replaces the run of the previous cycle with a new one, so runs
+           don't pile up over a watch session
+        """
+        # cycles without an image of their own get the last one pushed
+        self.started_deploy_time = time.time()
+        self._render_templates(cycle.data.get('remote_image'))
+        kubernetes_helpers.ensure_namespace_exists(self.namespace)
+        if self._cycle_run:
+            run_id, kinds = self._cycle_run
+            selector = '{}={}'.format(constants.RUN_LABEL, run_id)
+            for api_version, kind in kinds:
+                kubernetes_helpers.delete_collection(
+                    self.namespace, api_version, kind, selector)
+        self._apply_rendered_templates()
+        self._connect_interactively()
+        # the kinds it was made of, in case the templates change meanwhile
+        kinds = []
+        for obj in kubernetes_helpers.load_objects(
+                [os.path.join('k8s', filename)
+                 for filename in self.rendered_filenames]):
+            if (obj['apiVersion'], obj['kind']) not in kinds:
+                kinds.append((obj['apiVersion'], obj['kind']))
+        self._cycle_run = (self.run_id, kinds)
+        cycle.data['run_id'] = self.run_id
+
+    def _start_cycle(self, cycle):
+        """waits for the pods of the cycle, so that the latency we report
+           is from the edit to having it running
+        """
+        try:
+            kubernetes_helpers.wait_for_pod_running(
+                self.namespace, self.args['--timeout'],
+                label_selector='{}={}'.format(
+                    constants.RUN_LABEL, cycle.data['run_id']))
+        except ValueError as e:
+            print(colored("Cycle {}: {}".format(cycle.number, e), 'red'))
+            return False
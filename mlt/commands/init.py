@@ -43,9 +43,10 @@ class InitCommand(Command):
         template_name = self.args["--template"]
         template_repo = self.args["--template-repo"]
         skip_crd_check = self.args["--skip-crd-check"]
-        with git_helpers.clone_repo(template_repo) as temp_clone:
-            templates_directory = os.path.join(
-                temp_clone, constants.TEMPLATES_DIR, template_name)
+        template_path = os.path.join(constants.TEMPLATES_DIR, template_name)
+        with git_helpers.clone_repo(template_repo,
+                                    [template_path]) as temp_clone:
+            templates_directory = os.path.join(temp_clone, template_path)
 
             try:
                 # The template configs get pulled into the mlt.json file, so
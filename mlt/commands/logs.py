@@ -0,0 +1,166 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+from __future__ import print_function
+
+import socket
+import sys
+import threading
+import time
+from termcolor import colored
+
+try:
+    # python 3
+    from http.client import HTTPException
+except ImportError:
+    # python 2
+    from httplib import HTTPException
+
+from mlt.commands import Command
+from mlt.utils import (config_helpers, constants, kubernetes_api,
+                       kubernetes_helpers, log_helpers, state_helpers,
+                       status_helpers)
+
+# seconds between attempts to read the log of a container that's
+# (re)starting
+RECONNECT_INTERVAL = 2
+COLORS = ('cyan', 'green', 'yellow', 'magenta', 'blue', 'red')
+
+
+class LogsCommand(Command):
+    def __init__(self, args):
+        super(LogsCommand, self).__init__(args)
+        self.config = config_helpers.load_config()
+        self.state = state_helpers.load_state()
+        self.namespace = self.config['namespace']
+        self.follow = self.args['--follow']
+        self.replica_type = (self.args['--replica-type'] or '').lower()
+        self.merger = log_helpers.LogMerger(
+            lag=log_helpers.FOLLOW_LAG if self.follow else None)
+        # (pod, container) to the prefix of its lines
+        self._logs = {}
+        self._lock = threading.Lock()
+
+    def action(self):
+        """prints the logs of every pod of the last run, side by side in
+           the order they were written; with --follow as they are written
+        """
+        deploy = self.state.last_deploy()
+        if not deploy:
+            print(colored("No run to show the logs of, deploy one first",
+                          'red'))
+            sys.exit(1)
+
+        events = kubernetes_helpers.watch_pods(self.namespace, '{}={}'.format(
+            constants.RUN_LABEL, deploy['run_id']))
+        self._read_pods(next(events)['items'])
+        if not self._logs:
+            print("No pods of run {} have started yet".format(
+                deploy['run_id']))
+            if not self.follow:
+                return
+
+        if self.follow:
+            def watch():
+                for event in events:
+                    if event['type'] == 'SYNC':
+                        self._read_pods(event['items'])
+                    elif event['type'] != 'DELETED':
+                        self._read_pods([event['object']])
+
+            watcher = threading.Thread(target=watch)
+            watcher.daemon = True
+            watcher.start()
+        self._write()
+
+    def _write(self):
+        width = 0
+        while True:
+            item = self.merger.get()
+            if item is log_helpers.END:
+                if not self.follow or self._logs:
+                    return
+                # no pod has started yet
+                time.sleep(1.0)
+            elif item is None:
+                sys.stdout.flush()
+            else:
+                (prefix, color), line = item
+                width = max(width, len(prefix))
+                print(colored(prefix.ljust(width), color) + ' | ' + line)
+
+    def _read_pods(self, pods):
+        """starts reading the containers of `pods` we aren't reading yet"""
+        for pod in pods:
+            if self.replica_type and \
+                    status_helpers.replica_type(pod) != self.replica_type:
+                continue
+            if (pod.get('status') or {}).get('phase') in (None, 'Pending'):
+                # nothing to read until its containers have started
+                continue
+            name = pod['metadata']['name']
+            containers = [c['name'] for c in pod['spec']['containers']]
+            for container in containers:
+                with self._lock:
+                    if (name, container) in self._logs:
+                        continue
+                    prefix = name if len(containers) == 1 else \
+                        '{}/{}'.format(name, container)
+                    log = (prefix, COLORS[len(self._logs) % len(COLORS)])
+                    self._logs[name, container] = log
+                self.merger.open(log)
+                reader = threading.Thread(
+                    target=self._read, args=(name, container, log))
+                reader.daemon = True
+                reader.start()
+
+    def _read(self, name, container, log):
+        """reads the log of a container into the merger; when following,
+           picks it up again where it left off after the container restarts,
+           until the pod is done
+        """
+        last_key = since_time = None
+        try:
+            while True:
+                try:
+                    for line in kubernetes_helpers.stream_log(
+                            self.namespace, name, container, self.follow,
+                            since_time):
+                        key, message = log_helpers.split_timestamp(line)
+                        # sinceTime is inclusive, and only to the second
+                        if last_key is not None and key <= last_key:
+                            continue
+                        last_key = key
+                        since_time = line.split(' ', 1)[0]
+                        self.merger.put(log, key, message)
+                except (kubernetes_api.KubernetesError, HTTPException,
+                        socket.error) as e:
+                    if not self.follow:
+                        print(colored("{}: {}".format(log[0], e), 'red'))
+                if not self.follow or self._finished(name):
+                    return
+                time.sleep(RECONNECT_INTERVAL)
+        finally:
+            self.merger.close(log)
+
+    def _finished(self, name):
+        pod = kubernetes_helpers.get_pod(self.namespace, name)
+        return pod is None or \
+            (pod.get('status') or {}).get('phase') in ('Succeeded', 'Failed')
@@ -0,0 +1,240 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import time
+import uuid
+from termcolor import colored
+
+from mlt.commands import Command
+from mlt.commands.deploy import DeployCommand
+from mlt.utils import (capacity_helpers, config_helpers, constants,
+                       kubernetes_helpers, state_helpers, sweep_helpers)
+
+# seconds between listings of the cluster's nodes and pods, which catch
+# room freed by others; our own pods are watched in between, and the
+# namespace's quotas read again before every submission
+RESYNC_INTERVAL = 30
+# seconds the room of a submitted run is held for it while its pods
+# are being created
+RESERVATION_TIMEOUT = 120
+# runs sent to the cluster at once
+SUBMIT_CONCURRENCY = 10
+
+
+class QueueCommand(Command):
+    """Queues rendered runs locally, and submits them as the cluster gets
+       room for them, so they don't sit in Pending churning the scheduler
+    """
+
+    def __init__(self, args):
+        super(QueueCommand, self).__init__(args)
+        self.config = config_helpers.load_config()
+        self.state = state_helpers.load_state()
+        self.namespace = self.config['namespace']
+        self._last_message = None
+
+    def action(self):
+        if self.args['add']:
+            self._add()
+        elif self.args['run']:
+            self._run()
+        elif self.args['clear']:
+            print("Removed {} waiting runs".format(self.state.clear_queue()))
+        else:
+            self._list()
+
+    def _add(self):
+        """builds, pushes and renders like `mlt deploy` does, but queues
+           the runs instead of applying them
+        """
+        deploy = DeployCommand(self.args)
+        if not self.args['--skip-crd-check']:
+            kubernetes_helpers.check_crds(exit_on_failure=True)
+        remote_container_name = None
+        if not self.args['--no-push']:
+            deploy._push()
+            remote_container_name = deploy.remote_container_name
+        remote_container_name = deploy._image_to_deploy(
+            remote_container_name)
+
+        if self.args['--sweep']:
+            trials = sweep_helpers.load_sweep(self.args['--sweep'])
+            labels = {constants.SWEEP_LABEL: str(uuid.uuid4())}
+        else:
+            trials, labels = [{}], None
+        runs = deploy._render_runs(remote_container_name, trials, labels)
+        self.state.enqueue(
+            remote_container_name, self.namespace,
+            [(run_id, objects, capacity_helpers.run_demand(objects))
+             for run_id, objects in runs])
+        print("Queued {} runs of {}, `mlt queue run` submits them".format(
+            len(runs), remote_container_name))
+
+    def _list(self):
+        # tabulate is only needed here, so it's imported lazily
+        from tabulate import tabulate
+
+        print(tabulate(
+            [[run['run_id'], run['status'],
+              capacity_helpers.format_demand(run['demand']),
+              time.strftime('%Y-%m-%d %H:%M:%S',
+                            time.localtime(run['created']))]
+             for run in self.state.queued_runs()],
+            headers=['Run', 'Status', 'Requests', 'Queued'],
+            tablefmt="simple"))
+
+    def _run(self):
+        """submits waiting runs, oldest first, as long as the next one fits
+           in what the cluster has left. Our pods are followed through a
+           watch, so the next run goes out as soon as one finishes.
+           Returns once every run of the queue has been submitted.
+        """
+        kubernetes_helpers.ensure_namespace_exists(self.namespace)
+        selector = '{}={}'.format(constants.APP_LABEL, self.config['name'])
+        synced = 0
+        while True:
+            if time.time() - synced >= RESYNC_INTERVAL:
+                nodes = kubernetes_helpers.list_nodes()
+                others = [pod for pod in kubernetes_helpers.list_active_pods(
+                    self.namespace) if not self._is_ours(pod)]
+                synced = time.time()
+            ours = kubernetes_helpers.list_pods(self.namespace, selector)
+            self._update_statuses(ours)
+
+            waiting = self.state.queued_runs([state_helpers.QUEUED])
+            if not waiting:
+                print("All queued runs have been submitted")
+                return
+            # the quotas' usage counts the pods of our last submissions
+            # only once they exist, so it can't wait for the next resync
+            quotas = kubernetes_helpers.list_resource_quotas(self.namespace)
+            self._submit(waiting, nodes, quotas, others + ours, ours)
+            kubernetes_helpers.wait_for_pod_changes(
+                self.namespace, selector, kubernetes_helpers.pod_phases(ours),
+                max(1, RESYNC_INTERVAL - (time.time() - synced)))
+
+    def _is_ours(self, pod):
+        metadata = pod['metadata']
+        return metadata.get('namespace') == self.namespace and \
+            (metadata.get('labels') or {}).get(constants.APP_LABEL) == \
+            self.config['name']
+
+    def _update_statuses(self, pods):
+        """a submitted run is done once all of its pods have finished"""
+        by_run = {}
+        for pod in pods:
+            run_id = (pod['metadata'].get('labels') or {}).get(
+                constants.RUN_LABEL)
+            by_run.setdefault(run_id, []).append(pod)
+        for run in self.state.queued_runs([state_helpers.SUBMITTED]):
+            phases = [(pod.get('status') or {}).get('phase')
+                      for pod in by_run.get(run['run_id'], [])]
+            if phases and all(phase in ('Succeeded', 'Failed')
+                              for phase in phases):
+                status = state_helpers.FAILED if 'Failed' in phases \
+                    else state_helpers.SUCCEEDED
+                self.state.set_run_status(run['run_id'], status)
+                print("Run {} {}".format(run['run_id'], status))
+
+    def _submit(self, waiting, nodes, quotas, active_pods, ours):
+        if any(_is_unschedulable(pod) for pod in ours):
+            self._say("Waiting, pods of earlier runs can't be scheduled yet")
+            return
+
+        free = capacity_helpers.free_capacity(
+            nodes, active_pods, quotas, self._reservations(ours))
+        total = capacity_helpers.allocatable(nodes)
+        fitting = []
+        for run in waiting:
+            if not capacity_helpers.fits(run['demand'], total):
+                print(colored("Run {} needs more than the whole cluster "
+                              "has: {}".format(run['run_id'],
+                                               capacity_helpers.format_demand(
+                                                   run['demand'])), 'red'))
+                self.state.set_run_status(run['run_id'], state_helpers.FAILED)
+                continue
+            if not capacity_helpers.fits(run['demand'], free):
+                # first come, first served, so big runs don't starve
+                break
+            fitting.append(run)
+            free = capacity_helpers.subtract(free, run['demand'])
+
+        if fitting:
+            self._apply(fitting)
+        left = len(waiting) - len(fitting)
+        if left:
+            self._say("{} runs waiting for room on the cluster".format(left))
+
+    def _apply(self, runs):
+        failures = kubernetes_helpers.apply_objects(
+            self.namespace, [obj for run in runs for obj in run['objects']],
+            concurrency=SUBMIT_CONCURRENCY)
+        failed_runs = {}
+        for obj, error in failures:
+            failed_runs[obj['metadata']['labels'][constants.RUN_LABEL]] = \
+                error
+        for run in runs:
+            if run['run_id'] in failed_runs:
+                print(colored("Run {} failed to submit: {}".format(
+                    run['run_id'], failed_runs[run['run_id']]), 'red'))
+                self.state.set_run_status(run['run_id'], state_helpers.FAILED)
+                continue
+            self.state.set_run_status(run['run_id'], state_helpers.SUBMITTED)
+            self.state.record_deploy(run['remote_image'], run['run_id'],
+                                     self.namespace)
+            print("Submitted run {} ({})".format(
+                run['run_id'], capacity_helpers.format_demand(run['demand'])))
+        self._last_message = None
+
+    def _reservations(self, ours):
+        """the part of recently submitted runs that has no pods yet, and
+           so isn't in the pods we count
+        """
+        seen = {}
+        for pod in ours:
+            run_id = (pod['metadata'].get('labels') or {}).get(
+                constants.RUN_LABEL)
+            seen[run_id] = seen.get(run_id, 0) + 1
+        reserved = []
+        for run in self.state.queued_runs([state_helpers.SUBMITTED]):
+            expected = run['demand']['pods']
+            missing = expected - seen.get(run['run_id'], 0)
+            if missing > 0 and \
+                    time.time() - run['updated'] < RESERVATION_TIMEOUT:
+                reserved.append(dict(
+                    (resource, amount * missing / expected)
+                    for resource, amount in run['demand'].items()))
+        return reserved
+
+    def _say(self, message):
+        """prints `message` unless it was the last thing we said"""
+        if message != self._last_message:
+            print(message)
+            self._last_message = message
+
+
+def _is_unschedulable(pod):
+    status = pod.get('status') or {}
+    if status.get('phase') != 'Pending':
+        return False
+    return any(condition.get('type') == 'PodScheduled' and
+               condition.get('status') == 'False' and
+               condition.get('reason') == 'Unschedulable'
+               for condition in status.get('conditions') or [])
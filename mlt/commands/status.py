@@ -0,0 +1,102 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+from __future__ import print_function
+
+import sys
+import threading
+import time
+
+from mlt.commands import Command
+from mlt.utils import (config_helpers, constants, kubernetes_helpers,
+                       status_helpers)
+
+# seconds between redraws with --watch, so a burst of events is one redraw
+REFRESH_INTERVAL = 1.0
+# clears the terminal before a redraw
+CLEAR_SCREEN = '\033[H\033[J'
+
+
+class StatusCommand(Command):
+    def __init__(self, args):
+        super(StatusCommand, self).__init__(args)
+        self.config = config_helpers.load_config()
+
+    def action(self):
+        """shows the runs of this app, found by their app label; with
+           --watch keeps the table up to date from watches on their pods
+           and on their Jobs and TFJobs
+        """
+        namespace = self.config['namespace']
+        selector = '{}={}'.format(constants.APP_LABEL, self.config['name'])
+        status = status_helpers.RunStatus()
+        watches = [(kind, kubernetes_helpers.watch_objects(
+            namespace, kind[0], kind[1], selector))
+            for kind in status_helpers.RUN_KINDS]
+        watches.append((('v1', 'Pod'), kubernetes_helpers.watch_pods(
+            namespace, selector)))
+        for kind, events in watches:
+            status.apply(next(events), *kind)
+
+        if not self.args['--watch']:
+            self._print(status)
+            return
+
+        lock = threading.Lock()
+        changed = threading.Event()
+
+        def follow(kind, events):
+            for event in events:
+                with lock:
+                    if status.apply(event, *kind):
+                        changed.set()
+
+        readers = []
+        for kind, events in watches:
+            reader = threading.Thread(target=follow, args=(kind, events))
+            reader.daemon = True
+            reader.start()
+            readers.append(reader)
+        pods_reader = readers[-1]
+        while True:
+            with lock:
+                self._print(status, clear=True)
+            # wait in short steps so that ctrl-c gets through on python 2
+            while not changed.wait(REFRESH_INTERVAL):
+                # kinds the cluster doesn't have end right away
+                if not pods_reader.is_alive():
+                    sys.exit(1)
+            changed.clear()
+            time.sleep(REFRESH_INTERVAL)
+
+    def _print(self, status, clear=False):
+        # tabulate is only needed here, so it's imported lazily
+        from tabulate import tabulate
+
+        rows = status.rows()
+        if clear and sys.stdout.isatty():
+            print(CLEAR_SCREEN, end='')
+        if not rows:
+            print("No runs of {} in namespace {}".format(
+                self.config['name'], self.config['namespace']))
+            return
+        print(tabulate(rows, headers=status_helpers.HEADERS,
+                       tablefmt="simple"))
+        sys.stdout.flush()
@@ -18,39 +18,18 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 
-import os
 from tabulate import tabulate
 
 from mlt.commands import Command
-from mlt.utils import git_helpers
-from mlt.utils.constants import TEMPLATES_DIR
+from mlt.utils import template_helpers
 
 
 class TemplatesCommand(Command):
     def action(self):
         """lists templates available"""
-        template_repo = self.args["--template-repo"]
-        with git_helpers.clone_repo(template_repo) as temp_clone:
-            templates_directory = os.path.join(temp_clone, TEMPLATES_DIR)
-            templates = self._parse_templates(templates_directory)
-        print(tabulate(templates,
+        templates = template_helpers.template_catalog(
+            self.args["--template-repo"])
+        print(tabulate([[template['name'], template['description']]
+                        for template in templates],
                        headers=['Template', 'Description'],
                        tablefmt="simple"))
-
-    def _parse_templates(self, templates_directory):
-        """parses template dirs in sorted order, pulling data from READMEs"""
-        result = []
-        for filename in sorted(os.listdir(templates_directory)):
-            description = '<none>'
-            readme_file = os.path.join(
-                templates_directory, filename, "README.md")
-            if os.path.isfile(readme_file):
-                with open(readme_file) as f:
-                    for line in f:
-                        line = line.strip()
-                        if not line or line[0] == '#':
-                            continue
-                        description = line
-                        break
-                result.append([filename, description])
-        return result
@@ -18,8 +18,18 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 
+from __future__ import print_function
+
+import calendar
+import os
+import time
+
 from mlt.commands import Command
-from mlt.utils import config_helpers, process_helpers
+from mlt.utils import (config_helpers, constants, kubernetes_helpers,
+                       status_helpers)
+
+# run ids per label selector, which has to fit in a url
+RUNS_PER_DELETE = 100
 
 
 class UndeployCommand(Command):
@@ -28,7 +38,74 @@ class UndeployCommand(Command):
         self.config = config_helpers.load_config()
 
     def action(self):
-        """deletes current kubernetes namespace"""
+        """deletes the objects of the last deploy, or with --all,
+           --older-than or --keep, those of many runs by their labels
+        """
         namespace = self.config['namespace']
-        process_helpers.run(
-            ["kubectl", "--namespace", namespace, "delete", "-f", "k8s"])
+        if not (self.args['--all'] or
+                self.args['--older-than'] is not None or
+                self.args['--keep'] is not None):
+            kubernetes_helpers.delete_files(namespace, "k8s")
+            return
+
+        app_selector = '{}={}'.format(constants.APP_LABEL,
+                                      self.config['name'])
+        kinds = self._kinds()
+        if self.args['--all']:
+            selectors = [app_selector]
+            description = "all runs"
+        else:
+            run_ids = self._runs_to_delete(namespace, app_selector, kinds)
+            if not run_ids:
+                print("No runs of {} to delete".format(self.config['name']))
+                return
+            selectors = ['{},{} in ({})'.format(
+                app_selector, constants.RUN_LABEL,
+                ','.join(run_ids[i:i + RUNS_PER_DELETE]))
+                for i in range(0, len(run_ids), RUNS_PER_DELETE)]
+            description = "{} runs".format(len(run_ids))
+
+        for selector in selectors:
+            for api_version, kind in kinds:
+                kubernetes_helpers.delete_collection(
+                    namespace, api_version, kind, selector)
+        print("Deleted {} of {} in namespace {}".format(
+            description, self.config['name'], namespace))
+
+    def _kinds(self):
+        """the kinds runs are made of: those of the rendered templates,
+           if there are any, and jobs and TFJobs
+        """
+        kinds = list(status_helpers.RUN_KINDS)
+        if os.path.isdir('k8s'):
+            filenames = [os.path.join('k8s', f)
+                         for f in sorted(os.listdir('k8s'))
+                         if f.endswith(kubernetes_helpers.MANIFEST_EXTENSIONS)]
+            for obj in kubernetes_helpers.load_objects(filenames):
+                if (obj['apiVersion'], obj['kind']) not in kinds:
+                    kinds.append((obj['apiVersion'], obj['kind']))
+        return kinds
+
+    def _runs_to_delete(self, namespace, app_selector, kinds):
+        """ids of the runs older than --older-than, or of all but the
+           newest --keep runs, going by when their objects were created
+        """
+        created = {}
+        for api_version, kind in kinds:
+            for obj in kubernetes_helpers.list_objects(
+                    namespace, api_version, kind, app_selector):
+                metadata = obj['metadata']
+                run_id = (metadata.get('labels') or {}).get(
+                    constants.RUN_LABEL)
+                timestamp = metadata.get('creationTimestamp')
+                if run_id and timestamp:
+                    created[run_id] = min(created.get(run_id, timestamp),
+                                          timestamp)
+
+        runs = sorted(created, key=lambda run_id: created[run_id],
+                      reverse=True)
+        if self.args['--keep'] is not None:
+            return runs[self.args['--keep']:]
+        cutoff = time.time() - self.args['--older-than']
+        return [run_id for run_id in runs if calendar.timegm(time.strptime(
+            created[run_id], '%Y-%m-%dT%H:%M:%SZ')) < cutoff]
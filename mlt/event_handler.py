@@ -18,32 +18,26 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 
-import os
-import time
-from subprocess import call
-from threading import Timer
+from mlt.utils.ignore_helpers import IgnoreMatcher
 
 
 class EventHandler(object):
-    def __init__(self, callback):
-        self.last_changed = time.time()
-        self.dirty = False
-        self.timer = None
+    def __init__(self, callback, watched=()):
         self.callback = callback
+        self.ignore_matcher = IgnoreMatcher('.', watched)
 
     def dispatch(self, event):
         if event.src_path in ("./.git", "./"):
             return
 
-        is_ignored = call(["git", "check-ignore", event.src_path],
-                          stdout=open(os.devnull, 'wb')) == 0
-        if is_ignored:
+        if self.ignore_matcher.is_ignore_file(event.src_path):
+            self.ignore_matcher.reload()
+        elif self.ignore_matcher.is_ignored(event.src_path,
+                                            event.is_directory):
             return
 
-        if self.timer:
-            self.timer.cancel()
-
         print("event.src_path {}".format(event.src_path))
 
-        self.timer = Timer(3, lambda: self.callback())
-        self.timer.start()
+        self.callback(event.src_path)
+        if event.event_type == 'moved':
+            self.callback(event.dest_path)
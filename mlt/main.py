@@ -25,10 +25,18 @@ Usage:
   mlt init [--template=<template> --template-repo=<repo>]
       [--registry=<registry> --namespace=<namespace]
       [--skip-crd-check] <name>
-  mlt build [--watch]
+  mlt build [--watch] [--cancel-stale] [--verbose]
   mlt deploy [--no-push] [-i | --interactive]
-      [--retries=<retries>] [--skip-crd-check] [<kube_spec>]
-  mlt undeploy
+      [--timeout=<timeout>] [--skip-crd-check] [<kube_spec>]
+  mlt deploy --watch [--cancel-stale] [--timeout=<timeout>]
+      [--skip-crd-check]
+  mlt deploy --sweep=<sweep_file> [--no-push] [--concurrency=<n>]
+      [--rate-limit=<qps>] [--skip-crd-check]
+  mlt queue add [--sweep=<sweep_file>] [--no-push] [--skip-crd-check]
+  mlt queue (run | list | clear)
+  mlt status [--watch]
+  mlt logs [--follow] [--replica-type=<type>]
+  mlt undeploy [--all | --older-than=<age> | --keep=<n>]
   mlt (template | templates) list [--template-repo=<repo>]
 
 Options:
@@ -43,9 +51,12 @@ Options:
                             use a namespace identical to username.
   --skip-crd-check          To avoid crd check during mlt init
                             [default: False].
-  --retries=<retries>       Number of times to connect to a pod interactively.
-                            Waits 1 second between retrying.
-                            [default: 10]
+  --timeout=<timeout>       Seconds to wait for a pod to be Running before
+                            connecting to it interactively, or with --watch,
+                            before giving up on timing a deploy. Pods that
+                            fail to pull their image or crash end the wait
+                            early.
+                            [default: 120]
   --interactive             Rewrites container command to infinite sleep,
                             and then drops user into `kubectl exec` shell.
                             Adds a `debug=true` label for easy discovery
@@ -53,36 +64,75 @@ Options:
                             specify which file you'd like to deploy
                             interactively as the `kube_spec`. `kube_spec` is
                             only used with this flag.
-  --watch                   Watch project directory and build on file changes
+  --watch                   Watch project directory and build on file changes.
+                            With deploy, also push and deploy every build.
+                            With status, update the table as runs change.
+  --cancel-stale            With --watch, stop a running build as soon as
+                            files change again, instead of letting it finish
+                            before building the latest changes.
+  --verbose                 Print build output as it happens, instead of
+                            only printing the end of it when a build fails.
+                            Full output is always written to .build.log
   --no-push                 Deploy your project to kubernetes using the same
                             image from your last run.
+  --follow                  With logs, keep printing lines as they are
+                            written, also after containers restart.
+  --replica-type=<type>     With logs, only show the pods of one replica
+                            type, like worker or ps for a TFJob.
+  --all                     With undeploy, delete every run of the app rather
+                            than only the last deploy.
+  --older-than=<age>        With undeploy, delete the runs created longer
+                            ago than <age>, like 30m, 12h or 7d.
+  --keep=<n>                With undeploy, delete all but the newest <n>
+                            runs.
+  --sweep=<sweep_file>      Deploy a run for every set of template parameters
+                            of the grid or random search in <sweep_file>.
+                            See the README for its format.
+                            With queue add, queue those runs instead.
+  --concurrency=<n>         With --sweep, how many requests to send to the
+                            cluster at once [default: 10].
+  --rate-limit=<qps>        With --sweep, how many objects to send to the
+                            cluster per second at most [default: 50].
 
 """
 import re
 from docopt import docopt
-
-from mlt.commands import (BuildCommand, DeployCommand, InitCommand,
-                          TemplatesCommand, UndeployCommand)
+from importlib import import_module
 
 # every available command and its corresponding action will go here
+# commands are only imported when they run, so that e.g. `mlt --version`
+# doesn't pay for importing watchdog, yaml, progressbar and friends
 COMMAND_MAP = (
-    ('build', BuildCommand),
-    ('deploy', DeployCommand),
-    ('init', InitCommand),
-    ('template', TemplatesCommand),
-    ('templates', TemplatesCommand),
-    ('undeploy', UndeployCommand),
+    ('build', 'mlt.commands.build.BuildCommand'),
+    ('deploy', 'mlt.commands.deploy.DeployCommand'),
+    ('init', 'mlt.commands.init.InitCommand'),
+    ('logs', 'mlt.commands.logs.LogsCommand'),
+    ('queue', 'mlt.commands.queue.QueueCommand'),
+    ('status', 'mlt.commands.status.StatusCommand'),
+    ('template', 'mlt.commands.templates.TemplatesCommand'),
+    ('templates', 'mlt.commands.templates.TemplatesCommand'),
+    ('undeploy', 'mlt.commands.undeploy.UndeployCommand'),
 )
 
 
+# seconds in each unit of a duration
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
 def run_command(args):
     """maps params from docopt into mlt commands"""
-    for command, CommandClass in COMMAND_MAP:
+    for command, command_class in COMMAND_MAP:
         if args[command]:
-            CommandClass(args).action()
+            load_command(command_class)(args).action()
             return
 
 
+def load_command(command_class):
+    """imports a command class from its dotted path"""
+    module_name, class_name = command_class.rsplit('.', 1)
+    return getattr(import_module(module_name), class_name)
+
+
 def sanitize_input(args, regex=None):
     """Ensures that the values passed to us via flags aren't malicious
        Or attempts to at least! Also sets types of vars and other tweaks
@@ -102,7 +152,15 @@ def sanitize_input(args, regex=None):
 
     # docopt doesn't support type assignment:
     # https://github.com/docopt/docopt/issues/8
-    args['--retries'] = int(args['--retries'])
+    args['--timeout'] = int(args['--timeout'])
+    args['--concurrency'] = int(args['--concurrency'])
+    args['--rate-limit'] = float(args['--rate-limit'])
+    if args['--keep'] is not None:
+        args['--keep'] = int(args['--keep'])
+        if args['--keep'] < 0:
+            raise ValueError("--keep can't be negative")
+    if args['--older-than'] is not None:
+        args['--older-than'] = parse_duration(args['--older-than'])
 
     # mostly this: max length 253 chars, lower case alphanumeric, -, .
     kubernetes_name_regex = re.compile(r'^[a-z0-9\.\-]{1,253}$')
@@ -116,6 +174,15 @@ def sanitize_input(args, regex=None):
     return args
 
 
+def parse_duration(value):
+    """seconds in a duration like `90s`, `30m`, `12h`, `7d` or `2w`"""
+    match = re.match(r'^(\d+)([smhdw])$', value.strip())
+    if not match:
+        raise ValueError("Duration {} not valid, use e.g. 30m, 12h or "
+                         "7d".format(value))
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
 def main():
     args = sanitize_input(
         docopt(__doc__, version="ML Container Templates v0.0.1"))
@@ -0,0 +1,130 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+from __future__ import print_function
+
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from termcolor import colored
+
+
+class Cycle(object):
+    """One trip of a set of changes through the pipeline, with the time
+       each stage took
+    """
+
+    def __init__(self, number, changed_at):
+        self.number = number
+        self.changed_at = changed_at
+        self.timings = OrderedDict()
+        self.data = {}
+
+    def latency(self):
+        return time.time() - self.changed_at
+
+    def report(self):
+        return "Cycle {} done {:.1f}s after the edit ({})".format(
+            self.number, self.latency(), ", ".join(
+                "{} {:.1f}s".format(stage, seconds)
+                for stage, seconds in self.timings.items()))
+
+
+class Stage(object):
+    """A worker thread that runs `work(cycle)` for the cycles submitted to
+       it, one at a time. Only the newest waiting cycle is kept: a cycle
+       that's replaced before the worker gets to it is skipped, since a
+       newer one supersedes it. `work` returns False to end a cycle here,
+       otherwise the cycle moves on to `next_stage`, or if this is the last
+       stage, gets passed to `done`.
+    """
+
+    def __init__(self, name, work, next_stage=None, done=None):
+        self.name = name
+        self.work = work
+        self.next_stage = next_stage
+        self.done = done
+        self._waiting = None
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def submit(self, cycle):
+        with self._condition:
+            if self._waiting is not None:
+                print("Skipping {} for cycle {}, cycle {} is newer".format(
+                    self.name, self._waiting.number, cycle.number))
+            self._waiting = cycle
+            self._condition.notify_all()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self.next_stage:
+            self.next_stage.stop()
+
+    def join(self, timeout=None):
+        self._worker.join(timeout)
+        if self.next_stage:
+            self.next_stage.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._waiting is None and not self._stopped:
+                    # bounded so that stopping works on python 2 as well
+                    self._condition.wait(1.0)
+                if self._stopped:
+                    return
+                cycle, self._waiting = self._waiting, None
+            if self._run_work(cycle) is False:
+                continue
+            if self.next_stage:
+                self.next_stage.submit(cycle)
+            elif self.done:
+                self.done(cycle)
+
+    def _run_work(self, cycle):
+        """failures end the cycle but never the worker"""
+        started = time.time()
+        try:
+            return self.work(cycle)
+        except SystemExit:
+            # the commands exit on errors they've already printed
+            return False
+        except Exception:
+            print(colored("{} failed for cycle {}:\n{}".format(
+                self.name.capitalize(), cycle.number,
+                traceback.format_exc()), 'red'))
+            return False
+        finally:
+            cycle.timings[self.name] = time.time() - started
+
+
+def pipeline(stages, done=None):
+    """chains (name, work) pairs into stages, returns the first one"""
+    first = None
+    for name, work in reversed(stages):
+        first = Stage(name, work, first, done if first is None else None)
+    return first
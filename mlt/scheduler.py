@@ -0,0 +1,139 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+from __future__ import print_function
+
+import threading
+import time
+import traceback
+from collections import deque
+from termcolor import colored
+
+# bounds of the quiet period we wait for before starting a build
+MIN_DEBOUNCE = 0.25
+MAX_DEBOUNCE = 3.0
+# number of gaps between events used to size the quiet period
+DEBOUNCE_HISTORY = 20
+# upper bound for a single wait while idle, so ctrl-c gets handled
+# promptly on python 2, where waiting on a lock can't be interrupted
+IDLE_WAIT = 1.0
+
+
+class BuildScheduler(object):
+    """Runs `build` whenever `notify` reports changes, one build at a time.
+       A build starts once changes have stopped coming in for the debounce
+       window; all changes made while a build runs result in exactly one
+       follow-up build. If `cancel` is given it gets called as soon as a
+       change makes the running build stale.
+       While `build` runs, `changed_at` is the time of the first change
+       that went into it and `changed_paths` the paths reported with the
+       changes, or None if any change came without one.
+    """
+
+    def __init__(self, build, cancel=None, min_delay=MIN_DEBOUNCE,
+                 max_delay=MAX_DEBOUNCE, clock=time.time):
+        self.build = build
+        self.cancel = cancel
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self._gaps = deque(maxlen=DEBOUNCE_HISTORY)
+        self._last_change = None
+        self._first_change = None
+        self.changed_at = None
+        self._paths = set()
+        self.changed_paths = None
+        self._pending = False
+        self._building = False
+        self._cancelled = False
+        self._stopped = False
+        self._condition = threading.Condition()
+
+    def notify(self, path=None):
+        """records a change; safe to call from any thread"""
+        with self._condition:
+            if path is None:
+                self._paths = None
+            elif self._paths is not None:
+                self._paths.add(path)
+            now = self.clock()
+            if self._last_change is not None:
+                self._gaps.append(now - self._last_change)
+            self._last_change = now
+            if not self._pending:
+                self._first_change = now
+            self._pending = True
+            if self._building and self.cancel and not self._cancelled:
+                self._cancelled = True
+                self.cancel()
+            self._condition.notify_all()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def run(self):
+        """runs builds as changes come in, until `stop` is called"""
+        while self._wait_for_changes():
+            try:
+                self.build()
+            except SystemExit:
+                # the commands exit on errors they've already printed
+                pass
+            except Exception:
+                # a failed build, like one that raced a file being deleted,
+                # mustn't end the watch
+                print(colored("Build failed:\n{}".format(
+                    traceback.format_exc()), 'red'))
+            finally:
+                with self._condition:
+                    self._building = False
+
+    def debounce_window(self):
+        """twice the longest gap seen within recent bursts of events (an
+           editor saving, a git checkout...), ignoring the slowest tenth so
+           that a single pause doesn't slow down every build after it
+        """
+        gaps = sorted(gap for gap in self._gaps if gap < self.max_delay)
+        if not gaps:
+            return self.min_delay
+        burst_gap = gaps[int(0.9 * (len(gaps) - 1))]
+        return min(max(2 * burst_gap, self.min_delay), self.max_delay)
+
+    def _wait_for_changes(self):
+        """blocks until changes have settled, False once stopped"""
+        with self._condition:
+            while not self._stopped:
+                if not self._pending:
+                    self._condition.wait(IDLE_WAIT)
+                    continue
+                quiet = self.clock() - self._last_change
+                window = self.debounce_window()
+                if quiet >= window:
+                    self._pending = False
+                    self._building = True
+                    self.changed_at = self._first_change
+                    self.changed_paths = self._paths
+                    self._paths = set()
+                    self._cancelled = False
+                    return True
+                self._condition.wait(min(window - quiet, IDLE_WAIT))
+            return False
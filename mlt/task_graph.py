@@ -0,0 +1,109 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+from __future__ import print_function
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TaskGraph(object):
+    """Runs tasks on threads of their own as soon as the tasks they come
+       after are done, so independent steps overlap. If a task fails, no
+       new tasks get started, and once the running ones are done the
+       failure is raised again, SystemExit included, in the calling thread.
+    """
+
+    def __init__(self):
+        self._tasks = OrderedDict()
+        self._finished = {}
+        self.timings = OrderedDict()
+
+    def add(self, name, func, after=()):
+        for dependency in after:
+            if dependency not in self._tasks:
+                raise ValueError("Unknown task {}".format(dependency))
+        self._tasks[name] = (func, tuple(after))
+
+    def tasks(self):
+        return list(self._tasks)
+
+    def run(self):
+        """runs every task, returns their results by name"""
+        condition = threading.Condition()
+        results = {}
+        started = {}
+        finished = {}
+        errors = []
+
+        def run_task(name, func):
+            error = None
+            try:
+                result = func()
+            except BaseException as e:
+                result, error = None, e
+            with condition:
+                if error is not None:
+                    errors.append(error)
+                results[name] = result
+                finished[name] = time.time()
+                condition.notify_all()
+
+        with condition:
+            while len(finished) < len(started) or (
+                    not errors and len(started) < len(self._tasks)):
+                for name, (func, after) in self._tasks.items():
+                    if name in started or errors or \
+                            not all(d in finished for d in after):
+                        continue
+                    started[name] = time.time()
+                    worker = threading.Thread(target=run_task,
+                                              args=(name, func))
+                    worker.daemon = True
+                    worker.start()
+                # bounded so that ctrl-c gets handled on python 2 as well
+                condition.wait(1.0)
+
+        for name in self._tasks:
+            if name in finished:
+                self.timings[name] = finished[name] - started[name]
+        self._finished = finished
+        if errors:
+            raise errors[0]
+        return results
+
+    def critical_path(self):
+        """the chain of tasks that the last one to finish waited on"""
+        if not self._finished:
+            return []
+        path = [max(self._finished, key=self._finished.get)]
+        while self._tasks[path[0]][1]:
+            path.insert(0, max(self._tasks[path[0]][1],
+                               key=self._finished.get))
+        return path
+
+    def report(self):
+        """task timings, with the ones on the critical path marked"""
+        critical = self.critical_path()
+        return "Timings: {}".format(", ".join(
+            "{} {:.1f}s{}".format(name, seconds,
+                                  '*' if name in critical else '')
+            for name, seconds in self.timings.items()))
@@ -18,12 +18,11 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 
-import os
-
 from mlt.commands.build import BuildCommand
+from mlt.utils import state_helpers
 
 
 def verify_build(args):
-    """runs a full build if no build json file"""
-    if not os.path.isfile('.build.json'):
+    """runs a full build if the project was never built"""
+    if state_helpers.load_state().last_build() is None:
         BuildCommand(args).action()
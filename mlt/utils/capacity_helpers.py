@@ -0,0 +1,177 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+"""
+Works out how much room a cluster has for more runs: what its nodes can
+allocate and the namespace's resource quotas allow, minus what the pods
+already there request. The sums ignore how that room is spread over the
+nodes, so a run that fits here may still not find a node big enough.
+"""
+import re
+
+GPU = 'nvidia.com/gpu'
+# what we keep track of; anything else a run requests isn't limited
+RESOURCES = ('cpu', 'memory', GPU, 'pods')
+UNLIMITED = float('inf')
+
+# resource quota keys and what they limit
+QUOTA_KEYS = {'cpu': 'cpu', 'requests.cpu': 'cpu',
+              'memory': 'memory', 'requests.memory': 'memory',
+              'requests.' + GPU: GPU, 'pods': 'pods'}
+
+_SUFFIXES = {'': 1, 'm': 1e-3, 'k': 1e3, 'M': 1e6, 'G': 1e9, 'T': 1e12,
+             'P': 1e15, 'E': 1e18, 'Ki': 2 ** 10, 'Mi': 2 ** 20,
+             'Gi': 2 ** 30, 'Ti': 2 ** 40, 'Pi': 2 ** 50, 'Ei': 2 ** 60}
+_QUANTITY = re.compile(r'^([+-]?[0-9.]+(?:[eE][+-]?[0-9]+)?)([a-zA-Z]*)$')
+
+
+def parse_quantity(value):
+    """a kubernetes quantity like `500m` or `2Gi` as a number"""
+    match = _QUANTITY.match(str(value).strip())
+    if not match or match.group(2) not in _SUFFIXES:
+        raise ValueError("Invalid quantity {}".format(value))
+    return float(match.group(1)) * _SUFFIXES[match.group(2)]
+
+
+def pod_requests(pod_spec):
+    """what a pod with `pod_spec` requests; containers without requests
+       get their limits, like the api server defaults them to
+    """
+    requests = dict.fromkeys(RESOURCES, 0.0)
+    requests['pods'] = 1.0
+    for container in pod_spec.get('containers') or []:
+        resources = container.get('resources') or {}
+        amounts = dict(resources.get('limits') or {},
+                       **(resources.get('requests') or {}))
+        for resource in RESOURCES[:-1]:
+            if resource in amounts:
+                requests[resource] += parse_quantity(amounts[resource])
+    return requests
+
+
+def run_demand(objects):
+    """what the pods of a run will request, all together: every pod
+       template in its objects, times the replicas of that template
+    """
+    demand = dict.fromkeys(RESOURCES, 0.0)
+    for obj in objects:
+        _add_templates(obj, demand)
+    return demand
+
+
+def _add_templates(data, demand):
+    if isinstance(data, list):
+        for item in data:
+            _add_templates(item, demand)
+    elif isinstance(data, dict):
+        template = data.get('template')
+        if isinstance(template, dict) and \
+                'containers' in (template.get('spec') or {}):
+            replicas = int(data.get('replicas') or
+                           data.get('parallelism') or 1)
+            requests = pod_requests(template['spec'])
+            for resource in RESOURCES:
+                demand[resource] += requests[resource] * replicas
+            return
+        for value in data.values():
+            _add_templates(value, demand)
+
+
+def allocatable(nodes):
+    """what the ready, schedulable nodes can run, or unlimited for
+       everything if we can't see the nodes
+    """
+    if nodes is None:
+        return dict.fromkeys(RESOURCES, UNLIMITED)
+    total = dict.fromkeys(RESOURCES, 0.0)
+    for node in nodes:
+        conditions = (node.get('status') or {}).get('conditions') or []
+        ready = any(c.get('type') == 'Ready' and c.get('status') == 'True'
+                    for c in conditions)
+        if not ready or (node.get('spec') or {}).get('unschedulable'):
+            continue
+        amounts = node['status'].get('allocatable') or {}
+        for resource in RESOURCES:
+            if resource in amounts:
+                total[resource] += parse_quantity(amounts[resource])
+    return total
+
+
+def requested(pods):
+    """what the pods that haven't finished request"""
+    total = dict.fromkeys(RESOURCES, 0.0)
+    for pod in pods:
+        if (pod.get('status') or {}).get('phase') in ('Succeeded', 'Failed'):
+            continue
+        requests = pod_requests(pod.get('spec') or {})
+        for resource in RESOURCES:
+            total[resource] += requests[resource]
+    return total
+
+
+def quota_room(quotas):
+    """what the resource quotas of a namespace still allow"""
+    room = dict.fromkeys(RESOURCES, UNLIMITED)
+    for quota in quotas or []:
+        status = quota.get('status') or {}
+        used = status.get('used') or {}
+        for key, hard in (status.get('hard') or {}).items():
+            resource = QUOTA_KEYS.get(key)
+            if resource:
+                left = parse_quantity(hard) - parse_quantity(
+                    used.get(key, 0))
+                room[resource] = min(room[resource], left)
+    return room
+
+
+def free_capacity(nodes, pods, quotas, reserved=()):
+    """room for more runs: the least of what the nodes have left and what
+       the quotas allow, minus the demand of `reserved` runs whose pods
+       don't exist yet
+    """
+    nodes_total = allocatable(nodes)
+    used = requested(pods)
+    room = quota_room(quotas)
+    free = dict((resource, min(nodes_total[resource] - used[resource],
+                               room[resource]))
+                for resource in RESOURCES)
+    for demand in reserved:
+        free = subtract(free, demand)
+    return free
+
+
+def fits(demand, free):
+    return all(demand.get(resource, 0) <= free[resource]
+               for resource in RESOURCES)
+
+
+def subtract(free, demand):
+    return dict((resource, free[resource] - demand.get(resource, 0))
+                for resource in RESOURCES)
+
+
+def format_demand(demand):
+    """like `2 cpu, 4.0Gi memory, 1 gpu, 3 pods`"""
+    parts = ['{:g} cpu'.format(demand['cpu']),
+             '{:.1f}Gi memory'.format(demand['memory'] / 2 ** 30)]
+    if demand[GPU]:
+        parts.append('{:g} gpu'.format(demand[GPU]))
+    parts.append('{:g} pods'.format(demand['pods']))
+    return ', '.join(parts)
@@ -0,0 +1,111 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import json
+import os
+
+from mlt.utils import constants, docker_helpers
+
+# kinds of changes: ones that need a new image, and ones that only need
+# the kubernetes objects rendered and applied again
+IMAGE = 'image'
+MANIFESTS = 'manifests'
+
+# files that define how `make build` builds the image
+BUILD_FILES = ('Dockerfile', '.dockerignore', 'Makefile')
+
+# directory with the templates of the kubernetes objects we deploy, and
+# the one `mlt deploy` renders them into
+TEMPLATES_DIR = 'k8s-templates'
+RENDERED_DIR = 'k8s'
+
+
+class ChangeClassifier(object):
+    """Works out what a set of changed paths affects: IMAGE for paths that
+       are copied into the image (going by the Dockerfile's ADD and COPY
+       sources and .dockerignore), MANIFESTS for the k8s templates and
+       template parameters in mlt.json
+    """
+
+    def __init__(self, root='.'):
+        self.root = os.path.abspath(root)
+        self.reload()
+
+    def reload(self):
+        self._sources = docker_helpers.dockerfile_sources(self.root)
+        self._dockerignore = docker_helpers.read_dockerignore(self.root)
+        self._config = self._load_config()
+
+    def classify(self, paths):
+        """the set of kinds of changes among `paths`; None stands for an
+           unknown set of changes, which affects everything
+        """
+        if paths is None:
+            return set([IMAGE, MANIFESTS])
+        relpaths = set(self._relpath(path) for path in paths)
+        relpaths.discard(None)
+        if relpaths & set(BUILD_FILES):
+            self.reload()
+            return set([IMAGE, MANIFESTS])
+
+        changes = set()
+        for relpath in relpaths:
+            if relpath.startswith(RENDERED_DIR + '/'):
+                # written by our own deploys
+                continue
+            if relpath == constants.MLT_CONFIG:
+                changes |= self._config_changes()
+            elif relpath.startswith(TEMPLATES_DIR + '/'):
+                changes.add(MANIFESTS)
+            if relpath not in docker_helpers.ALWAYS_EXCLUDED and \
+                    docker_helpers.is_copied(relpath, self._sources) and \
+                    not docker_helpers.is_dockerignored(
+                        relpath, self._dockerignore):
+                changes.add(IMAGE)
+        return changes
+
+    def _config_changes(self):
+        """template parameters only go into the manifests; anything else,
+           like the name or registry, changes the image we deploy
+        """
+        old_config, self._config = self._config, self._load_config()
+        if old_config == self._config:
+            return set()
+        changes = set([MANIFESTS])
+        old_config.pop(constants.TEMPLATE_PARAMETERS, None)
+        if old_config != dict(
+                (key, value) for key, value in self._config.items()
+                if key != constants.TEMPLATE_PARAMETERS):
+            changes.add(IMAGE)
+        return changes
+
+    def _load_config(self):
+        try:
+            with open(os.path.join(self.root, constants.MLT_CONFIG)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            # missing, or caught halfway through being saved
+            return {}
+
+    def _relpath(self, path):
+        relpath = os.path.relpath(os.path.abspath(path), self.root)
+        if relpath.startswith(os.pardir):
+            return None
+        return relpath.replace(os.sep, '/')
@@ -25,8 +25,19 @@ TEMPLATES_DIR = 'mlt-templates'
 # Config file name
 MLT_CONFIG = "mlt.json"
 
+# Database of the builds, pushes and deploys of a project
+STATE_DB = ".mlt.db"
+
 # Template parameters file name
 TEMPLATE_CONFIG = "parameters.json"
 
 # Name of config file section that has template parameters
 TEMPLATE_PARAMETERS = "template_parameters"
+
+# Labels added to every kubernetes object mlt deploys
+APP_LABEL = "mlt-app-name"
+RUN_LABEL = "mlt-run-id"
+SWEEP_LABEL = "mlt-sweep-id"
+
+# Annotation with the template parameters of a run of a sweep
+SWEEP_PARAMETERS_ANNOTATION = "mlt-sweep-parameters"
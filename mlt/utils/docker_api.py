@@ -0,0 +1,193 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import json
+import os
+import socket
+import threading
+from collections import deque
+
+try:
+    # python 3
+    from http.client import HTTPConnection, HTTPException
+    from urllib.parse import quote, urlencode
+except ImportError:
+    # python 2
+    from httplib import HTTPConnection, HTTPException
+    from urllib import quote, urlencode
+
+from mlt.utils.process_helpers import MAX_LINE_LENGTH, TAIL_LINES
+
+DEFAULT_SOCKET = '/var/run/docker.sock'
+# docker 1.12 and later speak this version of the engine api
+API_VERSION = 'v1.24'
+# seconds to wait on the docker daemon; pushes only need to make progress
+# within this time, not finish
+REQUEST_TIMEOUT = 60
+
+
+class DockerError(Exception):
+    pass
+
+
+def get_client():
+    """a client for the local docker daemon's unix socket, or None if we
+       have to go through the docker cli (a tcp DOCKER_HOST, no daemon...)
+       set MLT_USE_DOCKER_CLI=1 to always use the cli
+    """
+    if os.environ.get('MLT_USE_DOCKER_CLI'):
+        return None
+    docker_host = os.environ.get('DOCKER_HOST') or 'unix://' + DEFAULT_SOCKET
+    if not docker_host.startswith('unix://'):
+        return None
+    client = DockerClient(docker_host[len('unix://'):])
+    try:
+        client.ping()
+    except (DockerError, HTTPException, socket.error):
+        return None
+    return client
+
+
+def split_tag(name):
+    """('registry:5000/app', 'tag') for 'registry:5000/app:tag'"""
+    repository, _, tag = name.rpartition(':')
+    if not repository or '/' in tag:
+        return name, 'latest'
+    return repository, tag
+
+
+class UnixHTTPConnection(HTTPConnection):
+    def __init__(self, socket_path, timeout=REQUEST_TIMEOUT):
+        HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class DockerClient(object):
+    """The few docker engine api calls mlt makes, over the unix socket"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.socket_path = socket_path
+
+    def ping(self):
+        self._request('GET', '/_ping', timeout=5).read()
+
+    def tag(self, image, repository, tag):
+        self._request('POST', '/images/{}/tag'.format(quote(image, '')),
+                      {'repo': repository, 'tag': tag}).read()
+
+    def push(self, name, auth):
+        """yields the json progress messages of pushing `name`"""
+        repository, tag = split_tag(name)
+        response = self._request(
+            'POST', '/images/{}/push'.format(quote(repository, '')),
+            {'tag': tag}, {'X-Registry-Auth': auth})
+        try:
+            for line in iter(response.readline, b''):
+                if line.strip():
+                    yield json.loads(line.decode('utf-8'))
+        finally:
+            response.close()
+
+    def _request(self, method, path, query=None, headers=None,
+                 timeout=REQUEST_TIMEOUT):
+        connection = UnixHTTPConnection(self.socket_path, timeout)
+        url = '/{}{}'.format(API_VERSION, path)
+        if query:
+            url += '?' + urlencode(sorted(query.items()))
+        connection.request(method, url, headers=headers or {})
+        response = connection.getresponse()
+        if response.status >= 400:
+            body = response.read().decode('utf-8', 'replace')
+            connection.close()
+            try:
+                body = json.loads(body)['message']
+            except (ValueError, KeyError, TypeError):
+                pass
+            raise DockerError("{} {}: {}".format(
+                response.status, response.reason, body))
+        return response
+
+
+class PushStream(object):
+    """Pushes an image through the engine api on a background thread.
+       Looks like a StreamingProcess to its callers: the progress is
+       written to `log_file` as lines like `docker push` prints them,
+       `wait` returns 0 once pushed, and 1 if docker reported an error.
+       `on_message` gets every json progress message.
+    """
+
+    def __init__(self, client, name, auth, log_file, on_message=None,
+                 tail_lines=TAIL_LINES):
+        self.client = client
+        self.name = name
+        self.auth = auth
+        self.log_file = log_file
+        self.on_message = on_message
+        self.tail = deque(maxlen=tail_lines)
+        self.returncode = None
+        self._thread = threading.Thread(target=self._push)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _push(self):
+        failed = False
+        with open(self.log_file, 'w') as log:
+            try:
+                for message in self.client.push(self.name, self.auth):
+                    failed = failed or 'error' in message
+                    self._output(log, _format_message(message))
+                    if self.on_message:
+                        self.on_message(message)
+            except (DockerError, HTTPException, socket.error,
+                    ValueError) as e:
+                failed = True
+                self._output(log, "Push failed: {}\n".format(e))
+        self.returncode = 1 if failed else 0
+
+    def _output(self, log, line):
+        log.write(line)
+        self.tail.append(line[:MAX_LINE_LENGTH])
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return self.returncode
+
+    def output_tail(self):
+        return ''.join(self.tail)
+
+
+def _format_message(message):
+    if 'error' in message:
+        return message['error'] + '\n'
+    line = message.get('status', '')
+    if message.get('id'):
+        line = '{}: {}'.format(message['id'], line)
+    if message.get('progress'):
+        line = '{} {}'.format(line, message['progress'])
+    return line + '\n'
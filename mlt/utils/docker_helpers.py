@@ -0,0 +1,320 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import hashlib
+import json
+import os
+import re
+import stat
+import time
+from subprocess import call, check_output, CalledProcessError
+
+from mlt.utils import constants
+
+# files that are always part of the build context, even if ignored by git
+ALWAYS_INCLUDED = ('Dockerfile', 'Makefile', 'requirements.txt')
+
+# mlt bookkeeping files that change on every build and would otherwise
+# invalidate the digest of the context they were written into; older
+# versions of mlt kept the state in .build.json and .push.json
+ALWAYS_EXCLUDED = ('.git', constants.STATE_DB,
+                   constants.STATE_DB + '-journal', '.build.json',
+                   '.push.json', '.build.log', '.push.log')
+
+
+def context_digest(path='.'):
+    """sha256 of every file in the docker build context at `path`,
+       used as the image tag so unchanged projects aren't rebuilt
+    """
+    digest = hashlib.sha256()
+    for filename in build_context_files(path):
+        full_path = os.path.join(path, filename)
+        mode = os.lstat(full_path).st_mode
+        digest.update(filename.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(b'x' if mode & stat.S_IXUSR else b'-')
+        if stat.S_ISLNK(mode):
+            digest.update(os.readlink(full_path).encode('utf-8'))
+        else:
+            with open(full_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    digest.update(chunk)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def build_context_files(path='.'):
+    """sorted relative paths of files that make up the build context:
+       everything git doesn't ignore, minus .dockerignore matches, plus
+       the files needed to run `make build`
+    """
+    files = _git_files(path)
+    if files is None:
+        files = _walk_files(path)
+
+    dockerignore = read_dockerignore(path)
+    context = set(f for f in files if not is_dockerignored(f, dockerignore))
+    context.update(f for f in ALWAYS_INCLUDED
+                   if os.path.isfile(os.path.join(path, f)))
+    return sorted(f for f in context
+                  if f.split('/')[0] not in ALWAYS_EXCLUDED and
+                  os.path.lexists(os.path.join(path, f)))
+
+
+def image_exists(container_name):
+    """True if a local docker image with the given name:tag exists"""
+    with open(os.devnull, 'wb') as quiet:
+        return call(["docker", "image", "inspect", container_name],
+                    stdout=quiet, stderr=quiet) == 0
+
+
+def image_id(name):
+    """id of the local image `name`, the digest of its config, or None if
+       there's no such image
+    """
+    try:
+        with open(os.devnull, 'wb') as quiet:
+            return check_output(
+                ["docker", "image", "inspect", "--format", "{{.Id}}", name],
+                stderr=quiet).decode('utf-8').strip() or None
+    except (CalledProcessError, OSError):
+        return None
+
+
+def insecure_registries():
+    """(registry hosts, CIDRs) the docker daemon talks plain http to, as
+       configured with its insecure-registries; nothing if we can't ask it
+    """
+    try:
+        with open(os.devnull, 'wb') as quiet:
+            config = json.loads(check_output(
+                ["docker", "info", "--format", "{{json .RegistryConfig}}"],
+                stderr=quiet).decode('utf-8')) or {}
+    except (CalledProcessError, OSError, ValueError):
+        return set(), []
+    hosts = set(name for name, index in
+                (config.get('IndexConfigs') or {}).items()
+                if not index.get('Secure', True))
+    return hosts, config.get('InsecureRegistryCIDRs') or []
+
+
+def _git_files(path):
+    """tracked and untracked files not ignored by git, or None if
+       `path` isn't inside a git repo
+    """
+    try:
+        with open(os.devnull, 'wb') as quiet:
+            output = check_output(
+                ["git", "ls-files", "-z", "--cached", "--others",
+                 "--exclude-standard"], cwd=path, stderr=quiet)
+    except (CalledProcessError, OSError):
+        return None
+    return [f for f in output.decode('utf-8').split('\0') if f]
+
+
+def _walk_files(path):
+    result = []
+    for root, dirs, filenames in os.walk(path):
+        dirs[:] = [d for d in dirs if d != '.git']
+        for filename in filenames:
+            relpath = os.path.relpath(os.path.join(root, filename), path)
+            result.append(relpath.replace(os.sep, '/'))
+    return result
+
+
+def read_dockerignore(path):
+    dockerignore = os.path.join(path, '.dockerignore')
+    if not os.path.isfile(dockerignore):
+        return []
+    patterns = []
+    with open(dockerignore) as f:
+        for line in f.read().splitlines():
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            pattern = os.path.normpath(line.lstrip('!')).lstrip('/')
+            patterns.append(
+                (negate, _pattern_regex(pattern.replace(os.sep, '/'))))
+    return patterns
+
+
+def _pattern_regex(pattern):
+    """translates a .dockerignore pattern into a regex; unlike fnmatch,
+       `*` and `?` never match across a `/`, only `**` does
+    """
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return re.compile(regex + '$')
+
+
+def is_dockerignored(filename, patterns):
+    """docker semantics: last matching pattern wins, and a pattern that
+       matches a directory excludes everything beneath it
+    """
+    parts = filename.split('/')
+    prefixes = ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+    excluded = False
+    for negate, regex in patterns:
+        if any(regex.match(prefix) for prefix in prefixes):
+            excluded = not negate
+    return excluded
+
+
+def dockerfile_sources(path='.'):
+    """regexes for the context paths the Dockerfile at `path` ADDs or
+       COPYs, or None if they can't be worked out, like sources that use
+       build args, in which case everything should be assumed copied
+    """
+    dockerfile = os.path.join(path, 'Dockerfile')
+    if not os.path.isfile(dockerfile):
+        return None
+    with open(dockerfile) as f:
+        instructions = re.sub(r'\\\r?\n', ' ', f.read()).splitlines()
+    sources = []
+    for instruction in instructions:
+        words = instruction.strip().split(None, 1)
+        if len(words) < 2 or words[0].upper() not in ('ADD', 'COPY'):
+            continue
+        if words[1].lstrip().startswith('['):
+            args = json.loads(words[1])
+        else:
+            args = words[1].split()
+        if any(arg.startswith('--from') for arg in args):
+            # copies from another build stage, not from the context
+            continue
+        # the last argument is the destination
+        for source in [arg for arg in args if not arg.startswith('--')][:-1]:
+            if '://' in source:
+                continue
+            if '$' in source:
+                return None
+            source = os.path.normpath(source).replace(os.sep, '/')
+            if source.lstrip('/') in ('.', ''):
+                sources.append(re.compile('.*$'))
+            else:
+                sources.append(_pattern_regex(source.lstrip('/')))
+    return sources
+
+
+def is_copied(filename, sources):
+    """whether `filename` ends up in the image, given the Dockerfile
+       `sources`; a source that is a directory copies all of it
+    """
+    if sources is None:
+        return True
+    parts = filename.split('/')
+    prefixes = ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+    return any(regex.match(prefix)
+               for regex in sources for prefix in prefixes)
+
+
+class BuildProgress(object):
+    """Tracks `docker build` progress from its output, `Step 3/7 : ...` for
+       the classic builder and `#8 [3/7] RUN ...` for buildkit
+    """
+    STEP = re.compile(r'^(?:Step |#\d+ \[[^\]]*?)(\d+)/(\d+)[\] ]')
+
+    def __init__(self):
+        self.current = None
+
+    def update(self, line):
+        match = self.STEP.match(line)
+        if match:
+            step, total = int(match.group(1)), int(match.group(2))
+            # a step has only finished once the next one starts
+            self.current = (step - 1, total)
+
+    def __call__(self):
+        return self.current
+
+
+class PushProgress(object):
+    """Tracks push progress. From `docker push` output it can only count
+       layers pushed out of layers seen, since docker doesn't print byte
+       counts unless it's writing to a terminal; the json messages of the
+       engine api tell bytes pushed out of bytes to push for each layer.
+    """
+    LAYER = re.compile(r'^([0-9a-f]{12}): (.*)$')
+    DIGEST = re.compile(r': digest: (sha256:[0-9a-f]{64}) ')
+    FINISHED = ('Pushed', 'Layer already exists', 'Mounted from')
+
+    def __init__(self, clock=time.time):
+        self.layers = {}
+        self.bytes = {}
+        self.digest = None
+        self.clock = clock
+        self.started = clock()
+
+    def update(self, line):
+        digest = self.DIGEST.search(line)
+        if digest:
+            self.digest = digest.group(1)
+        match = self.LAYER.match(line.strip())
+        if match:
+            layer, status = match.groups()
+            self.layers[layer] = status.startswith(self.FINISHED)
+
+    def update_message(self, message):
+        """takes a json progress message of the engine api"""
+        self.digest = (message.get('aux') or {}).get('Digest') or self.digest
+        layer = message.get('id') or ''
+        status = message.get('status') or ''
+        if not self.LAYER.match(layer + ': '):
+            return
+        self.layers[layer] = status.startswith(self.FINISHED)
+        detail = message.get('progressDetail') or {}
+        if detail.get('total'):
+            self.bytes[layer] = (detail.get('current') or 0, detail['total'])
+        elif self.layers[layer] and layer in self.bytes:
+            # pushed, even if the last progress message said otherwise
+            self.bytes[layer] = (self.bytes[layer][1],) * 2
+
+    def bytes_pushed(self):
+        return sum(current for current, _ in self.bytes.values())
+
+    def throughput(self):
+        """bytes per second pushed so far"""
+        elapsed = self.clock() - self.started
+        return self.bytes_pushed() / elapsed if elapsed > 0 else 0
+
+    def __call__(self):
+        if self.bytes:
+            return self.bytes_pushed(), sum(
+                total for _, total in self.bytes.values())
+        if not self.layers:
+            return None
+        return sum(self.layers.values()), len(self.layers)
@@ -18,20 +18,139 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 
+import fcntl
+import hashlib
+import io
+import os
 import shutil
+import sys
+import tarfile
 import tempfile
+import time
 from contextlib import contextmanager
+from subprocess import check_output, CalledProcessError
 
 from mlt.utils import process_helpers
 
+# seconds a cached template repo is used before fetching updates into it
+DEFAULT_CACHE_TTL = 3600
+
+
+def cache_dir():
+    """where mlt keeps its caches, MLT_CACHE_DIR or ~/.cache/mlt"""
+    return os.environ.get('MLT_CACHE_DIR') or os.path.join(
+        os.environ.get('XDG_CACHE_HOME') or
+        os.path.join(os.path.expanduser('~'), '.cache'), 'mlt')
+
 
 @contextmanager
-def clone_repo(repo):
+def clone_repo(repo, paths=None):
+    """checks out `paths` of the repo's default branch, or all of it, into
+       a temp dir. Files come out of a cached mirror of the repo, so only
+       what changed since the last fetch is downloaded.
+    """
+    mirror = mirror_repo(repo)
     destination = tempfile.mkdtemp()
-    process_helpers.run_popen(
-        "git clone {} {}".format(repo, destination),
-        shell=True, stdout=False, stderr=False).wait()
     try:
+        _checkout(mirror, destination, paths)
         yield destination
     finally:
         shutil.rmtree(destination)
+
+
+def mirror_repo(repo):
+    """path to a bare mirror of `repo` under the cache dir, cloned on first
+       use and fetched once it's older than MLT_TEMPLATE_CACHE_TTL seconds.
+       Local repos are always fetched, as that's cheap.
+    """
+    mirrors = os.path.join(cache_dir(), 'templates')
+    if not os.path.isdir(mirrors):
+        try:
+            os.makedirs(mirrors)
+        except OSError:
+            # another mlt process just created it
+            pass
+    mirror = os.path.join(
+        mirrors, hashlib.sha256(repo.encode('utf-8')).hexdigest()[:16])
+    last_fetch = os.path.join(mirror, 'mlt-last-fetch')
+
+    with mirror_lock(mirror):
+        if not os.path.isdir(mirror):
+            # clone next to the final location and move it into place, so
+            # an interrupted clone never leaves a broken mirror behind
+            staging = tempfile.mkdtemp(dir=mirrors)
+            try:
+                process_helpers.run(["git", "clone", "--mirror", "--quiet",
+                                     repo, os.path.join(staging, 'mirror')])
+                os.rename(os.path.join(staging, 'mirror'), mirror)
+            finally:
+                shutil.rmtree(staging)
+            _touch(last_fetch)
+        elif _cache_age(last_fetch) >= _cache_ttl(repo):
+            fetched = process_helpers.run_popen(
+                ["git", "fetch", "--prune", "--quiet"], cwd=mirror,
+                stdout=False, stderr=False).wait() == 0
+            if fetched:
+                _touch(last_fetch)
+            else:
+                print("Unable to update {}, using cached templates".format(
+                    repo))
+    return mirror
+
+
+def _checkout(mirror, destination, paths):
+    """extracts `paths` at HEAD of the mirror without a working tree, so
+       concurrent checkouts from the same mirror don't interfere
+    """
+    command = ["git", "archive", "--format=tar", "HEAD"]
+    if paths:
+        existing = check_output(
+            ["git", "ls-tree", "--name-only", "HEAD", "--"] + list(paths),
+            cwd=mirror).decode('utf-8').split()
+        if not existing:
+            return
+        command += ["--"] + existing
+    try:
+        archive = check_output(command, cwd=mirror)
+    except CalledProcessError as e:
+        print(e.output)
+        sys.exit(1)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        if hasattr(tarfile, 'data_filter'):
+            tar.extractall(destination, filter='data')
+        else:
+            tar.extractall(destination)
+
+
+def _cache_ttl(repo):
+    if os.path.isdir(repo):
+        return 0
+    return float(os.environ.get('MLT_TEMPLATE_CACHE_TTL', DEFAULT_CACHE_TTL))
+
+
+def _cache_age(path):
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return float('inf')
+
+
+def _touch(path):
+    os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o644))
+    os.utime(path, None)
+
+
+def mirror_lock(mirror):
+    """lock for changing `mirror` and what mlt keeps in it"""
+    return _file_lock(mirror + '.lock')
+
+
+@contextmanager
+def _file_lock(path):
+    """exclusive lock across mlt processes sharing the cache"""
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
@@ -0,0 +1,223 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import os
+import re
+from subprocess import check_output, CalledProcessError
+
+from mlt.utils import docker_helpers
+
+# files whose changes mean the ignore rules have to be read again
+IGNORE_FILES = ('.gitignore', '.dockerignore')
+
+
+class IgnoreMatcher(object):
+    """Decides whether paths under `root` are ignored, following git's
+       rules for .gitignore files at any depth, .git/info/exclude and the
+       global excludes file, plus the .dockerignore at the root.
+       Rules are read once and results are cached per path; call `reload`
+       when an ignore file changes. Paths in `watched`, and everything
+       below them, are never ignored.
+    """
+
+    def __init__(self, root='.', watched=()):
+        self.root = os.path.abspath(root)
+        self.watched = tuple(watched)
+        self.reload()
+
+    def reload(self):
+        self._cache = {}
+        self._dir_rules = {}
+        self._base_rules = []
+        for exclude_file in (_global_excludes_file(),
+                             os.path.join(self.root, '.git', 'info',
+                                          'exclude')):
+            if exclude_file:
+                self._base_rules.extend(_read_rules(exclude_file, ''))
+        self._dockerignore = docker_helpers.read_dockerignore(self.root)
+
+    def is_ignore_file(self, path):
+        relpath = self._relpath(path)
+        return relpath is not None and (
+            os.path.basename(relpath) in IGNORE_FILES or
+            relpath == '.git/info/exclude')
+
+    def is_ignored(self, path, is_dir=None):
+        """True if git or docker would ignore `path`. `is_dir` is looked
+           up on disk when not given
+        """
+        relpath = self._relpath(path)
+        if not relpath:
+            return False
+        if is_dir is None:
+            is_dir = os.path.isdir(os.path.join(self.root, relpath))
+        return self._is_ignored(relpath, is_dir)
+
+    def _is_ignored(self, relpath, is_dir):
+        key = (relpath, is_dir)
+        if key not in self._cache:
+            parent = relpath.rpartition('/')[0]
+            if self._is_watched(relpath):
+                ignored = False
+            elif relpath.split('/')[0] in docker_helpers.ALWAYS_EXCLUDED:
+                # git internals and what mlt writes while it builds
+                ignored = True
+            elif parent and self._is_ignored(parent, True):
+                # nothing inside an ignored directory can be re-included
+                ignored = True
+            else:
+                ignored = self._matches(relpath, is_dir) or \
+                    docker_helpers.is_dockerignored(
+                        relpath, self._dockerignore)
+            self._cache[key] = ignored
+        return self._cache[key]
+
+    def _is_watched(self, relpath):
+        """a watched path, inside one or on the way to one"""
+        for watched in self.watched:
+            if relpath == watched or relpath.startswith(watched + '/') or \
+                    watched.startswith(relpath + '/'):
+                return True
+        return False
+
+    def _matches(self, relpath, is_dir):
+        """the last matching rule wins; rules from deeper .gitignore files
+           come later and so take precedence
+        """
+        ignored = False
+        for rule in self._rules_for(relpath.rpartition('/')[0]):
+            if rule.matches(relpath, is_dir):
+                ignored = not rule.negate
+        return ignored
+
+    def _rules_for(self, directory):
+        """all rules that apply to entries of `directory`, read lazily"""
+        if directory not in self._dir_rules:
+            if directory:
+                parent_rules = self._rules_for(
+                    directory.rpartition('/')[0])
+            else:
+                parent_rules = self._base_rules
+            self._dir_rules[directory] = parent_rules + _read_rules(
+                os.path.join(self.root, directory, '.gitignore'), directory)
+        return self._dir_rules[directory]
+
+    def _relpath(self, path):
+        relpath = os.path.relpath(os.path.abspath(path), self.root)
+        if relpath == os.curdir:
+            return ''
+        if relpath.startswith(os.pardir):
+            return None
+        return relpath.replace(os.sep, '/')
+
+
+class IgnoreRule(object):
+    def __init__(self, pattern, base):
+        self.negate = pattern.startswith('!')
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        # patterns with a slash are relative to their .gitignore,
+        # others match a name at any depth below it
+        self.anchored = '/' in pattern
+        self.base = base + '/' if base else ''
+        self.regex = re.compile(_wildmatch_regex(pattern.lstrip('/')))
+
+    def matches(self, relpath, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        if not relpath.startswith(self.base):
+            return False
+        relpath = relpath[len(self.base):]
+        if not self.anchored:
+            relpath = relpath.rpartition('/')[2]
+        return self.regex.match(relpath) is not None
+
+
+def _read_rules(ignore_file, base):
+    if not os.path.isfile(ignore_file):
+        return []
+    rules = []
+    with open(ignore_file) as f:
+        for line in f.read().splitlines():
+            # trailing spaces are dropped unless escaped with a backslash
+            stripped = line.rstrip(' ')
+            if stripped.endswith('\\') and len(stripped) < len(line):
+                stripped += ' '
+            # `\#` and `\!` stay escaped and match literally
+            if stripped and not stripped.startswith('#'):
+                rules.append(IgnoreRule(stripped, base))
+    return rules
+
+
+def _wildmatch_regex(pattern):
+    """translates a gitignore glob into a regex, where `*`, `?` and
+       brackets never match a `/` and `**` spans directories
+    """
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i) and (i == 0 or pattern[i - 1] == '/'):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i) and i == len(pattern) - 2 and \
+                (i == 0 or pattern[i - 1] == '/'):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            chars = pattern[i + 1:end]
+            negate = chars[0] in '!^'
+            if negate:
+                chars = chars[1:]
+            regex += '(?!/)[{}{}]'.format(
+                '^' if negate else '',
+                chars.replace('\\', '\\\\').replace('^', '\\^'))
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex + '$'
+
+
+def _global_excludes_file():
+    """core.excludesFile, or git's default of ~/.config/git/ignore"""
+    try:
+        with open(os.devnull, 'wb') as quiet:
+            configured = check_output(
+                ["git", "config", "--path", "--get", "core.excludesFile"],
+                stderr=quiet).decode('utf-8').strip()
+        if configured:
+            return configured
+    except (CalledProcessError, OSError):
+        pass
+    config_home = os.environ.get('XDG_CONFIG_HOME') or os.path.join(
+        os.path.expanduser('~'), '.config')
+    return os.path.join(config_home, 'git', 'ignore')
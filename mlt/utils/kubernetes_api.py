@@ -0,0 +1,410 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import atexit
+import base64
+import json
+import os
+import socket
+import ssl
+import tempfile
+import threading
+import yaml
+
+try:
+    # python 3
+    from http.client import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib.parse import quote, urlencode, urlparse
+except ImportError:
+    # python 2
+    from httplib import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib import quote, urlencode
+    from urlparse import urlparse
+
+# seconds to wait on the api server for anything but a watch
+REQUEST_TIMEOUT = 30
+# asks for a list of objects with only their metadata filled in
+METADATA_LIST_ACCEPT = ('application/json;as=PartialObjectMetadataList;'
+                        'g=meta.k8s.io;v=v1beta1, application/json')
+
+# owned objects, like the pods of a job, are deleted after their owner
+DELETE_OPTIONS = {'kind': 'DeleteOptions', 'apiVersion': 'v1',
+                  'propagationPolicy': 'Background'}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class KubernetesError(Exception):
+    def __init__(self, status, reason, body=None):
+        super(KubernetesError, self).__init__(
+            "{} {}: {}".format(status, reason, body or ''))
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+
+class KubeconfigNotSupported(Exception):
+    pass
+
+
+def get_client():
+    """the shared client for this invocation, or None if the cluster can
+       only be reached through kubectl (no kubeconfig, auth plugins...)
+       set MLT_USE_KUBECTL=1 to always use kubectl
+    """
+    global _client
+    if os.environ.get('MLT_USE_KUBECTL'):
+        return None
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = KubernetesClient.from_kubeconfig()
+            except (KubeconfigNotSupported, IOError, OSError,
+                    KeyError, ValueError, yaml.YAMLError):
+                _client = False
+        return _client or None
+
+
+def load_kubeconfig(path=None, context=None):
+    """returns (cluster, user, namespace) for `context`, defaulting to the
+       current context of $KUBECONFIG (or ~/.kube/config). Multiple files
+       in $KUBECONFIG are merged, with the first one to set a value winning
+    """
+    if path is None:
+        path = os.environ.get('KUBECONFIG') or os.path.join(
+            os.path.expanduser('~'), '.kube', 'config')
+    config = {'clusters': {}, 'users': {}, 'contexts': {}}
+    current_context = None
+    for kubeconfig in reversed([p for p in path.split(os.pathsep) if p]):
+        if not os.path.isfile(kubeconfig):
+            continue
+        with open(kubeconfig) as f:
+            data = yaml.safe_load(f) or {}
+        basedir = os.path.dirname(os.path.abspath(kubeconfig))
+        for section, key in (('clusters', 'cluster'), ('users', 'user'),
+                             ('contexts', 'context')):
+            for entry in data.get(section) or []:
+                value = dict(entry.get(key) or {}, basedir=basedir)
+                config[section][entry['name']] = value
+        current_context = data.get('current-context') or current_context
+
+    context = context or current_context
+    if not context or context not in config['contexts']:
+        raise KubeconfigNotSupported("No kubernetes context configured")
+    ctx = config['contexts'][context]
+    return (dict(config['clusters'][ctx['cluster']], context=context),
+            config['users'].get(ctx.get('user'), {}),
+            ctx.get('namespace'))
+
+
+class KubernetesClient(object):
+    """Talks to the kubernetes api server over keep-alive connections
+       that are reused for every call made during one mlt invocation
+    """
+
+    def __init__(self, server, token=None, username=None, password=None,
+                 cert_file=None, key_file=None, ca_file=None, ca_data=None,
+                 insecure=False, context=None):
+        url = urlparse(server)
+        self.server = server
+        self.context = context
+        self.scheme = url.scheme or 'https'
+        self.host = url.hostname
+        self.port = url.port
+        self.base_path = url.path.rstrip('/')
+        self.headers = {'Accept': 'application/json',
+                        'User-Agent': 'mlt'}
+        if token:
+            self.headers['Authorization'] = 'Bearer {}'.format(token)
+        elif username:
+            credentials = '{}:{}'.format(username, password or '')
+            self.headers['Authorization'] = 'Basic {}'.format(
+                base64.b64encode(credentials.encode('utf-8')).decode('ascii'))
+
+        self.ssl_context = None
+        if self.scheme == 'https':
+            self.ssl_context = ssl.create_default_context(
+                cafile=ca_file, cadata=ca_data)
+            if insecure:
+                self.ssl_context.check_hostname = False
+                self.ssl_context.verify_mode = ssl.CERT_NONE
+            if cert_file:
+                self.ssl_context.load_cert_chain(cert_file, key_file)
+
+        self._idle = []
+        self._idle_lock = threading.Lock()
+        self._resources = {}
+
+    @classmethod
+    def from_kubeconfig(cls, path=None, context=None):
+        cluster, user, _ = load_kubeconfig(path, context)
+        if user.get('auth-provider') or user.get('exec'):
+            # token refresh for these is handled by kubectl itself
+            raise KubeconfigNotSupported("Unsupported kubeconfig auth")
+
+        basedir = cluster['basedir']
+        token = user.get('token')
+        if not token and user.get('tokenFile'):
+            with open(os.path.join(basedir, user['tokenFile'])) as f:
+                token = f.read().strip()
+
+        ca_data = None
+        if cluster.get('certificate-authority-data'):
+            ca_data = base64.b64decode(
+                cluster['certificate-authority-data']).decode('utf-8')
+        return cls(
+            cluster['server'], token=token,
+            username=user.get('username'), password=user.get('password'),
+            cert_file=_kubeconfig_file(user, 'client-certificate', basedir),
+            key_file=_kubeconfig_file(user, 'client-key', basedir),
+            ca_file=_kubeconfig_file(
+                cluster, 'certificate-authority', basedir),
+            ca_data=ca_data,
+            insecure=cluster.get('insecure-skip-tls-verify', False),
+            context=cluster['context'])
+
+    def request(self, method, path, query=None, body=None,
+                content_type='application/json', accept=None):
+        """performs a request and returns the decoded json response"""
+        response, connection = self._send(
+            method, path, query, body, content_type, accept)
+        data = response.read()
+        self._release(connection)
+        if response.status >= 400:
+            raise KubernetesError(response.status, response.reason,
+                                  data.decode('utf-8', 'replace'))
+        return json.loads(data.decode('utf-8')) if data else None
+
+    def stream(self, path, query=None, timeout=None):
+        """yields one decoded json object per line of a streaming response,
+           like the events of a watch, on a connection of its own
+        """
+        for line in self.stream_lines(path, query, timeout):
+            if line.strip():
+                yield json.loads(line)
+
+    def stream_lines(self, path, query=None, timeout=None):
+        """yields the decoded lines of a streaming response as they come,
+           like those of a followed pod log, on a connection of its own
+        """
+        connection = self._connect(timeout)
+        response = self._request_on(connection, 'GET', path, query)
+        try:
+            if response.status >= 400:
+                raise KubernetesError(response.status, response.reason,
+                                      response.read().decode('utf-8'))
+            for line in iter(response.readline, b''):
+                yield line.decode('utf-8', 'replace')
+        finally:
+            connection.close()
+
+    def get(self, path, query=None, accept=None):
+        return self.request('GET', path, query, accept=accept)
+
+    def post(self, path, body, query=None):
+        return self.request('POST', path, query, body)
+
+    def patch(self, path, body):
+        return self.request('PATCH', path, body=body,
+                            content_type='application/merge-patch+json')
+
+    def delete(self, path, query=None, body=None):
+        return self.request('DELETE', path, query, body)
+
+    def resource_path(self, api_version, kind, namespace=None, name=None):
+        """url of the collection of `kind` objects, or of the named one,
+           looked up through the api discovery endpoints
+        """
+        if api_version not in self._resources:
+            prefix = '/api/' if '/' not in api_version else '/apis/'
+            discovery = self.get(prefix + api_version)
+            self._resources[api_version] = dict(
+                (r['kind'], r) for r in discovery['resources']
+                if '/' not in r['name'])
+        resource = self._resources[api_version].get(kind)
+        if resource is None:
+            raise KubernetesError(404, 'Not Found', "No {} resource in "
+                                  "{}".format(kind, api_version))
+
+        path = '/api/' if '/' not in api_version else '/apis/'
+        path += api_version
+        if resource['namespaced'] and namespace:
+            path += '/namespaces/' + quote(namespace)
+        path += '/' + resource['name']
+        if name:
+            path += '/' + quote(name)
+        return path
+
+    def namespace_exists(self, namespace):
+        try:
+            self.get('/api/v1/namespaces/' + quote(namespace))
+        except KubernetesError as e:
+            if e.status == 404:
+                return False
+            raise
+        return True
+
+    def create_namespace(self, namespace):
+        return self.post('/api/v1/namespaces', {
+            'apiVersion': 'v1', 'kind': 'Namespace',
+            'metadata': {'name': namespace}})
+
+    def list_crd_names(self):
+        """names of the installed crds. Asks for metadata only, so the
+           server leaves out every crd's schema; servers older than 1.15
+           ignore that and send the full objects
+        """
+        crds = self.get(
+            '/apis/apiextensions.k8s.io/v1beta1/customresourcedefinitions',
+            accept=METADATA_LIST_ACCEPT)
+        return set(crd['metadata']['name'] for crd in crds['items'])
+
+    def apply(self, obj, namespace):
+        """creates `obj`, or merges it into the existing object"""
+        namespace = obj['metadata'].get('namespace', namespace)
+        collection = self.resource_path(
+            obj['apiVersion'], obj['kind'], namespace)
+        try:
+            return self.post(collection, obj)
+        except KubernetesError as e:
+            if e.status != 409:
+                raise
+        return self.patch(self.resource_path(
+            obj['apiVersion'], obj['kind'], namespace,
+            obj['metadata']['name']), obj)
+
+    def delete_object(self, obj, namespace):
+        """deletes `obj` along with everything it owns, like its pods"""
+        namespace = obj['metadata'].get('namespace', namespace)
+        try:
+            return self.delete(
+                self.resource_path(obj['apiVersion'], obj['kind'],
+                                   namespace, obj['metadata']['name']),
+                body=DELETE_OPTIONS)
+        except KubernetesError as e:
+            if e.status != 404:
+                raise
+
+    def delete_collection(self, api_version, kind, namespace,
+                          label_selector):
+        """deletes the `kind` objects matching `label_selector` in one
+           call, with everything they own going in the background. A kind
+           the cluster doesn't have has nothing to delete; kinds that can't
+           be deleted as a collection, like services, go one at a time
+        """
+        try:
+            path = self.resource_path(api_version, kind, namespace)
+        except KubernetesError as e:
+            if e.status == 404:
+                return
+            raise
+        try:
+            return self.delete(path, {'labelSelector': label_selector},
+                               body=DELETE_OPTIONS)
+        except KubernetesError as e:
+            if e.status != 405:
+                raise
+        for obj in self.get(path, {'labelSelector': label_selector})['items']:
+            self.delete_object(dict(obj, apiVersion=api_version, kind=kind),
+                               namespace)
+
+    def list_pods(self, namespace, label_selector=None):
+        query = {'labelSelector': label_selector} if label_selector else None
+        return self.get('/api/v1/namespaces/{}/pods'.format(
+            quote(namespace)), query)['items']
+
+    def get_pod(self, namespace, name):
+        try:
+            return self.get('/api/v1/namespaces/{}/pods/{}'.format(
+                quote(namespace), quote(name)))
+        except KubernetesError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def _send(self, method, path, query, body, content_type, accept=None):
+        """sends on an idle connection when we have one; if the server
+           has closed that in the meantime, retries on a fresh one
+        """
+        connection = self._acquire()
+        reused = not connection.fresh
+        try:
+            return self._request_on(connection, method, path, query, body,
+                                    content_type, accept), connection
+        except (HTTPException, socket.error):
+            connection.close()
+            if not reused:
+                raise
+        connection = self._connect(REQUEST_TIMEOUT)
+        return self._request_on(connection, method, path, query, body,
+                                content_type, accept), connection
+
+    def _request_on(self, connection, method, path, query=None, body=None,
+                    content_type='application/json', accept=None):
+        url = self.base_path + path
+        if query:
+            url += '?' + urlencode(query)
+        headers = dict(self.headers)
+        if accept:
+            headers['Accept'] = accept
+        if body is not None:
+            # sent in one packet with the headers, not after them
+            body = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = content_type
+        connection.request(method, url, body=body, headers=headers)
+        connection.fresh = False
+        return connection.getresponse()
+
+    def _connect(self, timeout=REQUEST_TIMEOUT):
+        if self.scheme == 'https':
+            connection = HTTPSConnection(self.host, self.port,
+                                         timeout=timeout,
+                                         context=self.ssl_context)
+        else:
+            connection = HTTPConnection(self.host, self.port,
+                                        timeout=timeout)
+        connection.fresh = True
+        return connection
+
+    def _acquire(self):
+        with self._idle_lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def _release(self, connection):
+        with self._idle_lock:
+            self._idle.append(connection)
+
+
+def _kubeconfig_file(section, key, basedir):
+    """path of a `key` file from kubeconfig; inline `key-data` gets written
+       to a private temp file that is removed when mlt exits
+    """
+    if section.get(key + '-data'):
+        fd, path = tempfile.mkstemp(prefix='mlt-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(base64.b64decode(section[key + '-data']))
+        atexit.register(os.remove, path)
+        return path
+    if section.get(key):
+        return os.path.join(basedir, os.path.expanduser(section[key]))
+    return None
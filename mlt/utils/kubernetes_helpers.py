@@ -18,22 +18,605 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 
+import hashlib
 import os
+import socket
 import sys
 import json
+import tempfile
+import threading
+import time
+import yaml
 
-from subprocess import call
+from contextlib import contextmanager
+from subprocess import call, check_output, PIPE
+from termcolor import colored
 
-from mlt.utils import process_helpers
+from mlt.utils import git_helpers, kubernetes_api, process_helpers
+
+try:
+    # python 3
+    from http.client import HTTPException
+except ImportError:
+    # python 2
+    from httplib import HTTPException
+
+# file types kubectl reads when it's given a directory
+MANIFEST_EXTENSIONS = ('.json', '.yaml', '.yml')
+
+# seconds between listings when kubectl can't watch for us
+POLL_INTERVAL = 5
+
+# seconds a pod watch lasts before it is resumed
+WATCH_TIMEOUT = 300
+
+# objects sent to the cluster in one `kubectl apply`
+APPLY_BATCH_SIZE = 100
+
+# seconds the crds found on a cluster are used before listing them again
+DEFAULT_CRD_CACHE_TTL = 600
+
+# container waiting reasons that won't go away by waiting longer
+POD_FAILURE_REASONS = ('CrashLoopBackOff', 'CreateContainerConfigError',
+                       'ErrImagePull', 'ImagePullBackOff',
+                       'InvalidImageName')
 
 
 def ensure_namespace_exists(ns):
+    client = kubernetes_api.get_client()
+    if client:
+        with _exit_on_api_error():
+            if not client.namespace_exists(ns):
+                client.create_namespace(ns)
+        return
+
     exit_code = call(["kubectl", "get", "namespace", ns], stdout=open(
         os.devnull, 'wb'), stderr=open(os.devnull, 'wb'))
-    if exit_code is not 0:
+    if exit_code != 0:
         process_helpers.run(["kubectl", "create", "namespace", ns])
 
 
+def apply_files(namespace, filenames):
+    """creates or updates the objects in the given manifests"""
+    client = kubernetes_api.get_client()
+    if client:
+        with _exit_on_api_error():
+            for obj in load_objects(filenames):
+                client.apply(obj, namespace)
+        return
+
+    command = ["kubectl", "--namespace", namespace, "apply"]
+    for filename in filenames:
+        command.extend(["-f", filename])
+    process_helpers.run(command)
+
+
+def apply_objects(namespace, objects, concurrency=1, rate_limit=None):
+    """creates or updates many objects, with up to `concurrency` requests
+       in flight and at most `rate_limit` objects sent per second.
+       kubectl gets them in batches, one `kubectl apply` per batch.
+       Returns (object, error) for every object that failed to apply.
+    """
+    limiter = RateLimiter(rate_limit) if rate_limit else None
+    client = kubernetes_api.get_client()
+    if client:
+        def apply(batch):
+            obj, = batch
+            if limiter:
+                limiter.acquire()
+            try:
+                client.apply(obj, namespace)
+            except (kubernetes_api.KubernetesError, HTTPException,
+                    socket.error) as e:
+                return [(obj, str(e) or type(e).__name__)]
+            return []
+        work = [[obj] for obj in objects]
+    else:
+        def apply(batch):
+            if limiter:
+                limiter.acquire(len(batch))
+            process = process_helpers.run_popen(
+                ["kubectl", "--namespace", namespace, "apply", "-f", "-"],
+                stdin=PIPE, stdout=False)
+            _, error = process.communicate(json.dumps(
+                {'apiVersion': 'v1', 'kind': 'List',
+                 'items': batch}).encode('utf-8'))
+            if process.returncode == 0:
+                return []
+            error = error.decode('utf-8', 'replace').strip()
+            return [(obj, error) for obj in batch]
+        work = [objects[i:i + APPLY_BATCH_SIZE]
+                for i in range(0, len(objects), APPLY_BATCH_SIZE)]
+
+    failures = []
+    lock = threading.Lock()
+    pending = iter(work)
+
+    def worker():
+        while True:
+            with lock:
+                batch = next(pending, None)
+            if batch is None:
+                return
+            try:
+                failed = apply(batch)
+            except Exception as e:
+                # anything unexpected fails just this item, the rest of
+                # the queue still gets applied
+                error = '{}: {}'.format(type(e).__name__, e)
+                failed = [(obj, error) for obj in batch]
+            with lock:
+                failures.extend(failed)
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(max(1, min(concurrency, len(work))))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        # joined in steps so ctrl-c still gets through on python 2
+        while thread.is_alive():
+            thread.join(1.0)
+    return failures
+
+
+class RateLimiter(object):
+    """Token bucket: lets `rate` tokens through per second on average,
+       and bursts of up to one second's worth
+    """
+
+    def __init__(self, rate, clock=time.time, sleep=time.sleep):
+        self.rate = float(rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.rate
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.rate, self.tokens +
+                              (now - self.updated) * self.rate)
+            self.updated = now
+            # taken right away, so later callers queue up behind us
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            self.sleep(wait)
+
+
+def delete_files(namespace, directory):
+    """deletes the objects in the manifests found in `directory`"""
+    client = kubernetes_api.get_client()
+    if client:
+        filenames = [os.path.join(directory, f)
+                     for f in sorted(os.listdir(directory))
+                     if f.endswith(MANIFEST_EXTENSIONS)]
+        with _exit_on_api_error():
+            for obj in load_objects(filenames):
+                client.delete_object(obj, namespace)
+        return
+
+    process_helpers.run(
+        ["kubectl", "--namespace", namespace, "delete", "-f", directory])
+
+
+def list_pods(namespace, label_selector=None):
+    client = kubernetes_api.get_client()
+    if client:
+        with _exit_on_api_error():
+            return client.list_pods(namespace, label_selector)
+
+    command = ["kubectl", "get", "pods", "--namespace", namespace,
+               "-o", "json"]
+    if label_selector:
+        command.extend(["-l", label_selector])
+    return json.loads(process_helpers.run(command))['items']
+
+
+def list_nodes():
+    """every node of the cluster, or None if we may not list them"""
+    return _list_or_none('/api/v1/nodes', None,
+                         ["kubectl", "get", "nodes", "-o", "json"])
+
+
+def list_resource_quotas(namespace):
+    return _list_or_none(
+        '/api/v1/namespaces/{}/resourcequotas'.format(namespace), None,
+        ["kubectl", "get", "resourcequotas", "--namespace", namespace,
+         "-o", "json"]) or []
+
+
+def list_active_pods(namespace):
+    """pods that haven't finished, in every namespace, or only in
+       `namespace` if we may not see the others
+    """
+    selector = 'status.phase!=Succeeded,status.phase!=Failed'
+    pods = _list_or_none(
+        '/api/v1/pods', {'fieldSelector': selector},
+        ["kubectl", "get", "pods", "--all-namespaces", "--field-selector",
+         selector, "-o", "json"])
+    if pods is None:
+        pods = _list_or_none(
+            '/api/v1/namespaces/{}/pods'.format(namespace),
+            {'fieldSelector': selector},
+            ["kubectl", "get", "pods", "--namespace", namespace,
+             "--field-selector", selector, "-o", "json"])
+    return pods or []
+
+
+def _list_or_none(path, query, command):
+    """the items of a list call, or None if we aren't allowed to make it"""
+    client = kubernetes_api.get_client()
+    if client:
+        try:
+            return client.get(path, query)['items']
+        except kubernetes_api.KubernetesError as e:
+            if e.status in (401, 403):
+                return None
+            print(colored(str(e), 'red'))
+            sys.exit(1)
+
+    process = process_helpers.run_popen(command, stderr=False)
+    output = process.stdout.read().decode('utf-8')
+    if process.wait() != 0:
+        return None
+    return json.loads(output)['items']
+
+
+def wait_for_pod_changes(namespace, label_selector, phases, timeout):
+    """blocks until a pod matching `label_selector` is added, removed or
+       changes phase, compared to `phases` (pod name to phase), or for at
+       most `timeout` seconds. Follows a watch; with kubectl it polls.
+    """
+    deadline = time.time() + timeout
+    client = kubernetes_api.get_client()
+    if not client:
+        while time.time() < deadline:
+            time.sleep(max(0, min(POLL_INTERVAL, deadline - time.time())))
+            if pod_phases(list_pods(namespace, label_selector)) != phases:
+                return
+        return
+
+    path = '/api/v1/namespaces/{}/pods'.format(namespace)
+    query = {'labelSelector': label_selector}
+    with _exit_on_api_error():
+        pods = client.get(path, query)
+    if pod_phases(pods['items']) != phases:
+        return
+
+    remaining = max(1, int(deadline - time.time()))
+    query.update(watch='true', timeoutSeconds=remaining,
+                 resourceVersion=pods['metadata']['resourceVersion'])
+    try:
+        with _exit_on_api_error():
+            for event in client.stream(path, query, timeout=remaining + 5):
+                if event['type'] == 'ERROR':
+                    return
+                pod = event['object']
+                phase = None if event['type'] == 'DELETED' else \
+                    (pod.get('status') or {}).get('phase')
+                if phases.get(pod['metadata']['name']) != phase:
+                    return
+    except socket.timeout:
+        pass
+
+
+def pod_phases(pods):
+    """pod name to phase, for each of `pods`"""
+    return dict((pod['metadata']['name'],
+                 (pod.get('status') or {}).get('phase')) for pod in pods)
+
+
+def list_objects(namespace, api_version, kind, label_selector=None):
+    """the `kind` objects of the namespace, or [] if the cluster doesn't
+       have that kind of object
+    """
+    client = kubernetes_api.get_client()
+    if client:
+        query = {'labelSelector': label_selector} if label_selector else None
+        try:
+            return client.get(client.resource_path(
+                api_version, kind, namespace), query)['items']
+        except kubernetes_api.KubernetesError as e:
+            if e.status == 404:
+                return []
+            print(colored(str(e), 'red'))
+            sys.exit(1)
+
+    command = ["kubectl", "get", _kubectl_resource(api_version, kind),
+               "--namespace", namespace, "-o", "json"]
+    if label_selector:
+        command += ["-l", label_selector]
+    process = process_helpers.run_popen(command, stderr=False)
+    output = process.stdout.read().decode('utf-8')
+    if process.wait() != 0:
+        return []
+    return json.loads(output)['items']
+
+
+def delete_collection(namespace, api_version, kind, label_selector):
+    """deletes every `kind` object matching `label_selector`, and in the
+       background what they own; kinds the cluster doesn't have are skipped
+    """
+    client = kubernetes_api.get_client()
+    if client:
+        with _exit_on_api_error():
+            client.delete_collection(api_version, kind, namespace,
+                                     label_selector)
+        return
+
+    process = process_helpers.run_popen(
+        ["kubectl", "delete", _kubectl_resource(api_version, kind),
+         "--namespace", namespace, "-l", label_selector,
+         "--ignore-not-found"], stdout=False)
+    error = process.stderr.read().decode('utf-8')
+    if process.wait() != 0 and "doesn't have a resource type" not in error:
+        print(colored(error, 'red'))
+        sys.exit(1)
+
+
+def _kubectl_resource(api_version, kind):
+    """kubectl takes `kind.version.group`, like job.v1.batch"""
+    return '.'.join([kind.lower()] + api_version.split('/')[::-1])
+
+
+def watch_pods(namespace, label_selector):
+    """watch_objects for pods"""
+    return watch_objects(namespace, 'v1', 'Pod', label_selector)
+
+
+def watch_objects(namespace, api_version, kind, label_selector):
+    """yields a SYNC event with every `kind` object matching
+       `label_selector` in its `items`, then the watch events of those
+       objects as they change. An expired watch is resumed, or synced again
+       if the server no longer has its version. A kind the cluster doesn't
+       have gets one empty SYNC event. With kubectl the objects are listed
+       every POLL_INTERVAL seconds, each listing as a SYNC event.
+    """
+    client = kubernetes_api.get_client()
+    if not client:
+        while True:
+            items = list_pods(namespace, label_selector) if kind == 'Pod' \
+                else list_objects(namespace, api_version, kind,
+                                  label_selector)
+            yield {'type': 'SYNC', 'items': items}
+            time.sleep(POLL_INTERVAL)
+
+    with _exit_on_api_error():
+        try:
+            path = client.resource_path(api_version, kind, namespace)
+        except kubernetes_api.KubernetesError as e:
+            if e.status != 404:
+                raise
+            path = None
+    if path is None:
+        yield {'type': 'SYNC', 'items': []}
+        return
+
+    while True:
+        with _exit_on_api_error():
+            objects = client.get(path, {'labelSelector': label_selector})
+        yield {'type': 'SYNC', 'items': objects['items']}
+
+        version = objects['metadata']['resourceVersion']
+        while version:
+            query = {'labelSelector': label_selector, 'watch': 'true',
+                     'resourceVersion': version,
+                     'timeoutSeconds': WATCH_TIMEOUT}
+            try:
+                with _exit_on_api_error():
+                    for event in client.stream(path, query,
+                                               timeout=WATCH_TIMEOUT + 5):
+                        if event['type'] == 'ERROR':
+                            # 410 Gone: too old to resume, so list again
+                            version = None
+                            break
+                        version = event['object']['metadata'].get(
+                            'resourceVersion', version)
+                        if event['type'] != 'BOOKMARK':
+                            yield event
+            except socket.timeout:
+                pass
+
+
+def stream_log(namespace, podname, container, follow=False,
+               since_time=None):
+    """yields the lines of a container's log, each starting with its
+       timestamp; with `follow` until the container stops
+    """
+    client = kubernetes_api.get_client()
+    if client:
+        query = {'container': container, 'timestamps': 'true'}
+        if follow:
+            query['follow'] = 'true'
+        if since_time:
+            query['sinceTime'] = since_time
+        for line in client.stream_lines(
+                '/api/v1/namespaces/{}/pods/{}/log'.format(
+                    namespace, podname), query,
+                timeout=None if follow else kubernetes_api.REQUEST_TIMEOUT):
+            yield line
+        return
+
+    command = ["kubectl", "logs", "--namespace", namespace, podname,
+               "--container", container, "--timestamps"]
+    if follow:
+        command.append("--follow")
+    if since_time:
+        command.append("--since-time={}".format(since_time))
+    process = process_helpers.run_popen(command, stderr=False)
+    try:
+        for line in iter(process.stdout.readline, b''):
+            yield line.decode('utf-8', 'replace')
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+
+
+def get_pod(namespace, podname):
+    """the pod as a dict, or None if it doesn't exist (yet)"""
+    client = kubernetes_api.get_client()
+    if client:
+        with _exit_on_api_error():
+            return client.get_pod(namespace, podname)
+
+    pod = process_helpers.run_popen(
+        ["kubectl", "get", "pods", "--namespace", namespace, podname,
+         "-o", "json"], stderr=False).stdout.read().decode('utf-8')
+    return json.loads(pod) if pod else None
+
+
+def wait_for_pod_running(namespace, timeout, podname=None,
+                         label_selector=None):
+    """blocks until the pod with `podname`, or the first pod matching
+       `label_selector`, is Running and returns its name.
+       Raises ValueError as soon as the pod can't start, or once `timeout`
+       seconds have passed.
+    """
+    deadline = time.time() + timeout
+    client = kubernetes_api.get_client()
+    while time.time() < deadline:
+        if client:
+            pod = _watch_for_running_pod(
+                client, namespace, podname, label_selector, deadline)
+        else:
+            pod = _poll_for_running_pod(
+                namespace, podname, label_selector, deadline)
+        if pod:
+            return pod['metadata']['name']
+
+    raise ValueError("Pod {} not Running after {} seconds".format(
+        podname or label_selector, timeout))
+
+
+def _watch_for_running_pod(client, namespace, podname, label_selector,
+                           deadline):
+    """lists the pods once, then follows changes to them through a watch
+       until one is Running. Returns None if the watch ends without that
+    """
+    path = '/api/v1/namespaces/{}/pods'.format(namespace)
+    query = {}
+    if podname:
+        query['fieldSelector'] = 'metadata.name={}'.format(podname)
+    if label_selector:
+        query['labelSelector'] = label_selector
+
+    try:
+        with _exit_on_api_error():
+            pods = client.get(path, query)
+    except (HTTPException, socket.error):
+        # the api server dropped us; list again shortly, until the deadline
+        time.sleep(max(0, min(1, deadline - time.time())))
+        return None
+    for pod in pods['items']:
+        if _pod_is_running(pod):
+            return pod
+
+    remaining = max(1, int(deadline - time.time()))
+    query.update(watch='true', timeoutSeconds=remaining,
+                 resourceVersion=pods['metadata']['resourceVersion'])
+    try:
+        with _exit_on_api_error():
+            for event in client.stream(path, query, timeout=remaining + 5):
+                if event['type'] == 'ERROR':
+                    # our resourceVersion expired, so list again
+                    return None
+                if event['type'] != 'DELETED' and \
+                        _pod_is_running(event['object']):
+                    return event['object']
+    except (HTTPException, socket.error):
+        # timed out or cut off, so list again
+        pass
+    return None
+
+
+def _poll_for_running_pod(namespace, podname, label_selector, deadline):
+    if podname:
+        pods = [get_pod(namespace, podname)]
+    else:
+        pods = list_pods(namespace, label_selector)
+    for pod in pods:
+        if pod and _pod_is_running(pod):
+            return pod
+    time.sleep(max(0, min(1, deadline - time.time())))
+    return None
+
+
+def _pod_is_running(pod):
+    """True once the pod is Running. Raises ValueError if it's stuck in a
+       state it won't recover from, so we don't wait out the timeout
+    """
+    status = pod.get('status') or {}
+    phase = status.get('phase')
+    if phase == 'Running':
+        return True
+    if phase in ('Failed', 'Succeeded'):
+        raise ValueError("Pod {} is {}".format(
+            pod['metadata']['name'], phase))
+    for container in status.get('containerStatuses') or []:
+        waiting = (container.get('state') or {}).get('waiting') or {}
+        if waiting.get('reason') in POD_FAILURE_REASONS:
+            raise ValueError("Pod {} can't start: {} {}".format(
+                pod['metadata']['name'], waiting['reason'],
+                waiting.get('message', '')).strip())
+    return False
+
+
+def add_labels(objects, labels):
+    """adds `labels` to each object and to every pod template inside it,
+       so the pods the objects create carry the labels too
+    """
+    for obj in objects:
+        _merge_labels(obj, labels)
+        _label_templates(obj, labels)
+
+
+def _label_templates(data, labels):
+    if isinstance(data, list):
+        for item in data:
+            _label_templates(item, labels)
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            if key == 'template' and isinstance(value, dict):
+                _merge_labels(value, labels)
+            _label_templates(value, labels)
+
+
+def _merge_labels(obj, labels):
+    metadata = obj.get('metadata') or {}
+    metadata['labels'] = dict(metadata.get('labels') or {}, **labels)
+    obj['metadata'] = metadata
+
+
+def load_objects(filenames):
+    """every kubernetes object in the given yaml or json manifests"""
+    objects = []
+    for filename in filenames:
+        with open(filename) as f:
+            for obj in yaml.safe_load_all(f):
+                if not obj:
+                    continue
+                if obj.get('kind') == 'List':
+                    objects.extend(obj.get('items') or [])
+                else:
+                    objects.append(obj)
+    return objects
+
+
+@contextmanager
+def _exit_on_api_error():
+    """api errors end the command, like a failing kubectl call does"""
+    try:
+        yield
+    except kubernetes_api.KubernetesError as e:
+        print(colored(str(e), 'red'))
+        sys.exit(1)
+
+
 def check_crds(exit_on_failure=False, app_name=None):
     if app_name is None:
         crd_file = 'crd-requirements.txt'
@@ -66,16 +649,72 @@ def check_crds(exit_on_failure=False, app_name=None):
 def checking_crds_on_k8(crd_set):
     """
     Check if given crd list installed on K8 or not.
+    The crds found are cached per kube context for MLT_CRD_CACHE_TTL
+    seconds, and listed again before reporting any as missing, so an
+    operator installed in the meantime is never missed.
     """
 
     try:
-        current_crds_json = process_helpers.run_popen(
-            "kubectl get crd -o json", shell=True
-        ).stdout.read().decode('utf-8')
-        current_crds = set([str(x['metadata']['name'])
-                            for x in
-                            json.loads(current_crds_json)['items']])
+        cache_file = _crd_cache_file()
+        current_crds = _read_crd_cache(cache_file)
+        if current_crds is None or not crd_set <= current_crds:
+            current_crds = _list_crd_names()
+            _write_crd_cache(cache_file, current_crds)
         return crd_set - current_crds
     except Exception as ex:
         print("Crd_Checking - Exception: {}".format(ex))
         return set()
+
+
+def _list_crd_names():
+    client = kubernetes_api.get_client()
+    if client:
+        return client.list_crd_names()
+    # -o name leaves out the crd schemas, which can run to megabytes
+    output = check_output(["kubectl", "get", "crd", "-o", "name"],
+                          stderr=open(os.devnull, 'wb')).decode('utf-8')
+    return set(line.strip().rpartition('/')[2]
+               for line in output.splitlines() if line.strip())
+
+
+def _crd_cache_file():
+    """the crd cache of the current kube context, or None if we can't tell
+       which context kubectl will use
+    """
+    try:
+        cluster = kubernetes_api.load_kubeconfig()[0]
+    except (kubernetes_api.KubeconfigNotSupported, IOError, OSError,
+            KeyError, ValueError, yaml.YAMLError):
+        return None
+    key = u'{}\n{}'.format(cluster['context'], cluster.get('server'))
+    return os.path.join(git_helpers.cache_dir(), 'crds', hashlib.sha256(
+        key.encode('utf-8')).hexdigest()[:16] + '.json')
+
+
+def _read_crd_cache(cache_file):
+    ttl = float(os.environ.get('MLT_CRD_CACHE_TTL', DEFAULT_CRD_CACHE_TTL))
+    try:
+        if time.time() - os.path.getmtime(cache_file) >= ttl:
+            return None
+        with open(cache_file) as f:
+            return set(json.load(f))
+    except (TypeError, IOError, OSError, ValueError):
+        return None
+
+
+def _write_crd_cache(cache_file, crds):
+    if cache_file is None:
+        return
+    cache = os.path.dirname(cache_file)
+    try:
+        if not os.path.isdir(cache):
+            os.makedirs(cache)
+        # written next to the cache and moved into place, so concurrent
+        # mlt commands never read half a file
+        fd, staging = tempfile.mkstemp(dir=cache)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(sorted(crds), f)
+        os.rename(staging, cache_file)
+    except (IOError, OSError):
+        # the cache only saves time, mlt works without it
+        pass
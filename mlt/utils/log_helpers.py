@@ -0,0 +1,129 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+"""
+Merges the logs of several containers into one, in the order their lines
+were written. Every log is read on a thread of its own into a small buffer,
+and a line is only written once every other log has a later line buffered,
+has ended, or has been quiet for a while.
+"""
+import threading
+import time
+
+from collections import deque
+
+# lines buffered per log; a reader that gets this far ahead waits
+BUFFER_SIZE = 1000
+# seconds a quiet log holds back the lines of the others when following
+FOLLOW_LAG = 1.0
+
+# what LogMerger.get returns once every log has been written out
+END = object()
+
+
+def split_timestamp(line):
+    """(sort key, message) of a log line starting with the RFC 3339
+       timestamp kubernetes adds. Sub-second digits are padded, as
+       trailing zeros are left off.
+    """
+    timestamp, _, message = line.rstrip('\r\n').partition(' ')
+    seconds, _, fraction = timestamp.rstrip('Z').partition('.')
+    return seconds + '.' + fraction.ljust(9, '0'), message
+
+
+class LogMerger(object):
+    """Takes lines from several logs, each in time order, and hands them
+       out in time order across all of them. A log without buffered lines
+       holds the others back until it has some or is closed; with `lag`, at
+       most `lag` seconds after it last had any, so a quiet log that is
+       being followed doesn't stop the rest.
+    """
+
+    def __init__(self, buffer_size=BUFFER_SIZE, lag=None, clock=time.time):
+        self.buffer_size = buffer_size
+        self.lag = lag
+        self.clock = clock
+        self._condition = threading.Condition()
+        # log to its buffered (sort key, line) pairs, and when it last put
+        self._buffers = {}
+        self._heard = {}
+        self._closed = set()
+
+    def open(self, log):
+        with self._condition:
+            self._buffers[log] = deque()
+            self._heard[log] = self.clock()
+            self._closed.discard(log)
+
+    def put(self, log, key, line):
+        """buffers a line, waiting while the buffer of `log` is full"""
+        with self._condition:
+            buffer = self._buffers[log]
+            while len(buffer) >= self.buffer_size:
+                self._condition.wait(1.0)
+            buffer.append((key, line))
+            self._heard[log] = self.clock()
+            self._condition.notify_all()
+
+    def close(self, log):
+        with self._condition:
+            self._closed.add(log)
+            self._condition.notify_all()
+
+    def get(self, timeout=1.0):
+        """(log, line) of the earliest line that can go out; None if there
+           was none within `timeout`, or END once every log has been
+           closed and written out
+        """
+        deadline = self.clock() + timeout
+        with self._condition:
+            while True:
+                wait = self._next(deadline)
+                if not isinstance(wait, float):
+                    return wait
+                self._condition.wait(wait)
+
+    def _next(self, deadline):
+        """what get returns, or how long to wait for it"""
+        now = self.clock()
+        for log in [log for log in self._closed if not self._buffers[log]]:
+            del self._buffers[log]
+            del self._heard[log]
+            self._closed.discard(log)
+        if not self._buffers:
+            return END
+
+        heads = [(buffer[0][0], log)
+                 for log, buffer in self._buffers.items() if buffer]
+        wait = deadline - now
+        if heads:
+            waiting_on = [log for log, buffer in self._buffers.items()
+                          if not buffer and log not in self._closed]
+            if self.lag is not None:
+                quiet = [self._heard[log] + self.lag - now
+                         for log in waiting_on]
+                waiting_on = [left for left in quiet if left > 0]
+                wait = min([wait] + waiting_on)
+            if not waiting_on:
+                _, log = min(heads)
+                _, line = self._buffers[log].popleft()
+                self._condition.notify_all()
+                return log, line
+        return None if wait <= 0 else float(wait)
@@ -18,8 +18,17 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 import os
+import signal
 import sys
-from subprocess import check_output, CalledProcessError, Popen, PIPE
+import time
+from collections import deque
+from subprocess import check_output, CalledProcessError, Popen, PIPE, STDOUT
+from threading import Thread
+
+# number of output lines kept in memory for printing when a process fails
+TAIL_LINES = 50
+# lines longer than this are truncated in the in-memory tail only
+MAX_LINE_LENGTH = 4096
 
 
 def run(command, cwd=None):
@@ -32,10 +41,94 @@ def run(command, cwd=None):
     return output
 
 
-def run_popen(command, shell=False, stdout=PIPE, stderr=PIPE):
+def run_popen(command, shell=False, stdout=PIPE, stderr=PIPE, cwd=None,
+              stdin=None):
     """to suppress output, pass False to stdout or stderr
        None is a valid option that we want to allow"""
     with open(os.devnull, 'w') as quiet:
         stdout = quiet if stdout is False else stdout
         stderr = quiet if stderr is False else stderr
-        return Popen(command, stdout=stdout, stderr=stderr, shell=shell)
+        return Popen(command, stdout=stdout, stderr=stderr, shell=shell,
+                     cwd=cwd, stdin=stdin)
+
+
+class StreamingProcess(object):
+    """Runs a command with its output drained on a background reader, so
+       the process never blocks on a full pipe. Output goes to `log_file`
+       and the last `tail_lines` lines are kept in memory; with `verbose`
+       it is also echoed live. `on_line` is called with every decoded line,
+       e.g. to parse progress out of the output.
+       With `process_group` the command gets a process group of its own, so
+       that `terminate` also stops everything it started (like the docker
+       build run by `make`); it then no longer receives the terminal's
+       ctrl-c, so the caller has to terminate it itself.
+    """
+
+    def __init__(self, command, log_file, shell=False, verbose=False,
+                 tail_lines=TAIL_LINES, on_line=None, process_group=False):
+        self.log_file = log_file
+        self.verbose = verbose
+        self.on_line = on_line
+        self.tail = deque(maxlen=tail_lines)
+        self.process_group = process_group and hasattr(os, 'setpgrp')
+        self._log = open(log_file, 'wb')
+        try:
+            self.process = Popen(command, stdout=PIPE, stderr=STDOUT,
+                                 shell=shell, preexec_fn=os.setpgrp
+                                 if self.process_group else None)
+        except Exception:
+            self._log.close()
+            raise
+        self._reader = Thread(target=self._drain, args=(self.process.stdout,))
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _drain(self, pipe):
+        for line in iter(pipe.readline, b''):
+            self._log.write(line)
+            decoded = line.decode('utf-8', 'replace')
+            self.tail.append(decoded[:MAX_LINE_LENGTH])
+            if self.verbose:
+                sys.stdout.write(decoded)
+                sys.stdout.flush()
+            if self.on_line:
+                self.on_line(decoded)
+        pipe.close()
+
+    def poll(self):
+        return self.process.poll()
+
+    def wait(self, timeout=None):
+        """waits for the process and for its output to be fully drained
+           with a `timeout` in seconds, returns None if the process is
+           still running by then instead of blocking any longer
+        """
+        self._reader.join(timeout)
+        if self._reader.is_alive():
+            return None
+        if timeout is not None:
+            # the process may have closed its output just before exiting
+            deadline = time.time() + timeout
+            while self.process.poll() is None:
+                if time.time() >= deadline:
+                    return None
+                time.sleep(0.01)
+        returncode = self.process.wait()
+        self._log.close()
+        return returncode
+
+    def terminate(self):
+        """stops the process (and its process group) if still running"""
+        if self.process.poll() is not None:
+            return
+        try:
+            if self.process_group:
+                os.killpg(self.process.pid, signal.SIGTERM)
+            else:
+                self.process.terminate()
+        except OSError:
+            # it exited in the meantime
+            pass
+
+    def output_tail(self):
+        return ''.join(self.tail)
@@ -21,38 +21,68 @@
 import progressbar
 import time
 
+# redraws per second while waiting on a process; low enough that drawing
+# the bar costs next to nothing next to the build or push it reports on
+FRAME_RATE = 5
 
-def duration_progress(activity, duration, is_done):
-    def progress(activity, iterations=100):
-        bar = progressbar.ProgressBar(
-            widgets=[activity, ' ', progressbar.Bar(),
-                     ' (', progressbar.ETA(), ') ', ])
-        return bar(range(iterations))
-
-    if duration is not None:
-        iterations = 100
-        time_per_iteration = float(duration) / float(iterations)
-
-        bar = progress(activity, iterations)
-        cursor = 0
-        for cursor in range(iterations):
-            bar.next()
-            time.sleep(time_per_iteration)
-
-            # If done early.
-            if is_done():
-                bar.update(100)
-                break
-
-    if not is_done():
-        # if still not done.
-        bar = progressbar.ProgressBar(
-            widgets=[activity, ' ', progressbar.RotatingMarker(),
-                     ' (', progressbar.Timer(), ') ', ],
-            max_value=progressbar.UnknownLength)
-        i = 0
-        while not is_done():
-            bar.update(i)
-            i += 1
-
-    print("")
+
+def process_progress(activity, duration, process, progress=None):
+    """Shows a progress bar until `process` exits, blocking on the process
+       between redraws rather than polling it in a loop.
+       `process` needs a `wait(timeout)` that returns None while it's still
+       running, like `process_helpers.StreamingProcess`.
+       `progress` optionally returns (done, total) parsed from the process
+       output; when that isn't available the bar estimates from the last
+       `duration`, and once that runs out it falls back to a spinner.
+    """
+    started = time.time()
+    bar = None
+    frame = 0
+    while process.wait(1.0 / FRAME_RATE) is None:
+        percent = _percent_done(time.time() - started, duration, progress)
+        if percent is None:
+            if bar is None or not _is_spinner(bar):
+                bar = _spinner(activity)
+            bar.update(frame)
+        else:
+            if bar is None or _is_spinner(bar):
+                bar = _eta_bar(activity)
+            bar.update(percent)
+        frame += 1
+
+    if bar is not None:
+        if not _is_spinner(bar):
+            bar.update(100)
+        bar.finish()
+
+
+def _percent_done(elapsed, duration, progress):
+    """real progress if we have it, otherwise an estimate based on the
+       previous duration or None if there's no estimate left
+    """
+    current = progress() if progress else None
+    if current:
+        done, total = current
+        if total:
+            return min(100, int(100 * done / total))
+    if duration and elapsed < duration:
+        return int(100 * elapsed / duration)
+    return None
+
+
+def _is_spinner(bar):
+    return bar.max_value is progressbar.UnknownLength
+
+
+def _eta_bar(activity):
+    return progressbar.ProgressBar(
+        widgets=[activity, ' ', progressbar.Bar(),
+                 ' (', progressbar.ETA(), ') ', ],
+        max_value=100)
+
+
+def _spinner(activity):
+    return progressbar.ProgressBar(
+        widgets=[activity, ' ', progressbar.RotatingMarker(),
+                 ' (', progressbar.Timer(), ') ', ],
+        max_value=progressbar.UnknownLength)
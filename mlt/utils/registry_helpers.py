@@ -0,0 +1,235 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import base64
+import json
+import os
+import re
+import socket
+import struct
+
+from mlt.utils import docker_helpers
+
+try:
+    # python 3
+    from http.client import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib.parse import urlencode, urlparse
+except ImportError:
+    # python 2
+    from httplib import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib import urlencode
+    from urlparse import urlparse
+
+# registry docker uses for names without a registry host
+DOCKER_HUB = 'registry-1.docker.io'
+DOCKER_HUB_AUTH_KEY = 'https://index.docker.io/v1/'
+
+# manifests with a single image config; lists of per platform manifests
+# don't tell us about the config, so we don't ask for them
+MANIFEST_TYPES = ', '.join([
+    'application/vnd.docker.distribution.manifest.v2+json',
+    'application/vnd.oci.image.manifest.v1+json'])
+
+# seconds to wait on the registry; the check is only worth it while it's
+# much quicker than a push
+REQUEST_TIMEOUT = 10
+
+
+def has_image(remote_name, local_name):
+    """True if the registry already has `remote_name` with the same image
+       config as the local image `local_name`, i.e. pushing would upload
+       nothing new
+    """
+    image_id = docker_helpers.image_id(local_name)
+    return image_id is not None and \
+        remote_config_digest(remote_name) == image_id
+
+
+def parse_image_name(name):
+    """splits `name` into (registry host, repository, tag), with docker's
+       defaults for names without a host or tag
+    """
+    host, _, rest = name.partition('/')
+    if not rest or not ('.' in host or ':' in host or host == 'localhost'):
+        host, rest = DOCKER_HUB, name
+        if '/' not in rest:
+            rest = 'library/' + rest
+    repository, _, tag = rest.partition(':')
+    return host, repository, tag or 'latest'
+
+
+def remote_config_digest(name):
+    """the digest of the config of image `name` in its registry, which is
+       what docker shows as the id of the local image. None if the registry
+       doesn't have the image or we can't ask it. Tries https first; like
+       docker, only falls back to http for a local registry (like
+       registry:2) or one of the daemon's insecure-registries
+    """
+    host, repository, tag = parse_image_name(name)
+    path = '/v2/{}/manifests/{}'.format(repository, tag)
+    schemes = ('https', 'http') if _allows_http(host) else ('https',)
+    for scheme in schemes:
+        try:
+            status, headers, body = _get(scheme, host, path)
+            if status == 401:
+                authorization = _authorization(
+                    headers.get('www-authenticate', ''), host, repository,
+                    scheme)
+                if authorization is None:
+                    return None
+                status, headers, body = _get(scheme, host, path,
+                                             authorization)
+        except (socket.error, HTTPException):
+            # also covers ssl errors from plain http registries
+            continue
+        if status != 200:
+            return None
+        try:
+            return json.loads(body.decode('utf-8'))['config']['digest']
+        except (ValueError, KeyError, TypeError):
+            return None
+    return None
+
+
+def _allows_http(host):
+    """True if docker would talk plain http to the registry at `host`"""
+    hostname = urlparse('//' + host).hostname or ''
+    if hostname in ('localhost', '::1') or hostname.startswith('127.'):
+        return True
+    hosts, cidrs = docker_helpers.insecure_registries()
+    if host in hosts or hostname in hosts:
+        return True
+    if not cidrs:
+        return False
+    try:
+        address = _ipv4(socket.gethostbyname(hostname))
+    except (socket.error, UnicodeError):
+        return False
+    for cidr in cidrs:
+        network, _, bits = cidr.partition('/')
+        try:
+            mask = (0xffffffff << (32 - int(bits or 32))) & 0xffffffff
+            if address & mask == _ipv4(network) & mask:
+                return True
+        except (socket.error, ValueError):
+            # ipv6 networks aren't matched
+            continue
+    return False
+
+
+def _ipv4(address):
+    return struct.unpack('!I', socket.inet_aton(address))[0]
+
+
+def _get(scheme, host, path, authorization=None):
+    connection_class = HTTPSConnection if scheme == 'https' \
+        else HTTPConnection
+    connection = connection_class(host, timeout=REQUEST_TIMEOUT)
+    headers = {'Accept': MANIFEST_TYPES, 'User-Agent': 'mlt'}
+    if authorization:
+        headers['Authorization'] = authorization
+    try:
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        headers = dict((key.lower(), value)
+                       for key, value in response.getheaders())
+        return response.status, headers, response.read()
+    finally:
+        connection.close()
+
+
+def _authorization(challenge, host, repository, scheme):
+    """answers a registry's auth challenge: basic auth with the docker
+       login for `host`, or a pull token from the registry's token service.
+       The login only ever goes out over https.
+    """
+    credentials = _docker_credentials(host)
+    if challenge.lower().startswith('basic'):
+        if scheme != 'https':
+            return None
+        return 'Basic ' + credentials if credentials else None
+    if not challenge.lower().startswith('bearer'):
+        return None
+
+    params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+    realm = urlparse(params.pop('realm', ''))
+    if not realm.hostname:
+        return None
+    params.setdefault('scope', 'repository:{}:pull'.format(repository))
+    status, _, body = _get(
+        realm.scheme, realm.netloc,
+        '{}?{}'.format(realm.path or '/', urlencode(sorted(params.items()))),
+        'Basic ' + credentials if credentials and realm.scheme == 'https'
+        else None)
+    if status != 200:
+        return None
+    try:
+        token = json.loads(body.decode('utf-8'))
+        token = token.get('token') or token.get('access_token')
+    except (ValueError, AttributeError):
+        return None
+    return 'Bearer ' + token if token else None
+
+
+def push_auth(name):
+    """value for the engine api's X-Registry-Auth header when pushing
+       `name`: the login `docker login` stored for its registry, or none
+       at all. None if a credential helper keeps the login, since only the
+       docker cli can run those
+    """
+    host = parse_image_name(name)[0]
+    config = _docker_config()
+    credentials = _docker_credentials(host, config)
+    if credentials:
+        username, _, password = base64.b64decode(
+            credentials).decode('utf-8').partition(':')
+        auth = {'username': username, 'password': password,
+                'serveraddress': host}
+    elif config.get('credsStore') or host in (config.get('credHelpers') or
+                                              {}):
+        return None
+    else:
+        auth = {}
+    return base64.urlsafe_b64encode(
+        json.dumps(auth).encode('utf-8')).decode('ascii')
+
+
+def _docker_config():
+    config_file = os.path.join(
+        os.environ.get('DOCKER_CONFIG') or
+        os.path.join(os.path.expanduser('~'), '.docker'), 'config.json')
+    try:
+        with open(config_file) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _docker_credentials(host, config=None):
+    """base64 `user:password` that `docker login` stored for `host`"""
+    if config is None:
+        config = _docker_config()
+    auths = config.get('auths') or {}
+    key = DOCKER_HUB_AUTH_KEY if host == DOCKER_HUB else host
+    for name in (key, 'https://' + key, 'http://' + key):
+        auth = (auths.get(name) or {}).get('auth')
+        if auth:
+            return auth
+    return None
@@ -0,0 +1,275 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+"""
+Keeps what mlt did in a project, its builds, pushes and deploys, in one
+sqlite database in the project dir.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from mlt.utils import constants
+
+SCHEMA_VERSION = 2
+# seconds to wait on another mlt process that's writing the state
+LOCK_TIMEOUT = 30
+# how many past durations the expected duration of a step is taken from
+DURATION_HISTORY = 5
+
+# what becomes of a queued run
+QUEUED = 'queued'
+SUBMITTED = 'submitted'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+_TABLES = {'build': 'builds', 'push': 'pushes', 'deploy': 'deploys'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY,
+    image TEXT NOT NULL,
+    image_id TEXT,
+    duration REAL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pushes (
+    id INTEGER PRIMARY KEY,
+    image TEXT NOT NULL,
+    remote_image TEXT NOT NULL,
+    digest TEXT,
+    duration REAL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deploys (
+    id INTEGER PRIMARY KEY,
+    remote_image TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    duration REAL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queue (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL UNIQUE,
+    remote_image TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    objects TEXT NOT NULL,
+    demand TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+def load_state(path=constants.STATE_DB):
+    """the state of the project, opened once per mlt invocation"""
+    path = os.path.abspath(path)
+    with _states_lock:
+        if path not in _states:
+            _states[path] = ProjectState(path)
+        return _states[path]
+
+
+class ProjectState(object):
+    """The builds, pushes and deploys of a project. The latest of each is
+       read when the state is opened, so lookups don't touch the disk;
+       every record is written in a transaction of its own, so concurrent
+       mlt commands never see half of one. A duration of None marks a
+       step that was skipped, like a build of an unchanged context.
+    """
+
+    def __init__(self, path=constants.STATE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        # watch mode records from the threads of its pipeline stages
+        self._connection = sqlite3.connect(
+            path, timeout=LOCK_TIMEOUT, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        version = self._connection.execute(
+            'PRAGMA user_version').fetchone()[0]
+        if version < SCHEMA_VERSION:
+            with self._connection:
+                self._connection.executescript(_SCHEMA)
+                self._connection.execute(
+                    'PRAGMA user_version = {}'.format(SCHEMA_VERSION))
+            if version == 0:
+                self._import_json_files()
+
+        self._latest = {}
+        self._durations = {}
+        for kind, table in _TABLES.items():
+            self._latest[kind] = self._query_latest(table)
+            self._durations[kind] = [
+                row[0] for row in self._connection.execute(
+                    'SELECT duration FROM {} WHERE duration IS NOT NULL '
+                    'ORDER BY id DESC LIMIT ?'.format(table),
+                    (DURATION_HISTORY,))]
+
+    def last_build(self):
+        return self._latest['build']
+
+    def last_push(self):
+        return self._latest['push']
+
+    def last_deploy(self):
+        return self._latest['deploy']
+
+    def expected_duration(self, kind):
+        """median of the last few times `kind` ran, or None if it never
+           did; a single slow or cached run doesn't throw it off
+        """
+        durations = sorted(self._durations[kind])
+        if not durations:
+            return None
+        return durations[len(durations) // 2]
+
+    def record_build(self, image, duration=None, image_id=None):
+        self._record('build', image=image, image_id=image_id,
+                     duration=duration)
+
+    def record_push(self, image, remote_image, duration=None, digest=None):
+        self._record('push', image=image, remote_image=remote_image,
+                     digest=digest, duration=duration)
+
+    def record_deploy(self, remote_image, run_id, namespace, duration=None):
+        self._record('deploy', remote_image=remote_image, run_id=run_id,
+                     namespace=namespace, duration=duration)
+
+    def record_deploys(self, remote_image, run_ids, namespace,
+                       duration=None):
+        """records the runs of a sweep, all in a single transaction"""
+        created = time.time()
+        rows = [{'remote_image': remote_image, 'run_id': run_id,
+                 'namespace': namespace, 'duration': duration,
+                 'created': created} for run_id in run_ids]
+        if not rows:
+            return
+        with self._lock:
+            self._insert('deploys', *rows)
+            self._latest['deploy'] = rows[-1]
+            if duration is not None:
+                self._durations['deploy'] = [duration] + \
+                    self._durations['deploy'][:DURATION_HISTORY - 1]
+
+    def enqueue(self, remote_image, namespace, runs):
+        """adds runs, as (run id, objects, demand), to the end of the
+           queue of runs waiting for room on the cluster
+        """
+        now = time.time()
+        rows = [{'run_id': run_id, 'remote_image': remote_image,
+                 'namespace': namespace, 'objects': json.dumps(objects),
+                 'demand': json.dumps(demand), 'status': QUEUED,
+                 'created': now, 'updated': now}
+                for run_id, objects, demand in runs]
+        if rows:
+            with self._lock:
+                self._insert('queue', *rows)
+
+    def queued_runs(self, statuses=None):
+        """the runs of the queue, oldest first, as they are right now;
+           only those with one of `statuses` if given
+        """
+        query = 'SELECT * FROM queue'
+        statuses = tuple(statuses or ())
+        if statuses:
+            query += ' WHERE status IN ({})'.format(
+                ', '.join('?' * len(statuses)))
+        with self._lock:
+            rows = self._connection.execute(
+                query + ' ORDER BY id', statuses).fetchall()
+        runs = []
+        for row in rows:
+            run = dict((key, row[key]) for key in row.keys())
+            run['objects'] = json.loads(run['objects'])
+            run['demand'] = json.loads(run['demand'])
+            runs.append(run)
+        return runs
+
+    def set_run_status(self, run_id, status):
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    'UPDATE queue SET status = ?, updated = ? '
+                    'WHERE run_id = ?', (status, time.time(), run_id))
+
+    def clear_queue(self):
+        """drops the runs that are still waiting, and returns how many"""
+        with self._lock:
+            with self._connection:
+                return self._connection.execute(
+                    'DELETE FROM queue WHERE status = ?', (QUEUED,)).rowcount
+
+    def _record(self, kind, **values):
+        values['created'] = time.time()
+        with self._lock:
+            self._insert(_TABLES[kind], values)
+            self._latest[kind] = values
+            if values['duration'] is not None:
+                self._durations[kind] = [values['duration']] + \
+                    self._durations[kind][:DURATION_HISTORY - 1]
+
+    def _insert(self, table, *rows):
+        columns = sorted(rows[0])
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO {} ({}) VALUES ({})'.format(
+                    table, ', '.join(columns), ', '.join('?' * len(columns))),
+                [[row[column] for column in columns] for row in rows])
+
+    def _query_latest(self, table):
+        row = self._connection.execute(
+            'SELECT * FROM {} ORDER BY id DESC LIMIT 1'.format(
+                table)).fetchone()
+        return dict((key, row[key]) for key in row.keys() if key != 'id') \
+            if row else None
+
+    def _import_json_files(self):
+        """carries over the last build and push of projects that older
+           versions of mlt kept in .build.json and .push.json
+        """
+        project_dir = os.path.dirname(os.path.abspath(self.path))
+        legacy = {}
+        for kind in ('build', 'push'):
+            try:
+                with open(os.path.join(project_dir,
+                                       '.{}.json'.format(kind))) as f:
+                    legacy[kind] = json.load(f)
+            except (IOError, OSError, ValueError):
+                legacy[kind] = {}
+
+        build, push = legacy['build'], legacy['push']
+        if build.get('last_container'):
+            self._insert('builds', {
+                'image': build['last_container'],
+                'duration': build.get('last_build_duration'),
+                'created': time.time()})
+        if push.get('last_remote_container'):
+            self._insert('pushes', {
+                'image': build.get('last_container') or '',
+                'remote_image': push['last_remote_container'],
+                'duration': push.get('last_push_duration'),
+                'created': time.time()})
@@ -0,0 +1,240 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+"""
+Sums up the runs of an app for `mlt status`: one row per run, with the
+state of its Job or TFJob and how many of its pods are in which phase, by
+replica type. The rows are kept up to date one watch event at a time, of
+the pods or of the run objects, so following hundreds of runs doesn't
+take listing them over and over.
+"""
+import calendar
+import time
+
+from mlt.utils import constants
+
+# the objects a run is made of, as (api version, kind)
+RUN_KINDS = (('batch/v1', 'Job'), ('kubeflow.org/v1alpha1', 'TFJob'),
+             ('kubeflow.org/v1alpha2', 'TFJob'))
+
+PHASES = ('Running', 'Pending', 'Succeeded', 'Failed', 'Unknown')
+TERMINAL_STATES = ('Succeeded', 'Failed')
+HEADERS = ('Run', 'Kind', 'State', 'Pods', 'Age')
+
+
+class RunStatus(object):
+    """the runs of an app, their objects and their pods, updated by
+       `apply`ing watch events (or SYNC events listing every object of a
+       kind) to it
+    """
+
+    def __init__(self):
+        self.runs = {}
+        # pod name to the (run id, replica type, phase) it was counted as
+        self._pods = {}
+        # (api version, kind, name) of an object to (run id, state)
+        self._objects = {}
+
+    def apply(self, event, api_version='v1', kind='Pod'):
+        """updates the runs with a watch event on `kind` objects; returns
+           whether any of their rows changed
+        """
+        if kind == 'Pod':
+            remove, update = self._remove_pod, self._set_pod
+            known = list(self._pods)
+        else:
+            def remove(name):
+                return self._remove_object((api_version, kind, name))
+
+            def update(obj):
+                return self._set_object((api_version, kind), obj)
+
+            known = [key[2] for key in self._objects
+                     if key[:2] == (api_version, kind)]
+
+        if event['type'] == 'SYNC':
+            changed = False
+            names = set(obj['metadata']['name'] for obj in event['items'])
+            for name in known:
+                if name not in names:
+                    changed = remove(name) or changed
+            for obj in event['items']:
+                changed = update(obj) or changed
+            return changed
+        if event['type'] == 'DELETED':
+            return remove(event['object']['metadata']['name'])
+        return update(event['object'])
+
+    def rows(self, now=None):
+        """a row per run, newest first"""
+        now = time.time() if now is None else now
+        runs = sorted(self.runs.items(), reverse=True,
+                      key=lambda item: (item[1]['created'], item[0]))
+        return [[run_id, run['kind'] or '-', run_state(run),
+                 format_pods(run['pods']), format_age(run['created'], now)]
+                for run_id, run in runs]
+
+    def _run(self, metadata):
+        labels = metadata.get('labels') or {}
+        run_id = labels.get(constants.RUN_LABEL) or _owner_name(metadata)
+        run = self.runs.get(run_id)
+        if run is None:
+            run = self.runs[run_id] = {'kind': None, 'state': None,
+                                       'pods': {}, 'objects': 0,
+                                       'created': None}
+        created = metadata.get('creationTimestamp')
+        if created and (run['created'] is None or created < run['created']):
+            run['created'] = created
+        return run_id, run
+
+    def _set_object(self, kind, obj):
+        """`kind` is (api version, kind), as list items don't have them"""
+        key = kind + (obj['metadata']['name'],)
+        run_id, run = self._run(obj['metadata'])
+        entry = (run_id, object_state(dict(obj, kind=kind[1])))
+        previous = self._objects.get(key)
+        if previous == entry:
+            return False
+        if previous is None:
+            run['objects'] += 1
+        self._objects[key] = entry
+        run['kind'], run['state'] = kind[1], entry[1]
+        return True
+
+    def _remove_object(self, key):
+        entry = self._objects.pop(key, None)
+        if entry is None:
+            return False
+        run = self.runs[entry[0]]
+        run['objects'] -= 1
+        if not run['objects']:
+            run['state'] = None
+        self._forget_if_gone(entry[0])
+        return True
+
+    def _set_pod(self, pod):
+        metadata = pod['metadata']
+        run_id, run = self._run(metadata)
+        if run['kind'] is None:
+            run['kind'] = _owner_kind(metadata)
+        entry = (run_id, replica_type(pod),
+                 (pod.get('status') or {}).get('phase') or 'Pending')
+        previous = self._pods.get(metadata['name'])
+        if previous == entry:
+            return False
+        if previous:
+            self._count(previous, -1)
+        self._pods[metadata['name']] = entry
+        self._count(entry, 1)
+        return True
+
+    def _remove_pod(self, name):
+        entry = self._pods.pop(name, None)
+        if entry is None:
+            return False
+        self._count(entry, -1)
+        self._forget_if_gone(entry[0])
+        return True
+
+    def _forget_if_gone(self, run_id):
+        """a run goes once neither its objects nor its pods are left"""
+        run = self.runs[run_id]
+        if not run['pods'] and not run['objects']:
+            del self.runs[run_id]
+
+    def _count(self, entry, change):
+        run_id, replica, phase = entry
+        pods = self.runs[run_id]['pods']
+        phases = pods.setdefault(replica, {})
+        phases[phase] = phases.get(phase, 0) + change
+        if not phases[phase]:
+            del phases[phase]
+            if not phases:
+                del pods[replica]
+
+
+def object_state(obj):
+    """the state of a Job or TFJob, from its status"""
+    status = obj.get('status') or {}
+    conditions = [c['type'] for c in status.get('conditions') or []
+                  if c.get('status') == 'True']
+    if obj['kind'] == 'Job':
+        if 'Failed' in conditions:
+            return 'Failed'
+        if 'Complete' in conditions:
+            return 'Succeeded'
+        return 'Running' if status.get('active') else 'Pending'
+    # v1alpha1 TFJobs have a state, later versions only conditions
+    if status.get('state'):
+        return status['state']
+    return conditions[-1] if conditions else 'Created'
+
+
+def run_state(run):
+    """what the object says once it's done, before that what its pods do"""
+    if run['state'] in TERMINAL_STATES:
+        return run['state']
+    phases = set(phase for counts in run['pods'].values()
+                 for phase in counts)
+    for phase in ('Running', 'Pending'):
+        if phase in phases:
+            return phase
+    if phases:
+        return 'Failed' if 'Failed' in phases else 'Succeeded'
+    return run['state'] or 'Created'
+
+
+def replica_type(pod):
+    """like `worker` or `ps` for TFJob pods, the owner's kind otherwise"""
+    labels = pod['metadata'].get('labels') or {}
+    replica = labels.get('tf-replica-type') or labels.get('job_type') or \
+        _owner_kind(pod['metadata']) or 'pod'
+    return replica.lower()
+
+
+def format_pods(pods):
+    """like `ps: 1 Running, worker: 2 Running 1 Pending`"""
+    return ', '.join(
+        '{}: {}'.format(replica, ' '.join(
+            '{} {}'.format(pods[replica][phase], phase)
+            for phase in PHASES if phase in pods[replica]))
+        for replica in sorted(pods)) or '-'
+
+
+def format_age(created, now):
+    """like kubectl does: `45s`, `12m`, `3h` or `2d`"""
+    if not created:
+        return '-'
+    seconds = max(0, int(now - calendar.timegm(
+        time.strptime(created, '%Y-%m-%dT%H:%M:%SZ'))))
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return '{}{}'.format(seconds // size, unit)
+    return '{}s'.format(seconds)
+
+
+def _owner_kind(metadata):
+    owners = metadata.get('ownerReferences') or []
+    return owners[0]['kind'] if owners else None
+
+
+def _owner_name(metadata):
+    owners = metadata.get('ownerReferences') or []
+    return owners[0]['name'] if owners else metadata['name']
@@ -0,0 +1,107 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+"""
+Expands a sweep file into the sets of template parameters to deploy.
+
+A sweep file is json with a `grid`, a `random` search, or both:
+
+    {
+      "grid": {"num_workers": [1, 2, 4]},
+      "random": {
+        "samples": 20,
+        "seed": 7,
+        "parameters": {
+          "learning_rate": {"min": 0.0001, "max": 0.1, "scale": "log"},
+          "optimizer": ["adam", "sgd"]
+        }
+      }
+    }
+
+Every combination of the grid values is deployed; with a random search as
+well, each of those is combined with every random sample. Random values
+come from a list to choose from, or a uniform or log-uniform range.
+"""
+import itertools
+import json
+import math
+import random
+
+
+def load_sweep(path):
+    """the template parameters of every trial of the sweep in `path`"""
+    with open(path) as f:
+        try:
+            spec = json.load(f)
+        except ValueError as e:
+            raise ValueError("Sweep file {} isn't valid json: {}".format(
+                path, e))
+    return expand_sweep(spec)
+
+
+def expand_sweep(spec):
+    """list of parameter dicts, one per trial"""
+    if not isinstance(spec, dict) or not (spec.get('grid') or
+                                          spec.get('random')):
+        raise ValueError("A sweep needs a `grid` or `random` section")
+
+    grid = spec.get('grid') or {}
+    names = sorted(grid)
+    for name in names:
+        if not isinstance(grid[name], list) or not grid[name]:
+            raise ValueError("Grid values of {} must be a non-empty "
+                             "list".format(name))
+    points = [dict(zip(names, values)) for values in
+              itertools.product(*[grid[name] for name in names])]
+
+    search = spec.get('random')
+    if not search:
+        return points
+    samples = search.get('samples')
+    if not isinstance(samples, int) or samples < 1:
+        raise ValueError("A random search needs a number of `samples`")
+    rng = random.Random(search.get('seed'))
+    parameters = search.get('parameters') or {}
+    trials = []
+    for point in points:
+        for _ in range(samples):
+            trial = dict(point)
+            for name in sorted(parameters):
+                trial[name] = _sample(name, parameters[name], rng)
+            trials.append(trial)
+    return trials
+
+
+def _sample(name, distribution, rng):
+    if isinstance(distribution, list) and distribution:
+        return rng.choice(distribution)
+    if not isinstance(distribution, dict) or \
+            'min' not in distribution or 'max' not in distribution:
+        raise ValueError("Random values of {} need a list to choose from, "
+                         "or a `min` and `max`".format(name))
+    low, high = distribution['min'], distribution['max']
+    if distribution.get('scale') == 'log':
+        if low <= 0:
+            raise ValueError("A log scale range of {} must be above "
+                             "0".format(name))
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    if isinstance(low, int) and isinstance(high, int):
+        return rng.randint(low, high)
+    return rng.uniform(low, high)
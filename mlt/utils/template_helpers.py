@@ -0,0 +1,144 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import glob
+import json
+import os
+from subprocess import PIPE
+from termcolor import colored
+
+from mlt.utils import constants, git_helpers, process_helpers
+
+# files of a template that go into the catalog
+README = 'README.md'
+CRD_REQUIREMENTS = 'crd-requirements.txt'
+
+
+def template_catalog(repo):
+    """name, description, parameters, required crds and a content hash of
+       every template in `repo`. The catalog is built from git objects once
+       per revision of the repo and stored alongside its cached mirror.
+    """
+    mirror = git_helpers.mirror_repo(repo)
+    revision = process_helpers.run(
+        ["git", "rev-parse", "HEAD"], cwd=mirror).strip()
+    catalog_file = os.path.join(mirror, 'mlt-catalog-{}.json'.format(revision))
+    if os.path.isfile(catalog_file):
+        with open(catalog_file) as f:
+            return json.load(f)
+
+    with git_helpers.mirror_lock(mirror):
+        # another mlt process may have built it while we waited
+        if os.path.isfile(catalog_file):
+            with open(catalog_file) as f:
+                return json.load(f)
+        catalog = _build_catalog(mirror, revision)
+        # write then rename, so processes reading without the lock never
+        # read half a catalog
+        staging = '{}.{}'.format(catalog_file, os.getpid())
+        with open(staging, 'w') as f:
+            json.dump(catalog, f)
+        os.rename(staging, catalog_file)
+        for old_catalog in glob.glob(
+                os.path.join(mirror, 'mlt-catalog-*.json')):
+            if old_catalog != catalog_file:
+                os.remove(old_catalog)
+    return catalog
+
+
+def _build_catalog(mirror, revision):
+    templates = []
+    tree = process_helpers.run(
+        ["git", "ls-tree", revision, constants.TEMPLATES_DIR + '/'],
+        cwd=mirror)
+    for line in tree.splitlines():
+        info, path = line.split('\t', 1)
+        _, object_type, object_hash = info.split()
+        if object_type == 'tree':
+            templates.append({'name': os.path.basename(path),
+                              'hash': object_hash})
+
+    blobs = _read_blobs(mirror, [
+        '{}:{}/{}/{}'.format(revision, constants.TEMPLATES_DIR,
+                             template['name'], filename)
+        for template in templates
+        for filename in (README, constants.TEMPLATE_CONFIG,
+                         CRD_REQUIREMENTS)])
+    catalog = []
+    for template in templates:
+        readme, parameters, crds = blobs[:3]
+        blobs = blobs[3:]
+        if readme is None:
+            # only directories with a README are templates
+            continue
+        template['description'] = _description(readme)
+        template['parameters'] = _parameters(template['name'], parameters)
+        template['crds'] = crds.split() if crds else []
+        catalog.append(template)
+    return sorted(catalog, key=lambda template: template['name'])
+
+
+def _parameters(name, config):
+    """the parameters listed in a template's config, none if it has no
+       config or one we can't read
+    """
+    if not config:
+        return []
+    try:
+        return json.loads(config).get(constants.TEMPLATE_PARAMETERS, [])
+    except (ValueError, AttributeError) as e:
+        print(colored("Ignoring the parameters of template {}, its {} is "
+                      "not valid: {}".format(
+                          name, constants.TEMPLATE_CONFIG, e), 'yellow'))
+        return []
+
+
+def _read_blobs(mirror, objects):
+    """contents of the given `<rev>:<path>` objects, None for missing ones,
+       all read through a single `git cat-file --batch`
+    """
+    if not objects:
+        return []
+    cat_file = process_helpers.run_popen(
+        ["git", "cat-file", "--batch"], stdout=PIPE, stderr=False,
+        stdin=PIPE, cwd=mirror)
+    output = cat_file.communicate(
+        '\n'.join(objects).encode('utf-8') + b'\n')[0]
+
+    contents = []
+    for _ in objects:
+        header, output = output.split(b'\n', 1)
+        if header.endswith(b' missing'):
+            contents.append(None)
+            continue
+        size = int(header.split()[2])
+        contents.append(output[:size].decode('utf-8'))
+        # every blob is followed by a newline
+        output = output[size + 1:]
+    return contents
+
+
+def _description(readme):
+    """the first line of the readme that isn't blank or a heading"""
+    for line in (readme or '').splitlines():
+        line = line.strip()
+        if line and line[0] != '#':
+            return line
+    return '<none>'
@@ -0,0 +1,151 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+from __future__ import print_function
+
+import os
+import threading
+
+from termcolor import colored
+from watchdog.events import (FileCreatedEvent, FileDeletedEvent,
+                             FileModifiedEvent)
+from watchdog.observers import Observer
+
+from mlt.utils.ignore_helpers import IgnoreMatcher
+
+# seconds between two scans of the tree when we can't use native watches
+POLL_INTERVAL = 1.0
+
+
+class Watcher(object):
+    """Passes file system events under `root` on to `handler`. The whole
+       tree is watched through one recursive watch, so a single inotify
+       instance and emitter thread serve any number of directories, and
+       events from inside ignored directories are dropped before they reach
+       the handler. If native watches run out or aren't available, falls
+       back to polling the (pruned) tree for mtime changes.
+    """
+
+    def __init__(self, handler, root='./', ignore_matcher=None,
+                 poll_interval=POLL_INTERVAL):
+        self.handler = handler
+        self.root = root
+        self.ignore_matcher = ignore_matcher or IgnoreMatcher(root)
+        self.poll_interval = poll_interval
+        self.polling = False
+        self._observer = None
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._poller = None
+
+    def start(self):
+        self._observer = Observer()
+        try:
+            self._observer.start()
+            self._observer.schedule(self, self.root, recursive=True)
+        except OSError as e:
+            self._fall_back_to_polling(e)
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            if self._observer:
+                self._observer.stop()
+
+    def join(self, timeout=None):
+        if self._observer and self._observer.is_alive():
+            self._observer.join(timeout)
+        if self._poller:
+            self._poller.join(timeout)
+
+    def dispatch(self, event):
+        """called by the observer for every event under root"""
+        paths = [event.src_path, getattr(event, 'dest_path', None)]
+        if all(not path or self._in_ignored_directory(path)
+               for path in paths):
+            return
+        self.handler.dispatch(event)
+
+    def directories(self):
+        """every directory under root that isn't ignored"""
+        for dirpath, dirnames, _ in self._walk():
+            yield dirpath
+
+    def _in_ignored_directory(self, path):
+        """True for events we'd never see if only the directories that
+           aren't ignored were watched
+        """
+        parent = os.path.dirname(path)
+        return self.ignore_matcher.is_ignored(parent, True)
+
+    def _walk(self, top=None):
+        for dirpath, dirnames, filenames in os.walk(top or self.root):
+            dirnames[:] = [
+                d for d in dirnames if not self.ignore_matcher.is_ignored(
+                    os.path.join(dirpath, d), True)]
+            yield dirpath, dirnames, filenames
+
+    def _fall_back_to_polling(self, error):
+        print(colored("Unable to watch for file changes ({}), polling "
+                      "every {}s instead".format(error, self.poll_interval),
+                      'yellow'))
+        self.polling = True
+        self._observer.stop()
+        # the first snapshot is taken right away, so that no change made
+        # after we return gets missed
+        self._poller = threading.Thread(target=self._poll,
+                                        args=(self._snapshot(),))
+        self._poller.daemon = True
+        self._poller.start()
+
+    def _poll(self, snapshot):
+        while not self._stopped.wait(self.poll_interval):
+            current = self._snapshot()
+            for event in _snapshot_events(snapshot, current):
+                self.handler.dispatch(event)
+                if self.ignore_matcher.is_ignore_file(event.src_path):
+                    current = self._snapshot()
+            snapshot = current
+
+    def _snapshot(self):
+        """(mtime, size) of every file that isn't ignored"""
+        snapshot = {}
+        for dirpath, _, filenames in self._walk():
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if self.ignore_matcher.is_ignored(path, False):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # removed since we listed the directory
+                    continue
+                snapshot[path] = (stat.st_mtime, stat.st_size)
+        return snapshot
+
+
+def _snapshot_events(old, new):
+    for path in sorted(set(new) - set(old)):
+        yield FileCreatedEvent(path)
+    for path in sorted(set(old) - set(new)):
+        yield FileDeletedEvent(path)
+    for path in sorted(set(old) & set(new)):
+        if old[path] != new[path]:
+            yield FileModifiedEvent(path)
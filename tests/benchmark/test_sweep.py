@@ -0,0 +1,100 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+"""
+Render-plus-submit throughput of `mlt deploy --sweep`, against a local
+stand-in for the kubernetes api server. Run with `make benchmark`.
+"""
+from __future__ import print_function
+
+import json
+import time
+from mock import patch
+
+from mlt.commands.deploy import DeployCommand
+from mlt.utils import kubernetes_api, state_helpers
+from mlt.utils.kubernetes_api import KubernetesClient
+from test_utils.fake_server import FakeServer
+from test_utils.io import catch_stdout
+
+SWEEP_SIZE = 1000
+# what a sweep of SWEEP_SIZE runs may take at most, in seconds
+TIME_LIMIT = 30
+
+JOB_TEMPLATE = """apiVersion: batch/v1
+kind: Job
+metadata:
+  name: $app-$run
+spec:
+  template:
+    spec:
+      containers:
+      - name: $app
+        image: $image
+        args: [--learning-rate, '$learning_rate', --optimizer, $optimizer]
+      restartPolicy: Never
+"""
+
+BATCH_DISCOVERY = {'resources': [
+    {'name': 'jobs', 'kind': 'Job', 'namespaced': True}]}
+
+
+def test_sweep_throughput(tmpdir, monkeypatch):
+    tmpdir.mkdir('k8s-templates').join('job.yaml').write(JOB_TEMPLATE)
+    tmpdir.join('sweep.json').write(json.dumps({'random': {
+        'samples': SWEEP_SIZE, 'seed': 1, 'parameters': {
+            'learning_rate': {'min': 0.0001, 'max': 0.1, 'scale': 'log'},
+            'optimizer': ['adam', 'sgd', 'rmsprop']}}}))
+    monkeypatch.chdir(tmpdir)
+    state = state_helpers.load_state()
+    state.record_build('app:1234', 1.0)
+    state.record_push('app:1234', 'registry/app:1234', 1.0)
+
+    with FakeServer({
+        ('GET', '/apis/batch/v1'): (200, BATCH_DISCOVERY),
+        ('POST', '/apis/batch/v1/namespaces/ns/jobs'): (201, {}),
+    }) as server:
+        client = KubernetesClient(server.url)
+        monkeypatch.setattr(kubernetes_api, 'get_client', lambda: client)
+        with patch('mlt.commands.deploy.config_helpers.load_config') as \
+                load_config:
+            load_config.return_value = {'name': 'app', 'namespace': 'ns'}
+            deploy = DeployCommand(
+                {'deploy': True, '--no-push': True, '--watch': False,
+                 '--sweep': 'sweep.json', '--skip-crd-check': True,
+                 '--interactive': False, '--concurrency': 10,
+                 '--rate-limit': 1000000.0})
+        monkeypatch.setattr(deploy, '_connect_interactively', lambda: None)
+
+        started = time.time()
+        deploy.started_deploy_time = started
+        with catch_stdout():
+            deploy._render_sweep()
+            rendered = time.time()
+            deploy._submit_sweep()
+        submitted = time.time()
+
+    posts = [r for r in server.requests if r['method'] == 'POST']
+    assert len(posts) == SWEEP_SIZE
+    print("\nRendered {} runs in {:.2f}s, submitted them in {:.2f}s "
+          "({:.0f} runs/s over {} connections)".format(
+              SWEEP_SIZE, rendered - started, submitted - rendered,
+              SWEEP_SIZE / (submitted - started), server.connections))
+    assert submitted - started < TIME_LIMIT
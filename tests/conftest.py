@@ -21,7 +21,9 @@
 import inspect
 import os
 import pytest
+import shutil
 import sys
+import tempfile
 from mock import MagicMock
 
 # enable test_utils to be used in tests via `from test_utils... import ...
@@ -70,7 +72,7 @@ def patch_setattr(module_names, module_replace, monkeypatch, path, m):
 def patch(monkeypatch):
     """allows us to add easy autouse fixtures by patching anything we want
        Usage: return something like this in a @pytest.fixture
-       - patch('files.fetch_action_arg', MagicMock(return_value='output'))
+       - patch('state_helpers.load_state', MagicMock())
        Without the second arg, will default to just MagicMock()
     """
 
@@ -80,3 +82,17 @@ def patch(monkeypatch):
         return m
 
     return wrapper
+
+
+@pytest.fixture(scope='session', autouse=True)
+def cache_dir():
+    """keeps mlt's caches, like cloned template repos, out of the home dir
+       of whoever runs the tests
+    """
+    cache = tempfile.mkdtemp()
+    os.environ['MLT_CACHE_DIR'] = cache
+    try:
+        yield cache
+    finally:
+        del os.environ['MLT_CACHE_DIR']
+        shutil.rmtree(cache)
@@ -29,7 +29,9 @@ import time
 import uuid
 from subprocess import Popen
 
+from mlt.utils.constants import STATE_DB
 from mlt.utils.process_helpers import run, run_popen
+from mlt.utils.state_helpers import ProjectState
 from project import basedir
 
 
@@ -44,8 +46,7 @@ class CommandTester(object):
 
         self.project_dir = os.path.join(self.workdir, self.app_name)
         self.mlt_json = os.path.join(self.project_dir, 'mlt.json')
-        self.build_json = os.path.join(self.project_dir, '.build.json')
-        self.deploy_json = os.path.join(self.project_dir, '.push.json')
+        self.state_db = os.path.join(self.project_dir, STATE_DB)
         self.train_file = os.path.join(self.project_dir, 'main.py')
 
     def _fetch_registry_catalog_call(self):
@@ -60,6 +61,10 @@ class CommandTester(object):
             catalog_call = 'curl --noproxy \"*\"  registry:5000/v2/_catalog'
         return catalog_call
 
+    def _state(self):
+        """what mlt recorded in the project, as of now"""
+        return ProjectState(self.state_db)
+
     def init(self, template='hello-world'):
         p = Popen(
             ['mlt', 'init', '--registry={}'.format(self.registry),
@@ -98,7 +103,7 @@ class CommandTester(object):
             # wait for 30 seconds (for timeout) or until we've built our image
             # then kill the build proc or it won't terminate
             start = time.time()
-            while not os.path.exists(self.build_json):
+            while self._state().last_build() is None:
                 time.sleep(1)
                 if time.time() - start >= 30:
                     break
@@ -106,16 +111,13 @@ class CommandTester(object):
         else:
             assert build_proc.wait() == 0
 
-        assert os.path.isfile(self.build_json)
-        with open(self.build_json) as f:
-            build_data = json.loads(f.read())
-            assert 'last_container' in build_data and \
-                   'last_build_duration' in build_data
-            # verify that we created a docker image
-            assert run_popen(
-                "docker image inspect {}".format(build_data['last_container']),
-                shell=True
-            ).wait() == 0
+        build_data = self._state().last_build()
+        assert build_data is not None
+        # verify that we created a docker image
+        assert run_popen(
+            "docker image inspect {}".format(build_data['image']),
+            shell=True
+        ).wait() == 0
 
     def deploy(self, no_push=False, interactive=False):
         deploy_cmd = ['mlt', 'deploy']
@@ -128,11 +130,8 @@ class CommandTester(object):
         assert p.wait() == 0
 
         if not no_push:
-            assert os.path.isfile(self.deploy_json)
-            with open(self.deploy_json) as f:
-                deploy_data = json.loads(f.read())
-                assert 'last_push_duration' in deploy_data and \
-                       'last_remote_container' in deploy_data
+            push_data = self._state().last_push()
+            assert push_data is not None and push_data['remote_image']
             # verify that the docker image has been pushed to our registry
             # need to decode because in python3 this output is in bytes
             assert 'true' in run_popen(
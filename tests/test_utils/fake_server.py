@@ -0,0 +1,135 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+"""
+A local http server that answers with canned json, standing in for the
+kubernetes api server and friends in unit tests.
+"""
+import json
+import threading
+
+try:
+    # python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn, UnixStreamServer
+except ImportError:
+    # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn, UnixStreamServer
+
+
+class FakeServer(object):
+    """`routes` maps (method, path) to (status, body). Paths may include
+       the query string to only match that exact query. A list body is
+       streamed as one json object per line, like a kubernetes watch.
+       A callable route gets the request and returns (status, body).
+       Either may also come with a dict of headers, as a third item.
+       With `unix_socket` the server listens on that path instead of a
+       local port, like the docker daemon does.
+    """
+
+    def __init__(self, routes, unix_socket=None):
+        self.routes = routes
+        self.unix_socket = unix_socket
+        self.requests = []
+        self.connections = 0
+
+    def __enter__(self):
+        if self.unix_socket:
+            self.server = _ThreadingUnixServer(self.unix_socket,
+                                               _handler(self))
+        else:
+            self.server = _ThreadingHTTPServer(('127.0.0.1', 0),
+                                               _handler(self))
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+    def respond(self, request):
+        self.requests.append(request)
+        route = self.routes.get((request['method'], request['url'])) or \
+            self.routes.get((request['method'], request['path']))
+        if route is None:
+            return 404, {'kind': 'Status', 'code': 404}
+        return route(request) if callable(route) else route
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _ThreadingUnixServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def _handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # headers and body go out in separate writes, which would
+        # otherwise hold up every response for a delayed ack
+        disable_nagle_algorithm = not fake.unix_socket
+
+        def setup(self):
+            fake.connections += 1
+            BaseHTTPRequestHandler.setup(self)
+
+        def log_message(self, *args):
+            pass
+
+        def _handle(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else None
+            route = fake.respond({
+                'method': self.command,
+                'url': self.path,
+                'path': self.path.split('?')[0],
+                'headers': dict(self.headers.items()),
+                'body': json.loads(body.decode('utf-8')) if body else None})
+            status, response = route[:2]
+            headers = route[2] if len(route) > 2 else {}
+
+            if isinstance(response, list):
+                data = b''.join(json.dumps(event).encode('utf-8') + b'\n'
+                                for event in response)
+            elif isinstance(response, bytes):
+                data = response
+            else:
+                data = json.dumps(response).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _handle
+
+    return Handler
@@ -17,9 +17,11 @@
 #
 # SPDX-License-Identifier: EPL-2.0
 #
+import os
 import shutil
 import tempfile
 from contextlib import contextmanager
+from subprocess import check_call
 
 
 @contextmanager
@@ -31,3 +33,15 @@ def create_work_dir():
         # even on error we still need to remove dir when done
         # https://docs.python.org/2/library/tempfile.html#tempfile.mkdtemp
         shutil.rmtree(workdir)
+
+
+def commit_file(repo, path, content):
+    """writes `content` to `path` in the git `repo` and commits it"""
+    full_path = os.path.join(repo, path)
+    if not os.path.isdir(os.path.dirname(full_path)):
+        os.makedirs(os.path.dirname(full_path))
+    with open(full_path, 'w') as f:
+        f.write(content)
+    check_call(['git', 'add', path], cwd=repo)
+    check_call(['git', '-c', 'user.name=test', '-c', 'user.email=t@t',
+                'commit', '-q', '-m', path], cwd=repo)
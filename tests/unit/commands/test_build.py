@@ -20,6 +20,7 @@
 
 from __future__ import print_function
 
+import pytest
 from mock import patch, MagicMock
 from test_utils.io import catch_stdout
 
@@ -27,16 +28,19 @@ from mlt.commands.build import BuildCommand
 
 
 @patch('mlt.commands.build.config_helpers.load_config')
-@patch('mlt.commands.build.open')
-@patch('mlt.commands.build.process_helpers.run_popen')
+@patch('mlt.commands.build.state_helpers')
+@patch('mlt.commands.build.process_helpers.StreamingProcess')
 @patch('mlt.commands.build.progress_bar')
-def test_simple_build(progress_bar, popen, open_mock,
+@patch('mlt.commands.build.docker_helpers')
+def test_simple_build(docker_helpers, progress_bar, popen, state_helpers,
                       verify_init):
-    progress_bar.duration_progress.side_effect = \
-        lambda x, y, z: print('Building')
-    popen.return_value.poll.return_value = 0
+    progress_bar.process_progress.side_effect = \
+        lambda *args: print('Building')
+    popen.return_value.wait.return_value = 0
+    docker_helpers.image_exists.return_value = False
 
-    build = BuildCommand({'build': True, '--watch': False})
+    build = BuildCommand({'build': True, '--watch': False,
+                          '--verbose': False})
     build.config = MagicMock()
 
     with catch_stdout() as caught_output:
@@ -52,14 +56,109 @@ def test_simple_build(progress_bar, popen, open_mock,
 
 
 @patch('mlt.commands.build.config_helpers.load_config')
-@patch('mlt.commands.build.time.sleep')
-@patch('mlt.commands.build.Observer')
-@patch('mlt.commands.build.open')
-def test_watch_build(open_mock, observer, sleep_mock, verify_init):
-    sleep_mock.side_effect = KeyboardInterrupt
+@patch('mlt.commands.build.state_helpers')
+@patch('mlt.commands.build.process_helpers.StreamingProcess')
+@patch('mlt.commands.build.progress_bar')
+@patch('mlt.commands.build.docker_helpers')
+def test_build_failure(docker_helpers, progress_bar, popen, state_helpers,
+                       verify_init):
+    """a failed build prints the end of its output and exits"""
+    docker_helpers.image_exists.return_value = False
+    popen.return_value.wait.return_value = 2
+    popen.return_value.output_tail.return_value = 'make: *** [build] Error 1'
+
+    build = BuildCommand({'build': True, '--watch': False,
+                          '--verbose': False})
+    build.config = MagicMock()
+
+    with catch_stdout() as caught_output:
+        with pytest.raises(SystemExit):
+            build.action()
+        output = caught_output.getvalue()
+
+    assert 'make: *** [build] Error 1' in output
+    assert 'full output is in .build.log' in output
+    state_helpers.load_state.return_value.record_build.assert_not_called()
+
+
+@patch('mlt.commands.build.config_helpers.load_config')
+@patch('mlt.commands.build.state_helpers')
+@patch('mlt.commands.build.process_helpers.StreamingProcess')
+@patch('mlt.commands.build.docker_helpers')
+def test_build_context_unchanged(docker_helpers, popen, state_helpers,
+                                 verify_init):
+    """an image tagged with the context digest exists, so skip `make build`
+       but still record it as the last container
+    """
+    docker_helpers.context_digest.return_value = 'abc123' * 8
+    docker_helpers.image_exists.return_value = True
+
+    build = BuildCommand({'build': True, '--watch': False,
+                          '--verbose': False})
+    build.config = {'name': 'app'}
+
+    with catch_stdout() as caught_output:
+        build.action()
+        output = caught_output.getvalue()
 
-    build = BuildCommand({'build': True, '--watch': True})
+    popen.assert_not_called()
+    state = state_helpers.load_state.return_value
+    state.record_build.assert_called_once_with('app:abc123abc123abc1')
+    assert 'Build context unchanged, using existing image ' \
+        'app:abc123abc123abc1' in output
+
+
+@patch('mlt.commands.build.config_helpers.load_config')
+@patch('mlt.commands.build.BuildScheduler')
+@patch('mlt.watcher.Watcher')
+@patch('mlt.commands.build.state_helpers')
+def test_watch_build(state_helpers, watcher, scheduler, verify_init):
+    scheduler.return_value.run.side_effect = KeyboardInterrupt
+
+    build = BuildCommand({'build': True, '--watch': True,
+                          '--cancel-stale': True, '--verbose': False})
     build.config = MagicMock()
 
     with patch('mlt.commands.build.EventHandler') as event_handler_patch:
         build.action()
+    event_handler_patch.assert_called_once_with(
+        scheduler.return_value.notify)
+    assert scheduler.call_args[1]['cancel'] == build._cancel_build
+    watcher.return_value.start.assert_called_once()
+    watcher.return_value.stop.assert_called_once()
+    scheduler.return_value.stop.assert_called_once()
+
+
+@patch('mlt.commands.build.config_helpers.load_config')
+@patch('mlt.commands.build.state_helpers')
+@patch('mlt.commands.build.process_helpers.StreamingProcess')
+@patch('mlt.commands.build.progress_bar')
+@patch('mlt.commands.build.docker_helpers')
+def test_watch_build_failure_keeps_watching(docker_helpers, progress_bar,
+                                            popen, state_helpers, verify_init):
+    """in watch mode a failed build doesn't exit, and a build cancelled by
+       newer changes isn't reported as a failure
+    """
+    docker_helpers.image_exists.return_value = False
+    popen.return_value.wait.return_value = 2
+    popen.return_value.poll.return_value = None
+    popen.return_value.output_tail.return_value = 'make: *** Error 1'
+
+    build = BuildCommand({'build': True, '--watch': True,
+                          '--cancel-stale': False, '--verbose': False})
+    build.config = MagicMock()
+
+    with catch_stdout() as caught_output:
+        build._build()
+        assert 'Build failed' in caught_output.getvalue()
+    assert popen.call_args[1]['process_group']
+
+    progress_bar.process_progress.side_effect = \
+        lambda *args: build._cancel_build()
+    with catch_stdout() as caught_output:
+        build._build()
+        output = caught_output.getvalue()
+    popen.return_value.terminate.assert_called_once()
+    assert 'Build cancelled' in output
+    assert 'Build failed' not in output
+    state_helpers.load_state.return_value.record_build.assert_not_called()
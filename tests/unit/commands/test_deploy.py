@@ -20,10 +20,13 @@
 
 from __future__ import print_function
 
+import json as jsonlib
 import pytest
-from mock import MagicMock
+import socket
+from mock import call, MagicMock
 
 from mlt.commands.deploy import DeployCommand
+from mlt.utils.kubernetes_helpers import add_labels
 from test_utils.io import catch_stdout
 
 
@@ -33,8 +36,13 @@ def sleep(patch):
 
 
 @pytest.fixture
-def fetch_action_arg(patch):
-    return patch('files.fetch_action_arg', MagicMock(return_value='output'))
+def state(patch):
+    state_mock = MagicMock()
+    state_mock.last_build.return_value = {'image': 'output'}
+    state_mock.last_push.return_value = {'remote_image': 'output'}
+    state_mock.expected_duration.return_value = 1.0
+    patch('state_helpers.load_state', MagicMock(return_value=state_mock))
+    return state_mock
 
 
 @pytest.fixture
@@ -42,39 +50,44 @@ def kube_helpers(patch):
     return patch('kubernetes_helpers')
 
 
-@pytest.fixture
-def json(patch):
-    return patch('json')
-
-
 @pytest.fixture
 def open_mock(patch):
     return patch('open')
 
 
-@pytest.fixture
-def popen_mock(patch):
-    popen_mock = MagicMock()
-    popen_mock.return_value.poll.return_value = 0
-    return patch('Popen', popen_mock)
-
-
 @pytest.fixture
 def process_helpers(patch):
-    return patch('process_helpers')
+    process_helpers_mock = MagicMock()
+    process_helpers_mock.StreamingProcess.return_value.wait.return_value = 0
+    return patch('process_helpers', process_helpers_mock)
 
 
 @pytest.fixture
 def progress_bar(patch):
     progress_mock = MagicMock()
-    progress_mock.duration_progress.side_effect = lambda x, y, z: print(
+    progress_mock.process_progress.side_effect = lambda *args: print(
         'Pushing ')
     return patch('progress_bar', progress_mock)
 
 
 @pytest.fixture
 def template(patch):
-    return patch('Template')
+    template_mock = MagicMock()
+    template_mock.return_value.substitute.return_value = \
+        'apiVersion: batch/v1\nkind: Job\nmetadata:\n  name: app-1234\n'
+    return patch('Template', template_mock)
+
+
+@pytest.fixture(autouse=True)
+def docker_api(patch):
+    return patch('docker_api.get_client', MagicMock(return_value=None))
+
+
+@pytest.fixture(autouse=True)
+def registry_helpers(patch):
+    registry_mock = MagicMock()
+    registry_mock.has_image.return_value = False
+    return patch('registry_helpers', registry_mock)
 
 
 @pytest.fixture
@@ -94,14 +107,14 @@ def walk_mock(patch):
 
 @pytest.fixture
 def yaml(patch):
-    return patch('yaml.load')
+    return patch('yaml.safe_load_all')
 
 
-def deploy(no_push, skip_crd_check, interactive, extra_config_args, retries=5):
+def deploy(no_push, skip_crd_check, interactive, extra_config_args, timeout=5):
     deploy = DeployCommand(
-        {'deploy': True, '--no-push': no_push,
-         '--skip-crd-check': skip_crd_check,
-         '--interactive': interactive, '--retries': retries})
+        {'deploy': True, '--no-push': no_push, '--watch': False,
+         '--sweep': None, '--skip-crd-check': skip_crd_check,
+         '--interactive': interactive, '--timeout': timeout})
     deploy.config = {'name': 'app', 'namespace': 'namespace'}
     deploy.config.update(extra_config_args)
 
@@ -133,9 +146,9 @@ def verify_successful_deploy(output, did_push=True, interactive=False):
         assert pod_connect > inspecting
 
 
-def test_deploy_gce(walk_mock, progress_bar, popen_mock, open_mock,
+def test_deploy_gce(walk_mock, progress_bar, open_mock,
                     template, kube_helpers, process_helpers, verify_build,
-                    verify_init, fetch_action_arg):
+                    verify_init, state):
     output = deploy(
         no_push=False, skip_crd_check=True,
         interactive=False,
@@ -143,9 +156,9 @@ def test_deploy_gce(walk_mock, progress_bar, popen_mock, open_mock,
     verify_successful_deploy(output)
 
 
-def test_deploy_docker(walk_mock, progress_bar, popen_mock, open_mock,
+def test_deploy_docker(walk_mock, progress_bar, open_mock,
                        template, kube_helpers, process_helpers, verify_build,
-                       verify_init, fetch_action_arg):
+                       verify_init, state):
     output = deploy(
         no_push=False, skip_crd_check=True,
         interactive=False,
@@ -153,9 +166,9 @@ def test_deploy_docker(walk_mock, progress_bar, popen_mock, open_mock,
     verify_successful_deploy(output)
 
 
-def test_deploy_without_push(walk_mock, progress_bar, popen_mock, open_mock,
+def test_deploy_without_push(walk_mock, progress_bar, open_mock,
                              template, kube_helpers, process_helpers,
-                             verify_build, verify_init, fetch_action_arg):
+                             verify_build, verify_init, state):
     output = deploy(
         no_push=True, skip_crd_check=True,
         interactive=False,
@@ -163,15 +176,84 @@ def test_deploy_without_push(walk_mock, progress_bar, popen_mock, open_mock,
     verify_successful_deploy(output, did_push=False)
 
 
-def test_deploy_interactive_one_file(walk_mock, progress_bar, popen_mock,
+def test_deploy_tag_failure_uses_cli(walk_mock, progress_bar, open_mock,
+                                     template, kube_helpers, process_helpers,
+                                     verify_build, verify_init, state,
+                                     docker_api, registry_helpers):
+    """when the engine api can't tag the image, it's tagged and pushed
+       with the docker cli instead
+    """
+    client = docker_api.return_value = MagicMock()
+    client.tag.side_effect = socket.error(104, 'Connection reset by peer')
+    registry_helpers.push_auth.return_value = 'auth'
+    output = deploy(
+        no_push=False, skip_crd_check=True, interactive=False,
+        extra_config_args={'registry': 'dockerhub'})
+    verify_successful_deploy(output)
+    process_helpers.run.assert_called_once_with(
+        ['docker', 'tag', 'output', 'dockerhub/output'])
+    assert process_helpers.StreamingProcess.call_args[0][0] == \
+        ['docker', 'push', 'dockerhub/output']
+
+
+def test_deploy_image_already_pushed(walk_mock, progress_bar, open_mock,
+                                     template, process_helpers, kube_helpers,
+                                     verify_build, verify_init,
+                                     state, registry_helpers):
+    """no push when the registry has the image, but it's still recorded
+       as pushed for later `--no-push` deploys
+    """
+    registry_helpers.has_image.return_value = True
+    output = deploy(
+        no_push=False, skip_crd_check=True, interactive=False,
+        extra_config_args={'registry': 'dockerhub'})
+    registry_helpers.has_image.assert_called_once_with(
+        'dockerhub/output', 'output')
+    process_helpers.StreamingProcess.assert_not_called()
+    process_helpers.run.assert_not_called()
+    assert 'dockerhub/output is already in the registry' in output
+    state.record_push.assert_called_once_with('output', 'dockerhub/output')
+
+
+def test_deploy_push_failure(walk_mock, progress_bar, open_mock, template,
+                             kube_helpers, process_helpers, verify_build,
+                             verify_init, state):
+    """preflight steps run alongside the push, but nothing is applied
+       if the push fails
+    """
+    process_helpers.StreamingProcess.return_value.wait.return_value = 1
+    with pytest.raises(SystemExit):
+        deploy(no_push=False, skip_crd_check=False, interactive=False,
+               extra_config_args={'registry': 'dockerhub'})
+    kube_helpers.check_crds.assert_called_once_with(exit_on_failure=True)
+    kube_helpers.ensure_namespace_exists.assert_called_once_with(
+        'namespace')
+    kube_helpers.apply_files.assert_not_called()
+
+
+def test_deploy_applies_once(walk_mock, progress_bar, open_mock,
+                             template, kube_helpers, process_helpers,
+                             verify_build, verify_init, state):
+    """all templates are rendered, then sent to the cluster in one go"""
+    walk_mock.return_value = [
+        ('k8s-templates', [], ['job.yaml', 'svc.yaml', 'cm.yaml'])]
+    output = deploy(
+        no_push=True, skip_crd_check=True,
+        interactive=False,
+        extra_config_args={'registry': 'dockerhub'})
+    verify_successful_deploy(output, did_push=False)
+
+    kube_helpers.apply_files.assert_called_once_with(
+        'namespace', ['k8s/job.yaml', 'k8s/svc.yaml', 'k8s/cm.yaml'])
+
+
+def test_deploy_interactive_one_file(walk_mock, progress_bar,
                                      open_mock, template, kube_helpers,
                                      process_helpers, verify_build,
-                                     verify_init, fetch_action_arg, sleep,
-                                     yaml, json):
+                                     verify_init, state, sleep, yaml):
     walk_mock.return_value = ['foo']
-    yaml.return_value = {
-        'template': {'foo': 'bar'}, 'containers': [{'foo': 'bar'}]}
-    json.loads.return_value = {'status': {'phase': 'Running'}}
+    yaml.return_value = [{
+        'template': {'foo': 'bar'}, 'containers': [{'foo': 'bar'}]}]
     output = deploy(
         no_push=False, skip_crd_check=True,
         interactive=True,
@@ -179,14 +261,12 @@ def test_deploy_interactive_one_file(walk_mock, progress_bar, popen_mock,
     verify_successful_deploy(output, interactive=True)
 
 
-def test_deploy_interactive_two_files(walk_mock, progress_bar, popen_mock,
+def test_deploy_interactive_two_files(walk_mock, progress_bar,
                                       open_mock, template, kube_helpers,
                                       process_helpers, verify_build,
-                                      verify_init, fetch_action_arg, sleep,
-                                      yaml, json):
-    json.loads.return_value = {'status': {'phase': 'Running'}}
-    yaml.return_value = {
-        'template': {'foo': 'bar'}, 'containers': [{'foo': 'bar'}]}
+                                      verify_init, state, sleep, yaml):
+    yaml.return_value = [{
+        'template': {'foo': 'bar'}, 'containers': [{'foo': 'bar'}]}]
     output = deploy(
         no_push=False, skip_crd_check=True,
         interactive=True,
@@ -194,16 +274,200 @@ def test_deploy_interactive_two_files(walk_mock, progress_bar, popen_mock,
     verify_successful_deploy(output, interactive=True)
 
 
-def test_deploy_interactive_pod_not_run(walk_mock, progress_bar, popen_mock,
+def test_deploy_interactive_pod_not_run(walk_mock, progress_bar,
                                         open_mock, template, kube_helpers,
                                         process_helpers, verify_build,
-                                        verify_init, fetch_action_arg, sleep,
-                                        yaml, json):
-    json.loads.return_value = {'status': {'phase': 'Error'}}
-    yaml.return_value = {
-        'template': {'foo': 'bar'}, 'containers': [{'foo': 'bar'}]}
+                                        verify_init, state, sleep,
+                                        yaml):
+    kube_helpers.wait_for_pod_running.side_effect = ValueError
+    yaml.return_value = [{
+        'template': {'foo': 'bar'}, 'containers': [{'foo': 'bar'}]}]
     with pytest.raises(ValueError):
         output = deploy(
             no_push=False, skip_crd_check=True,
             interactive=True,
             extra_config_args={'registry': 'dockerhub', '<kube_spec>': 'r'})
+
+
+def test_deploy_interactive_run_labels(walk_mock, progress_bar, open_mock,
+                                       template, kube_helpers,
+                                       process_helpers, verify_build,
+                                       verify_init, state):
+    """objects are labelled with the run id, and the interactive pod is
+       found by that label instead of by listing the namespace
+    """
+    walk_mock.return_value = [('k8s-templates', [], ['job.yaml'])]
+    template.return_value.substitute.return_value = """
+apiVersion: batch/v1
+kind: Job
+metadata:
+  name: app-1234
+spec:
+  template:
+    metadata:
+      labels:
+        role: trainer
+    spec:
+      containers:
+      - name: app
+"""
+    kube_helpers.wait_for_pod_running.return_value = 'app-1234-abcde'
+    deploy_command = DeployCommand(
+        {'deploy': True, '--no-push': True, '--skip-crd-check': True,
+         '--watch': False, '--sweep': None, '--interactive': True,
+         '--timeout': 5, '<kube_spec>': None})
+    deploy_command.config = {'name': 'app', 'namespace': 'namespace'}
+    with catch_stdout():
+        deploy_command.action()
+
+    run_id = deploy_command.run_id
+    objects, labels = kube_helpers.add_labels.call_args[0]
+    assert labels == {'mlt-app-name': 'app', 'mlt-run-id': run_id}
+    # the debug label is added next to the labels already on the template
+    assert objects[0]['spec']['template']['metadata']['labels'] == {
+        'role': 'trainer', 'debug': 'true'}
+    assert kube_helpers.wait_for_pod_running.call_args[1] == {
+        'label_selector': 'mlt-run-id={},debug=true'.format(run_id)}
+    assert process_helpers.run_popen.call_args[0][0] == [
+        'kubectl', 'exec', '--namespace', 'namespace', '-it',
+        'app-1234-abcde', '/bin/bash']
+
+
+def test_deploy_watch_cycle(walk_mock, open_mock, yaml, template,
+                            kube_helpers, process_helpers, verify_build,
+                            verify_init, state):
+    """in watch mode each cycle pushes its own image, deploys what it
+       pushed and waits for the pods of its own run
+    """
+    from mlt.pipeline import Cycle
+
+    walk_mock.return_value = [('k8s-templates', [], ['job.yaml'])]
+    deploy_command = DeployCommand(
+        {'deploy': True, '--no-push': False, '--skip-crd-check': True,
+         '--watch': True, '--interactive': False, '--timeout': 5})
+    deploy_command.config = {'name': 'app', 'namespace': 'namespace',
+                             'registry': 'registry'}
+    verify_build.assert_not_called()
+
+    cycle = Cycle(1, 0)
+    cycle.data['image'] = 'app:abc'
+    with catch_stdout():
+        deploy_command._push_cycle(cycle)
+        deploy_command._apply_cycle(cycle)
+        deploy_command._start_cycle(cycle)
+
+    assert cycle.data['remote_image'] == 'registry/app:abc'
+    assert template.return_value.substitute.call_args[1]['image'] == \
+        'registry/app:abc'
+    assert kube_helpers.wait_for_pod_running.call_args[1] == {
+        'label_selector': 'mlt-run-id={}'.format(cycle.data['run_id'])}
+
+
+def test_deploy_watch_cycle_replaces_run(walk_mock, open_mock, yaml,
+                                         template, kube_helpers,
+                                         process_helpers, verify_build,
+                                         verify_init, state):
+    """each cycle deletes the run of the one before, before applying its
+       own
+    """
+    from mlt.pipeline import Cycle
+
+    walk_mock.return_value = [('k8s-templates', [], ['job.yaml'])]
+    kube_helpers.load_objects.return_value = [
+        {'apiVersion': 'batch/v1', 'kind': 'Job'},
+        {'apiVersion': 'v1', 'kind': 'Service'},
+        {'apiVersion': 'batch/v1', 'kind': 'Job'}]
+    deploy_command = DeployCommand(
+        {'deploy': True, '--no-push': True, '--skip-crd-check': True,
+         '--watch': True, '--interactive': False, '--timeout': 5})
+    deploy_command.config = {'name': 'app', 'namespace': 'namespace'}
+
+    first, second = Cycle(1, 0), Cycle(2, 0)
+    with catch_stdout():
+        deploy_command._apply_cycle(first)
+        kube_helpers.delete_collection.assert_not_called()
+        deploy_command._apply_cycle(second)
+
+    assert first.data['run_id'] != second.data['run_id']
+    selector = 'mlt-run-id={}'.format(first.data['run_id'])
+    assert kube_helpers.delete_collection.call_args_list == [
+        call('namespace', 'batch/v1', 'Job', selector),
+        call('namespace', 'v1', 'Service', selector)]
+    assert kube_helpers.apply_files.call_count == 2
+
+
+def _deploy_sweep(tmpdir, monkeypatch, kube_helpers, sweep):
+    tmpdir.mkdir('k8s-templates').join('job.yaml').write("""
+apiVersion: batch/v1
+kind: Job
+metadata:
+  name: $app-$run
+spec:
+  template:
+    spec:
+      containers:
+      - name: app
+        image: $image
+        args: [--learning-rate, '$learning_rate', --workers, '$workers']
+""")
+    tmpdir.join('sweep.json').write(jsonlib.dumps(sweep))
+    monkeypatch.chdir(tmpdir)
+    kube_helpers.add_labels.side_effect = add_labels
+    deploy_command = DeployCommand(
+        {'deploy': True, '--no-push': True, '--skip-crd-check': True,
+         '--watch': False, '--sweep': 'sweep.json', '--interactive': False,
+         '--concurrency': 10, '--rate-limit': 50.0})
+    deploy_command.config = {'name': 'app', 'namespace': 'namespace',
+                             'template_parameters': {'workers': 1}}
+    with catch_stdout() as caught_output:
+        deploy_command.action()
+        output = caught_output.getvalue()
+    return deploy_command, output
+
+
+def test_deploy_sweep(tmpdir, monkeypatch, kube_helpers, process_helpers,
+                      verify_build, verify_init, state):
+    """every trial is rendered in memory and labelled as a run of its own,
+       and all of them go to the cluster in a single apply_objects call
+    """
+    kube_helpers.apply_objects.return_value = []
+    deploy_command, output = _deploy_sweep(tmpdir, monkeypatch, kube_helpers, {
+        'grid': {'learning_rate': [0.1, 0.01], 'workers': [2, 4]}})
+
+    objects = kube_helpers.apply_objects.call_args[0][1]
+    assert len(objects) == 4
+    for obj in objects:
+        assert obj['metadata']['labels'] == {
+            'mlt-app-name': 'app',
+            'mlt-run-id': obj['metadata']['name'][len('app-'):],
+            'mlt-sweep-id': deploy_command.sweep_id}
+    assert [obj['spec']['template']['spec']['containers'][0]['args']
+            for obj in objects] == [
+        ['--learning-rate', '0.1', '--workers', '2'],
+        ['--learning-rate', '0.1', '--workers', '4'],
+        ['--learning-rate', '0.01', '--workers', '2'],
+        ['--learning-rate', '0.01', '--workers', '4']]
+    assert jsonlib.loads(objects[1]['metadata']['annotations'][
+        'mlt-sweep-parameters']) == {'learning_rate': 0.1, 'workers': 4}
+    assert kube_helpers.apply_objects.call_args[1] == {
+        'concurrency': 10, 'rate_limit': 50.0}
+    assert not tmpdir.join('k8s').check()
+
+    remote_image, run_ids, namespace = state.record_deploys.call_args[0][:3]
+    assert (remote_image, namespace) == ('output', 'namespace')
+    assert len(set(run_ids)) == 4
+    assert 'Submitted 4 of 4 runs' in output
+
+
+def test_deploy_sweep_failures(tmpdir, monkeypatch, kube_helpers,
+                               process_helpers, verify_build, verify_init,
+                               state):
+    """runs that didn't make it to the cluster aren't recorded"""
+    def apply_objects(namespace, objects, **kwargs):
+        return [(objects[0], '403 Forbidden: exceeded quota')]
+    kube_helpers.apply_objects.side_effect = apply_objects
+
+    with pytest.raises(SystemExit):
+        _deploy_sweep(tmpdir, monkeypatch, kube_helpers, {
+            'grid': {'learning_rate': [0.1, 0.01, 0.001]}})
+    assert len(state.record_deploys.call_args[0][1]) == 2
@@ -0,0 +1,122 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+from __future__ import print_function
+
+import pytest
+from mock import MagicMock
+
+from mlt.commands.logs import LogsCommand
+from test_utils.io import catch_stdout
+
+
+@pytest.fixture(autouse=True)
+def config(patch):
+    return patch('config_helpers.load_config', MagicMock(
+        return_value={'name': 'app', 'namespace': 'ns'}))
+
+
+@pytest.fixture
+def state(patch):
+    state_mock = MagicMock()
+    state_mock.last_deploy.return_value = {'run_id': 'run-1'}
+    patch('state_helpers.load_state', MagicMock(return_value=state_mock))
+    return state_mock
+
+
+@pytest.fixture
+def kube_helpers(patch):
+    kube_mock = patch('kubernetes_helpers')
+    kube_mock.watch_pods.return_value = iter([{'type': 'SYNC', 'items': [
+        _pod('app-ps-0', 'PS'), _pod('app-worker-0', 'Worker'),
+        _pod('app-worker-1', 'Worker', 'Pending')]}])
+    return kube_mock
+
+
+def _pod(name, replica, phase='Running'):
+    return {'metadata': {'name': name,
+                         'labels': {'tf-replica-type': replica}},
+            'spec': {'containers': [{'name': 'tensorflow'}]},
+            'status': {'phase': phase}}
+
+
+LOGS = {
+    'app-ps-0': ['2018-04-10T12:00:00.5Z ps started\n',
+                 '2018-04-10T12:00:02Z ps done\n'],
+    'app-worker-0': ['2018-04-10T12:00:01Z step 1\n',
+                     '2018-04-10T12:00:03Z step 2\n'],
+}
+
+
+def logs(follow=False, replica_type=None):
+    with catch_stdout() as caught_output:
+        LogsCommand({'logs': True, '--follow': follow,
+                     '--replica-type': replica_type}).action()
+        output = caught_output.getvalue()
+    return output
+
+
+def test_logs(state, kube_helpers):
+    """the running pods of the last run, merged in time order"""
+    kube_helpers.stream_log.side_effect = \
+        lambda namespace, name, container, follow, since_time: \
+        iter(LOGS[name])
+    output = logs()
+
+    assert kube_helpers.watch_pods.call_args[0] == ('ns', 'mlt-run-id=run-1')
+    lines = [line.split(' | ')[1] for line in output.splitlines()]
+    assert lines == ['ps started', 'step 1', 'ps done', 'step 2']
+    assert 'app-ps-0' in output.splitlines()[0]
+
+
+def test_logs_replica_type(state, kube_helpers):
+    kube_helpers.stream_log.side_effect = \
+        lambda namespace, name, container, follow, since_time: \
+        iter(LOGS[name])
+    output = logs(replica_type='worker')
+    assert 'ps started' not in output
+    assert 'step 2' in output
+
+
+def test_logs_no_deploy(state):
+    state.last_deploy.return_value = None
+    with pytest.raises(SystemExit):
+        logs()
+
+
+def test_follow_reconnects(state, kube_helpers, patch):
+    """a restarted container is read again from where we left off,
+       without repeating lines, until its pod is gone
+    """
+    patch('RECONNECT_INTERVAL', 0)
+    kube_helpers.watch_pods.return_value = iter([{'type': 'SYNC', 'items': [
+        _pod('app-worker-0', 'Worker')]}])
+    kube_helpers.stream_log.side_effect = [
+        iter(['2018-04-10T12:00:01Z step 1\n']),
+        iter(['2018-04-10T12:00:01Z step 1\n',
+              '2018-04-10T12:00:05Z restarted\n'])]
+    kube_helpers.get_pod.side_effect = [_pod('app-worker-0', 'Worker'), None]
+
+    output = logs(follow=True)
+
+    lines = [line.split(' | ')[1] for line in output.splitlines()]
+    assert lines == ['step 1', 'restarted']
+    since_times = [c[0][4] for c in kube_helpers.stream_log.call_args_list]
+    assert since_times == [None, '2018-04-10T12:00:01Z']
@@ -0,0 +1,210 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+from __future__ import print_function
+
+import pytest
+from mock import MagicMock
+
+from mlt.commands.queue import QueueCommand
+from mlt.utils.constants import APP_LABEL, RUN_LABEL
+from mlt.utils.kubernetes_helpers import pod_phases
+from mlt.utils.state_helpers import (FAILED, ProjectState, QUEUED, SUBMITTED,
+                                     SUCCEEDED)
+from test_utils.io import catch_stdout
+
+DEMAND = {'cpu': 2.0, 'memory': 0.0, 'nvidia.com/gpu': 0.0, 'pods': 1.0}
+
+
+@pytest.fixture
+def state(patch, tmpdir):
+    state = ProjectState(str(tmpdir.join('.mlt.db')))
+    patch('state_helpers.load_state', MagicMock(return_value=state))
+    return state
+
+
+@pytest.fixture
+def kube_helpers(patch):
+    kube_mock = patch('kubernetes_helpers')
+    kube_mock.list_nodes.return_value = [
+        {'spec': {}, 'status': {
+            'allocatable': {'cpu': '4', 'memory': '16Gi', 'pods': '110'},
+            'conditions': [{'type': 'Ready', 'status': 'True'}]}}]
+    kube_mock.list_resource_quotas.return_value = []
+    kube_mock.list_active_pods.return_value = []
+    kube_mock.apply_objects.return_value = []
+    kube_mock.pod_phases.side_effect = pod_phases
+    return kube_mock
+
+
+@pytest.fixture(autouse=True)
+def config(patch):
+    return patch('config_helpers.load_config', MagicMock(
+        return_value={'name': 'app', 'namespace': 'ns'}))
+
+
+def _job(run_id):
+    return {'apiVersion': 'batch/v1', 'kind': 'Job',
+            'metadata': {'name': run_id, 'labels': {RUN_LABEL: run_id}}}
+
+
+def _pod(run_id, phase, conditions=None):
+    return {'metadata': {'name': run_id + '-abcde', 'namespace': 'ns',
+                         'labels': {APP_LABEL: 'app', RUN_LABEL: run_id}},
+            'spec': {'containers': [
+                {'resources': {'requests': {'cpu': '2'}}}]},
+            'status': {'phase': phase, 'conditions': conditions or []}}
+
+
+def _queue(state, *run_ids, **demand):
+    state.enqueue('registry/app:1', 'ns',
+                  [(run_id, [_job(run_id)], dict(DEMAND, **demand))
+                   for run_id in run_ids])
+
+
+def _command(subcommand):
+    args = {'add': False, 'run': False, 'list': False, 'clear': False,
+            '--sweep': None, '--no-push': False, '--skip-crd-check': True}
+    args[subcommand] = True
+    with catch_stdout() as caught_output:
+        QueueCommand(args).action()
+        output = caught_output.getvalue()
+    return output
+
+
+def _statuses(state):
+    return dict((run['run_id'], run['status'])
+                for run in state.queued_runs())
+
+
+def test_run_submits_what_fits(state, kube_helpers):
+    """two runs fit on the node, the third goes out once they're done"""
+    _queue(state, 'run-1', 'run-2', 'run-3')
+    kube_helpers.list_pods.side_effect = [
+        [],
+        [_pod('run-1', 'Succeeded'), _pod('run-2', 'Failed')],
+        [_pod('run-1', 'Succeeded'), _pod('run-2', 'Failed'),
+         _pod('run-3', 'Running')]]
+
+    output = _command('run')
+
+    first, second = kube_helpers.apply_objects.call_args_list
+    assert first[0][1] == [_job('run-1'), _job('run-2')]
+    assert second[0][1] == [_job('run-3')]
+    assert kube_helpers.wait_for_pod_changes.call_count == 2
+    assert _statuses(state) == {'run-1': SUCCEEDED, 'run-2': FAILED,
+                                'run-3': SUBMITTED}
+    assert state.last_deploy()['run_id'] == 'run-3'
+    assert '1 runs waiting for room' in output
+
+
+def test_run_waits_for_unschedulable_pods(state, kube_helpers):
+    """nothing more is submitted while our pods can't be scheduled"""
+    _queue(state, 'run-2', cpu=0.5)
+    pending = _pod('run-1', 'Pending', [
+        {'type': 'PodScheduled', 'status': 'False',
+         'reason': 'Unschedulable'}])
+    kube_helpers.list_pods.side_effect = [[pending], [], [_pod('run-2',
+                                                               'Running')]]
+
+    output = _command('run')
+
+    assert kube_helpers.apply_objects.call_count == 1
+    assert kube_helpers.wait_for_pod_changes.call_args_list[0][0][2] == \
+        {'run-1-abcde': 'Pending'}
+    assert "can't be scheduled" in output
+
+
+def test_run_reserves_submitted_runs(state, kube_helpers):
+    """a run that was just submitted holds its room until its pods show
+       up, so the next one doesn't take it
+    """
+    _queue(state, 'run-1', 'run-2', cpu=3.0)
+    state.set_run_status('run-1', SUBMITTED)
+    kube_helpers.list_pods.side_effect = [
+        [], [_pod('run-1', 'Succeeded')], [_pod('run-2', 'Running')]]
+
+    _command('run')
+
+    kube_helpers.apply_objects.assert_called_once()
+    assert _statuses(state)['run-1'] == SUCCEEDED
+
+
+def _quota(used_cpu):
+    return {'status': {'hard': {'requests.cpu': '2'},
+                       'used': {'requests.cpu': str(used_cpu)}}}
+
+
+def test_run_rereads_quotas(state, kube_helpers):
+    """the quota's usage is read again before every submission, so runs
+       sent out since the last resync aren't counted as room
+    """
+    _queue(state, 'run-1', 'run-2')
+    kube_helpers.list_resource_quotas.side_effect = [
+        [_quota(0)], [_quota(2)], [_quota(0)]]
+    kube_helpers.list_pods.side_effect = [
+        [], [_pod('run-1', 'Running')], [_pod('run-1', 'Succeeded')],
+        [_pod('run-1', 'Succeeded'), _pod('run-2', 'Running')]]
+
+    _command('run')
+
+    first, second = kube_helpers.apply_objects.call_args_list
+    assert first[0][1] == [_job('run-1')]
+    assert second[0][1] == [_job('run-2')]
+    assert kube_helpers.list_resource_quotas.call_count == 3
+    assert kube_helpers.list_nodes.call_count == 1
+
+
+def test_run_too_big(state, kube_helpers):
+    """a run that the whole cluster couldn't fit fails right away"""
+    _queue(state, 'run-1', cpu=16.0)
+    kube_helpers.list_pods.return_value = []
+
+    output = _command('run')
+
+    kube_helpers.apply_objects.assert_not_called()
+    assert _statuses(state) == {'run-1': FAILED}
+    assert 'needs more than the whole cluster' in output
+
+
+def test_add(state, kube_helpers, patch):
+    deploy = patch('DeployCommand').return_value
+    deploy.remote_container_name = 'registry/app:1'
+    deploy._image_to_deploy.side_effect = lambda image: image
+    deploy._render_runs.return_value = [('run-1', [_job('run-1')])]
+
+    output = _command('add')
+
+    deploy._push.assert_called_once()
+    run, = state.queued_runs([QUEUED])
+    assert run['remote_image'] == 'registry/app:1'
+    assert run['demand']['pods'] == 0
+    assert 'Queued 1 runs' in output
+
+
+def test_list_and_clear(state):
+    _queue(state, 'run-1', 'run-2')
+    state.set_run_status('run-1', SUBMITTED)
+
+    output = _command('list')
+    assert 'run-2' in output and QUEUED in output
+
+    assert 'Removed 1 waiting runs' in _command('clear')
+    assert _statuses(state) == {'run-1': SUBMITTED}
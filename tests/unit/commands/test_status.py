@@ -0,0 +1,98 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+from __future__ import print_function
+
+import pytest
+from mock import MagicMock
+
+from mlt.commands.status import StatusCommand
+from test_utils.io import catch_stdout
+
+
+@pytest.fixture(autouse=True)
+def config(patch):
+    return patch('config_helpers.load_config', MagicMock(
+        return_value={'name': 'app', 'namespace': 'ns'}))
+
+
+@pytest.fixture
+def kube_helpers(patch):
+    kube_mock = patch('kubernetes_helpers')
+    kube_mock.watch_objects.side_effect = \
+        lambda namespace, api_version, kind, selector: iter([
+            {'type': 'SYNC', 'items': [_job()] if kind == 'Job' else []}])
+    return kube_mock
+
+
+def _job(conditions=None):
+    # list items don't say what kind they are
+    return {'metadata': {'name': 'app-1234', 'labels': {
+        'mlt-run-id': 'run-1'}}, 'status': {'active': 1,
+                                            'conditions': conditions}}
+
+
+def _pod(phase):
+    return {'metadata': {'name': 'app-1234-abcde',
+                         'labels': {'mlt-run-id': 'run-1'},
+                         'ownerReferences': [{'kind': 'Job',
+                                              'name': 'app-1234'}]},
+            'status': {'phase': phase}}
+
+
+def status(watch=False):
+    with catch_stdout() as caught_output:
+        StatusCommand({'status': True, '--watch': watch}).action()
+        output = caught_output.getvalue()
+    return output
+
+
+def test_status(kube_helpers):
+    kube_helpers.watch_pods.return_value = iter([
+        {'type': 'SYNC', 'items': [_pod('Pending')]}])
+    output = status()
+
+    assert kube_helpers.watch_objects.call_args[0][3] == 'mlt-app-name=app'
+    assert 'run-1' in output
+    assert 'Job' in output
+    assert 'job: 1 Pending' in output
+
+
+def test_status_no_runs(kube_helpers):
+    kube_helpers.watch_objects.side_effect = \
+        lambda namespace, api_version, kind, selector: iter([
+            {'type': 'SYNC', 'items': []}])
+    kube_helpers.watch_pods.return_value = iter([{'type': 'SYNC',
+                                                  'items': []}])
+    assert 'No runs of app in namespace ns' in status()
+
+
+def test_status_watch(kube_helpers, patch):
+    """the table is drawn again after the watch changes it"""
+    patch('REFRESH_INTERVAL', 0.01)
+    kube_helpers.watch_pods.return_value = iter([
+        {'type': 'SYNC', 'items': [_pod('Pending')]},
+        {'type': 'MODIFIED', 'object': _pod('Running')}])
+
+    with catch_stdout() as caught_output:
+        with pytest.raises(SystemExit):
+            StatusCommand({'status': True, '--watch': True}).action()
+        output = caught_output.getvalue()
+    assert output.find('job: 1 Pending') < output.find('job: 1 Running')
@@ -18,15 +18,103 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 
-from mock import patch
+import calendar
+from mock import MagicMock, patch
 
 from mlt.commands.undeploy import UndeployCommand
+from test_utils.io import catch_stdout
 
 
 @patch('mlt.commands.undeploy.config_helpers.load_config')
-@patch('mlt.commands.undeploy.process_helpers')
-def test_undeploy(proc_helpers, load_config):
-    undeploy = UndeployCommand({'undeploy': True})
+@patch('mlt.commands.undeploy.kubernetes_helpers')
+def test_undeploy(kube_helpers, load_config):
+    undeploy = UndeployCommand({'undeploy': True, '--all': False,
+                                '--older-than': None, '--keep': None})
     undeploy.config = {'namespace': 'foo'}
     undeploy.action()
-    proc_helpers.run.assert_called_once()
+    kube_helpers.delete_files.assert_called_once_with('foo', 'k8s')
+
+
+def _undeploy(all_runs=False, older_than=None, keep=None):
+    undeploy = UndeployCommand({'undeploy': True, '--all': all_runs,
+                                '--older-than': older_than, '--keep': keep})
+    undeploy.config = {'name': 'app', 'namespace': 'foo'}
+    with catch_stdout() as caught_output:
+        undeploy.action()
+        output = caught_output.getvalue()
+    return output
+
+
+def _job(run_id, created):
+    return {'apiVersion': 'batch/v1', 'kind': 'Job',
+            'metadata': {'name': 'app-' + run_id,
+                         'creationTimestamp': created,
+                         'labels': {'mlt-run-id': run_id}}}
+
+
+@patch('mlt.commands.undeploy.config_helpers.load_config')
+@patch('mlt.commands.undeploy.kubernetes_helpers')
+def test_undeploy_all(kube_helpers, load_config, tmpdir):
+    """every kind runs are made of goes in one call, by the app label"""
+    with tmpdir.as_cwd():
+        output = _undeploy(all_runs=True)
+
+    kube_helpers.list_objects.assert_not_called()
+    selectors = set(c[0][3] for c in
+                    kube_helpers.delete_collection.call_args_list)
+    assert selectors == {'mlt-app-name=app'}
+    kinds = [c[0][2] for c in kube_helpers.delete_collection.call_args_list]
+    assert kinds == ['Job', 'TFJob', 'TFJob']
+    assert 'Deleted all runs of app' in output
+
+
+@patch('mlt.commands.undeploy.config_helpers.load_config')
+@patch('mlt.commands.undeploy.kubernetes_helpers')
+def test_undeploy_keep(kube_helpers, load_config, tmpdir):
+    """the newest runs are kept, the rest deleted by their run labels"""
+    kube_helpers.list_objects.side_effect = \
+        lambda namespace, api_version, kind, selector: [
+            _job('run-1', '2018-04-01T00:00:00Z'),
+            _job('run-3', '2018-04-03T00:00:00Z'),
+            _job('run-2', '2018-04-02T00:00:00Z')] if kind == 'Job' else []
+    with tmpdir.as_cwd():
+        output = _undeploy(keep=1)
+
+    selector = kube_helpers.delete_collection.call_args[0][3]
+    assert selector == 'mlt-app-name=app,mlt-run-id in (run-2,run-1)'
+    assert 'Deleted 2 runs of app' in output
+
+
+@patch('mlt.commands.undeploy.time.time',
+       MagicMock(return_value=calendar.timegm((2018, 4, 3, 0, 0, 0))))
+@patch('mlt.commands.undeploy.config_helpers.load_config')
+@patch('mlt.commands.undeploy.kubernetes_helpers')
+def test_undeploy_older_than(kube_helpers, load_config, tmpdir):
+    kube_helpers.list_objects.return_value = [
+        _job('run-1', '2018-04-01T00:00:00Z'),
+        _job('run-2', '2018-04-02T12:00:00Z')]
+    with tmpdir.as_cwd():
+        _undeploy(older_than=86400)
+        assert kube_helpers.delete_collection.call_args[0][3] == \
+            'mlt-app-name=app,mlt-run-id in (run-1)'
+        kube_helpers.delete_collection.reset_mock()
+        kube_helpers.list_objects.return_value = [
+            _job('run-2', '2018-04-02T12:00:00Z')]
+        output = _undeploy(older_than=86400)
+
+    kube_helpers.delete_collection.assert_not_called()
+    assert 'No runs of app to delete' in output
+
+
+@patch('mlt.commands.undeploy.config_helpers.load_config')
+@patch('mlt.commands.undeploy.kubernetes_helpers')
+def test_undeploy_older_than_zero(kube_helpers, load_config, tmpdir):
+    """--older-than=0s deletes every run, not just the last deploy"""
+    kube_helpers.list_objects.return_value = [
+        _job('run-1', '2018-04-01T00:00:00Z')]
+    with tmpdir.as_cwd():
+        _undeploy(older_than=0)
+
+    kube_helpers.delete_files.assert_not_called()
+    assert kube_helpers.delete_collection.call_args[0][3] == \
+        'mlt-app-name=app,mlt-run-id in (run-1)'
@@ -24,39 +24,71 @@ from mlt.event_handler import EventHandler
 from test_utils.io import catch_stdout
 
 
-@patch('mlt.event_handler.call')
-def test_dispatch_git(call):
+def test_dispatch_git():
     """if event relates to git we return immediately"""
-    event_handler = EventHandler(lambda: 'foo')
+    callback = MagicMock()
+    event_handler = EventHandler(callback)
     event_handler.dispatch(MagicMock(src_path='./.git'))
-    call.assert_not_called()
+    callback.assert_not_called()
 
 
-@patch('mlt.event_handler.call')
-def test_dispatch_directory(call):
+def test_dispatch_directory():
     """if event is the main dir we do nothing"""
-    event_handler = EventHandler(lambda: 'foo')
+    callback = MagicMock()
+    event_handler = EventHandler(callback)
     event_handler.dispatch(MagicMock(src_path='./'))
-    call.assert_not_called()
+    callback.assert_not_called()
 
 
-@patch('mlt.event_handler.open')
-@patch('mlt.event_handler.call')
-def test_dispatch_is_ignored(call, open_mock):
-    """if git check-ignore passes, we do nothing"""
-    call.return_value = 0
-    event_handler = EventHandler(lambda: 'foo')
-    event_handler.dispatch(MagicMock())
-    assert event_handler.timer is None
+@patch('mlt.event_handler.IgnoreMatcher')
+def test_dispatch_is_ignored(matcher):
+    """if the path is ignored by git, we do nothing"""
+    matcher.return_value.is_ignore_file.return_value = False
+    matcher.return_value.is_ignored.return_value = True
+    callback = MagicMock()
+    event_handler = EventHandler(callback)
+    event_handler.dispatch(MagicMock(src_path='./foo.pyc',
+                                     is_directory=False))
+    matcher.return_value.is_ignored.assert_called_with('./foo.pyc', False)
+    callback.assert_not_called()
 
 
-@patch('mlt.event_handler.open')
-@patch('mlt.event_handler.call')
-def test_dispatch(call, open_mock):
+@patch('mlt.event_handler.IgnoreMatcher')
+def test_dispatch_ignore_file_changed(matcher):
+    """changes to .gitignore reload the rules and still count as a change"""
+    matcher.return_value.is_ignore_file.return_value = True
+    callback = MagicMock()
+    event_handler = EventHandler(callback)
+    with catch_stdout():
+        event_handler.dispatch(MagicMock(src_path='./.gitignore'))
+    matcher.return_value.reload.assert_called_once()
+    callback.assert_called_once_with('./.gitignore')
+
+
+@patch('mlt.event_handler.IgnoreMatcher')
+def test_dispatch(matcher):
     """normal file event handling"""
-    event_handler = EventHandler(lambda: 'foo')
-    event_handler.timer = None
+    matcher.return_value.is_ignore_file.return_value = False
+    matcher.return_value.is_ignored.return_value = False
+    callback = MagicMock()
+    event_handler = EventHandler(callback)
     with catch_stdout() as caught_output:
         event_handler.dispatch(MagicMock(src_path='/foo'))
         output = caught_output.getvalue()
     assert output == 'event.src_path /foo\n'
+    callback.assert_called_once_with('/foo')
+
+
+@patch('mlt.event_handler.IgnoreMatcher')
+def test_dispatch_moved(matcher):
+    """both ends of a move count as changed"""
+    matcher.return_value.is_ignore_file.return_value = False
+    matcher.return_value.is_ignored.return_value = False
+    callback = MagicMock()
+    event_handler = EventHandler(callback)
+    with catch_stdout():
+        event_handler.dispatch(MagicMock(src_path='./a.py',
+                                         dest_path='./b.py',
+                                         event_type='moved'))
+    paths = [c[0][0] for c in callback.call_args_list]
+    assert paths == ['./a.py', './b.py']
@@ -18,10 +18,14 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 
+import json
 import pytest
-from mock import MagicMock, patch
+import sys
+from mock import patch
+from subprocess import check_output
 
-from mlt.main import main, run_command
+from mlt.main import (COMMAND_MAP, load_command, main, parse_duration,
+                      run_command)
 
 """
 All these tests assert that given a command arg from docopt we call
@@ -34,25 +38,77 @@ the right command
                           'undeploy', 'foo'])
 def test_run_command(command):
     # couldn't get this to work as a function decorator
-    with patch('mlt.main.COMMAND_MAP', ((command, MagicMock()),)) \
-            as COMMAND_MAP:
+    with patch('mlt.main.COMMAND_MAP', ((command, 'mlt.commands.Foo'),)), \
+            patch('mlt.main.import_module') as import_module:
         run_command({command: True})
-        COMMAND_MAP[0][1].return_value.action.assert_called_once()
+        import_module.assert_called_once_with('mlt.commands')
+        import_module.return_value.Foo.return_value.action.\
+            assert_called_once()
+
+
+def test_command_map_loads():
+    """every command in the map points at a command class"""
+    for command, command_class in COMMAND_MAP:
+        assert load_command(command_class).__name__ == \
+            command_class.rsplit('.', 1)[1]
+
+
+def _imported_modules(module):
+    """top level modules loaded by a fresh interpreter importing `module`"""
+    return set(json.loads(check_output([
+        sys.executable, '-c',
+        'import json, sys, {}; print(json.dumps(list(sys.modules)))'.format(
+            module)]).decode('utf-8')))
+
+
+@pytest.mark.parametrize('module,unwanted', [
+    # `mlt --version`, `mlt -h` and the command dispatch itself
+    ('mlt.main', ('mlt.commands', 'progressbar', 'tabulate', 'termcolor',
+                  'watchdog', 'yaml')),
+    ('mlt.commands.undeploy', ('progressbar', 'tabulate', 'watchdog')),
+    ('mlt.commands.deploy', ('tabulate', 'watchdog')),
+    ('mlt.commands.build', ('tabulate', 'watchdog', 'yaml')),
+    ('mlt.commands.queue', ('tabulate', 'watchdog')),
+    ('mlt.commands.status', ('tabulate', 'watchdog')),
+    ('mlt.commands.logs', ('tabulate', 'watchdog')),
+])
+def test_startup_imports(module, unwanted):
+    """keeps the cost of starting mlt down: commands and their heavy
+       dependencies are only imported when they are needed
+    """
+    imported = _imported_modules(module)
+    assert not imported.intersection(unwanted)
 
 
 @pytest.mark.parametrize('args',
                          [{'<name>': 'Capitalized_Name',
-                           '-i': False, '--retries': '5'},
-                          {'-i': True, '<name>': 'foo', '--retries': '5'},
-                          {'-i': True, '<name>': 'foo', '--retries': '8'}])
+                           '-i': False, '--timeout': '5'},
+                          {'-i': True, '<name>': 'foo', '--timeout': '5'},
+                          {'-i': True, '<name>': 'foo', '--timeout': '8'}])
 @patch('mlt.main.docopt')
 @patch('mlt.main.run_command')
 def test_main_various_args(run_command, docopt, args):
     docopt.return_value = args
     # add common args and expected arg manipulations
     args['--namespace'] = 'foo'
-    args['--retries'] = int(args['--retries'])
+    args['--timeout'] = int(args['--timeout'])
+    args['--concurrency'] = '10'
+    args['--rate-limit'] = '50'
+    args['--keep'] = None
+    args['--older-than'] = None
     args['--interactive'] = True
     args['<name>'] = args['<name>'].lower()
     main()
     run_command.assert_called_with(args)
+
+
+@pytest.mark.parametrize('value,seconds', [
+    ('90s', 90), ('30m', 1800), ('12h', 43200), ('7d', 604800),
+    ('2w', 1209600)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+def test_parse_duration_invalid():
+    with pytest.raises(ValueError):
+        parse_duration('a week')
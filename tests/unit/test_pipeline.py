@@ -0,0 +1,96 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import threading
+import time
+
+from mlt.pipeline import Cycle, pipeline
+from test_utils.io import catch_stdout
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_stale_cycles_skipped():
+    """cycles waiting behind a busy stage are replaced by newer ones"""
+    release = threading.Event()
+    pushed = []
+    applied = []
+    done = []
+
+    def push(cycle):
+        pushed.append(cycle.number)
+        if cycle.number == 1:
+            release.wait(5)
+
+    first = pipeline([('push', push),
+                      ('apply', lambda cycle: applied.append(cycle.number))],
+                     done=done.append)
+    with catch_stdout() as caught_output:
+        for number in (1, 2, 3, 4):
+            first.submit(Cycle(number, time.time()))
+            _wait_for(lambda: pushed)
+        release.set()
+        assert _wait_for(lambda: done and done[-1].number == 4)
+        output = caught_output.getvalue()
+    first.stop()
+    first.join(5)
+
+    assert pushed == [1, 4]
+    # cycle 1 may or may not be applied before cycle 4 replaces it
+    assert applied[-1] == 4
+    assert 'Skipping push for cycle 2, cycle 3 is newer' in output
+    assert list(done[-1].timings) == ['push', 'apply']
+
+
+def test_failures_end_the_cycle_only():
+    applied = []
+
+    def push(cycle):
+        if cycle.number == 1:
+            raise RuntimeError('registry unavailable')
+        if cycle.number == 2:
+            raise SystemExit(1)
+
+    first = pipeline([('push', push),
+                      ('apply', lambda cycle: applied.append(cycle.number))])
+    with catch_stdout() as caught_output:
+        for number in (1, 2, 3):
+            first.submit(Cycle(number, time.time()))
+            time.sleep(0.05)
+        assert _wait_for(lambda: applied)
+        output = caught_output.getvalue()
+    first.stop()
+
+    assert applied == [3]
+    assert 'Push failed for cycle 1' in output
+    assert 'registry unavailable' in output
+
+
+def test_cycle_report():
+    cycle = Cycle(3, time.time() - 42)
+    cycle.timings['build'] = 20.04
+    cycle.timings['push'] = 14.0
+    assert cycle.report().startswith('Cycle 3 done 42.')
+    assert cycle.report().endswith('after the edit (build 20.0s, push 14.0s)')
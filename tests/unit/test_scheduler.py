@@ -0,0 +1,169 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import threading
+import time
+
+from mlt.scheduler import BuildScheduler
+from test_utils.io import catch_stdout
+
+
+def _run_in_background(scheduler):
+    runner = threading.Thread(target=scheduler.run)
+    runner.daemon = True
+    runner.start()
+    return runner
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_changes_during_build_coalesce():
+    """one build at a time; any number of changes made during a build
+       lead to exactly one more
+    """
+    started = []
+    running = []
+    release = threading.Event()
+
+    def build():
+        running.append(1)
+        started.append(len(running))
+        if len(started) == 1:
+            release.wait(5)
+        running.pop()
+
+    scheduler = BuildScheduler(build, min_delay=0.01, max_delay=0.05)
+    runner = _run_in_background(scheduler)
+    scheduler.notify()
+    assert _wait_for(lambda: len(started) == 1)
+    for _ in range(5):
+        scheduler.notify()
+        time.sleep(0.02)
+    release.set()
+    assert _wait_for(lambda: len(started) == 2)
+    time.sleep(0.2)
+    scheduler.stop()
+    runner.join(5)
+    assert not runner.is_alive()
+    assert started == [1, 1]
+
+
+def test_stale_build_cancelled_once():
+    release = threading.Event()
+    builds = []
+    cancels = []
+
+    def build():
+        builds.append(1)
+        if len(builds) == 1:
+            release.wait(5)
+
+    def cancel():
+        cancels.append(1)
+        release.set()
+
+    scheduler = BuildScheduler(build, cancel=cancel, min_delay=0.01,
+                               max_delay=0.05)
+    runner = _run_in_background(scheduler)
+    scheduler.notify()
+    assert _wait_for(lambda: builds)
+    scheduler.notify()
+    scheduler.notify()
+    assert _wait_for(lambda: len(builds) == 2)
+    scheduler.stop()
+    runner.join(5)
+    assert cancels == [1]
+
+
+def test_debounce_window_follows_event_rate():
+    now = [0.0]
+    scheduler = BuildScheduler(lambda: None, min_delay=0.25,
+                               max_delay=3.0, clock=lambda: now[0])
+    assert scheduler.debounce_window() == 0.25
+
+    # quick bursts keep the window at its minimum
+    for gap in (0.01, 0.02, 0.01):
+        now[0] += gap
+        scheduler.notify()
+    assert scheduler.debounce_window() == 0.25
+
+    # events a second apart, e.g. a slow checkout, widen it
+    for _ in range(10):
+        now[0] += 1.0
+        scheduler.notify()
+    assert scheduler.debounce_window() == 2.0
+
+    # gaps longer than the maximum are separate edits, not bursts
+    now[0] += 60
+    scheduler.notify()
+    assert scheduler.debounce_window() == 2.0
+
+
+def test_changed_paths():
+    """each build sees the paths changed since the previous one"""
+    seen = []
+    scheduler = BuildScheduler(lambda: seen.append(scheduler.changed_paths),
+                               min_delay=0.01, max_delay=0.05)
+    runner = _run_in_background(scheduler)
+    scheduler.notify('a.py')
+    scheduler.notify('b.py')
+    assert _wait_for(lambda: len(seen) == 1)
+    scheduler.notify('c.py')
+    scheduler.notify()
+    assert _wait_for(lambda: len(seen) == 2)
+    scheduler.stop()
+    runner.join(5)
+    # a change without a path means anything may have changed
+    assert seen == [set(['a.py', 'b.py']), None]
+
+
+def test_stop_while_idle():
+    scheduler = BuildScheduler(lambda: None)
+    runner = _run_in_background(scheduler)
+    scheduler.stop()
+    runner.join(5)
+    assert not runner.is_alive()
+
+
+def test_failed_build_keeps_scheduling():
+    """a build that raises is reported, and the next change builds again"""
+    builds = []
+
+    def build():
+        builds.append(1)
+        if len(builds) == 1:
+            raise OSError(2, 'No such file or directory', 'main.py~')
+
+    scheduler = BuildScheduler(build, min_delay=0.01, max_delay=0.05)
+    with catch_stdout() as caught_output:
+        runner = _run_in_background(scheduler)
+        scheduler.notify()
+        assert _wait_for(lambda: len(builds) == 1)
+        scheduler.notify()
+        assert _wait_for(lambda: len(builds) == 2)
+        scheduler.stop()
+        runner.join(5)
+        output = caught_output.getvalue()
+    assert 'No such file or directory' in output
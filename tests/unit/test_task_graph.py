@@ -0,0 +1,84 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import pytest
+import sys
+import threading
+import time
+
+from mlt.task_graph import TaskGraph
+
+
+def test_independent_tasks_overlap():
+    """each task waits for the other to start, which only works if they
+       run at the same time
+    """
+    a_started = threading.Event()
+    b_started = threading.Event()
+
+    def a():
+        a_started.set()
+        return b_started.wait(5)
+
+    def b():
+        b_started.set()
+        return a_started.wait(5)
+
+    graph = TaskGraph()
+    graph.add('a', a)
+    graph.add('b', b)
+    graph.add('c', lambda: 'c', after=['a', 'b'])
+    assert graph.run() == {'a': True, 'b': True, 'c': 'c'}
+    assert list(graph.timings) == ['a', 'b', 'c']
+
+
+def test_dependencies_run_first():
+    order = []
+    graph = TaskGraph()
+    graph.add('slow', lambda: time.sleep(0.1) or order.append('slow'))
+    graph.add('fast', lambda: order.append('fast'))
+    graph.add('last', lambda: order.append('last'), after=['slow', 'fast'])
+    graph.run()
+    assert order == ['fast', 'slow', 'last']
+    assert graph.critical_path() == ['slow', 'last']
+    assert graph.report().startswith('Timings: slow 0.1s*, fast 0.0s, ')
+
+
+def test_failure_stops_dependents():
+    """running tasks finish, dependents never start, and the failure is
+       raised in the caller with its exit code intact
+    """
+    finished = []
+    graph = TaskGraph()
+    graph.add('push', lambda: sys.exit(3))
+    graph.add('render', lambda: time.sleep(0.1) or finished.append('render'))
+    graph.add('apply', lambda: finished.append('apply'),
+              after=['push', 'render'])
+    with pytest.raises(SystemExit) as e:
+        graph.run()
+    assert e.value.code == 3
+    assert finished == ['render']
+    assert list(graph.timings) == ['push', 'render']
+
+
+def test_unknown_dependency():
+    graph = TaskGraph()
+    with pytest.raises(ValueError):
+        graph.add('apply', lambda: None, after=['push'])
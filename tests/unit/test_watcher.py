@@ -0,0 +1,129 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import errno
+import os
+import time
+from mock import patch
+
+from mlt.watcher import Watcher, _snapshot_events
+
+
+class Recorder(object):
+    def __init__(self):
+        self.events = []
+
+    def dispatch(self, event):
+        self.events.append(event)
+
+    def paths(self):
+        return set(e.src_path for e in self.events)
+
+
+def _tree(tmpdir):
+    tmpdir.join('.gitignore').write('data/\n*.ckpt\n')
+    tmpdir.join('src', 'main.py').write('', ensure=True)
+    tmpdir.join('data', 'big', 'a.csv').write('', ensure=True)
+    return str(tmpdir)
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_directories_skip_ignored(tmpdir):
+    root = _tree(tmpdir)
+    watcher = Watcher(Recorder(), root)
+    assert set(watcher.directories()) == set(
+        [root, os.path.join(root, 'src')])
+
+
+def test_watches_new_directories(tmpdir):
+    """directories created after startup are watched, events from inside
+       ignored ones never reach the handler
+    """
+    root = _tree(tmpdir)
+    recorder = Recorder()
+    watcher = Watcher(recorder, root)
+    watcher.start()
+    try:
+        new_file = tmpdir.join('src', 'new', 'model.py')
+        new_file.write('', ensure=True)
+        tmpdir.join('data', 'b.csv').write('')
+        assert _wait_for(lambda: str(new_file) in recorder.paths())
+        new_file.write('changed')
+        assert _wait_for(lambda: any(
+            e.event_type == 'modified' and e.src_path == str(new_file)
+            for e in recorder.events))
+        assert str(tmpdir.join('data', 'b.csv')) not in recorder.paths()
+    finally:
+        watcher.stop()
+        watcher.join()
+
+
+def test_many_directories_share_one_watch(tmpdir):
+    """a tree with more directories than the default inotify instance limit
+       (128) is still watched natively, through a single emitter
+    """
+    root = _tree(tmpdir)
+    for i in range(200):
+        tmpdir.join('src', 'pkg{}'.format(i)).ensure(dir=True)
+    recorder = Recorder()
+    watcher = Watcher(recorder, root)
+    watcher.start()
+    try:
+        assert not watcher.polling
+        assert len(watcher._observer.emitters) == 1
+        deep = tmpdir.join('src', 'pkg199', 'model.py')
+        deep.write('')
+        assert _wait_for(lambda: str(deep) in recorder.paths())
+    finally:
+        watcher.stop()
+        watcher.join()
+
+
+def test_falls_back_to_polling(tmpdir):
+    """running out of inotify watches switches to polling"""
+    root = _tree(tmpdir)
+    recorder = Recorder()
+    watcher = Watcher(recorder, root, poll_interval=0.05)
+    with patch('mlt.watcher.Observer.schedule',
+               side_effect=OSError(errno.ENOSPC, 'inotify watch limit')):
+        watcher.start()
+    try:
+        assert watcher.polling
+        main = tmpdir.join('src', 'main.py')
+        main.write('changed')
+        tmpdir.join('model.ckpt').write('')
+        assert _wait_for(lambda: str(main) in recorder.paths())
+        assert str(tmpdir.join('model.ckpt')) not in recorder.paths()
+    finally:
+        watcher.stop()
+        watcher.join()
+
+
+def test_snapshot_events():
+    old = {'a': (1, 1), 'b': (1, 1), 'c': (1, 1)}
+    new = {'a': (1, 1), 'b': (2, 1), 'd': (1, 1)}
+    assert [(e.event_type, e.src_path) for e in _snapshot_events(old, new)] \
+        == [('created', 'd'), ('deleted', 'c'), ('modified', 'b')]
@@ -23,7 +23,18 @@ from mock import patch
 from mlt.utils.build_helpers import verify_build
 
 
+@patch('mlt.utils.build_helpers.state_helpers')
 @patch('mlt.utils.build_helpers.BuildCommand')
-def test_needs_build_command_bad_build(BuildClass):
+def test_needs_build_command_bad_build(BuildClass, state_helpers):
+    state_helpers.load_state.return_value.last_build.return_value = None
     verify_build({})
     assert BuildClass.return_value.action.called
+
+
+@patch('mlt.utils.build_helpers.state_helpers')
+@patch('mlt.utils.build_helpers.BuildCommand')
+def test_already_built(BuildClass, state_helpers):
+    state_helpers.load_state.return_value.last_build.return_value = {
+        'image': 'app:1234'}
+    verify_build({})
+    assert not BuildClass.return_value.action.called
@@ -0,0 +1,113 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import pytest
+
+from mlt.utils.capacity_helpers import (allocatable, fits, format_demand,
+                                        free_capacity, GPU, parse_quantity,
+                                        quota_room, run_demand, UNLIMITED)
+
+
+def _container(requests=None, limits=None):
+    return {'name': 'app', 'image': 'app',
+            'resources': {'requests': requests or {}, 'limits': limits or {}}}
+
+
+def _node(cpu, memory, gpu=0, ready='True', unschedulable=False):
+    return {'spec': {'unschedulable': unschedulable},
+            'status': {'allocatable': {'cpu': cpu, 'memory': memory,
+                                       GPU: str(gpu), 'pods': '110'},
+                       'conditions': [{'type': 'Ready', 'status': ready}]}}
+
+
+def _pod(phase, **requests):
+    return {'spec': {'containers': [_container(requests)]},
+            'status': {'phase': phase}}
+
+
+@pytest.mark.parametrize('value,expected', [
+    ('500m', 0.5), ('2', 2), ('1.5', 1.5), ('2Gi', 2 * 2 ** 30),
+    ('1k', 1000), ('1e3', 1000), (4, 4)])
+def test_parse_quantity(value, expected):
+    assert parse_quantity(value) == expected
+
+
+def test_parse_quantity_invalid():
+    with pytest.raises(ValueError):
+        parse_quantity('lots')
+
+
+def test_run_demand_tfjob():
+    """every replica of every pod template counts, limits stand in for
+       requests that aren't set
+    """
+    tfjob = {'kind': 'TFJob', 'spec': {'tfReplicaSpecs': {
+        'PS': {'replicas': 1, 'template': {'spec': {'containers': [
+            _container({'cpu': '500m', 'memory': '1Gi'})]}}},
+        'Worker': {'replicas': 2, 'template': {'spec': {'containers': [
+            _container(limits={'cpu': '1', GPU: '1'})]}}}}}}
+    demand = run_demand([tfjob, {'kind': 'Service', 'spec': {}}])
+    assert demand == {'cpu': 2.5, 'memory': 2.0 ** 30, GPU: 2.0,
+                      'pods': 3.0}
+
+
+def test_run_demand_job_parallelism():
+    job = {'kind': 'Job', 'spec': {'parallelism': 4, 'template': {
+        'spec': {'containers': [_container({'cpu': '250m'})]}}}}
+    assert run_demand([job])['cpu'] == 1.0
+    assert run_demand([job])['pods'] == 4.0
+
+
+def test_allocatable_skips_unavailable_nodes():
+    nodes = [_node('4', '8Gi', gpu=1), _node('4', '8Gi', ready='False'),
+             _node('4', '8Gi', unschedulable=True)]
+    total = allocatable(nodes)
+    assert total['cpu'] == 4.0
+    assert total[GPU] == 1.0
+    assert allocatable(None)['cpu'] == UNLIMITED
+
+
+def test_quota_room():
+    quotas = [{'status': {'hard': {'requests.cpu': '10', 'pods': '5'},
+                          'used': {'requests.cpu': '2500m', 'pods': '5'}}}]
+    room = quota_room(quotas)
+    assert room['cpu'] == 7.5
+    assert room['pods'] == 0
+    assert room['memory'] == UNLIMITED
+
+
+def test_free_capacity():
+    """what the nodes have left, capped by the quota, minus reservations;
+       finished pods don't hold on to anything
+    """
+    nodes = [_node('8', '32Gi')]
+    pods = [_pod('Running', cpu='2'), _pod('Succeeded', cpu='4')]
+    quotas = [{'status': {'hard': {'memory': '16Gi'}, 'used': {}}}]
+    free = free_capacity(nodes, pods, quotas, reserved=[{'cpu': 1.0}])
+    assert free['cpu'] == 5.0
+    assert free['memory'] == 16 * 2 ** 30
+    assert fits({'cpu': 5.0, 'memory': 2 ** 30, 'pods': 1.0}, free)
+    assert not fits({'cpu': 6.0}, free)
+
+
+def test_format_demand():
+    assert format_demand({'cpu': 2.5, 'memory': 2 ** 31, GPU: 1.0,
+                          'pods': 3.0}) == \
+        '2.5 cpu, 2.0Gi memory, 1 gpu, 3 pods'
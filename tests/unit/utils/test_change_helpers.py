@@ -0,0 +1,90 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import json
+import os
+import pytest
+
+from mlt.utils.change_helpers import ChangeClassifier, IMAGE, MANIFESTS
+
+
+def _write(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+@pytest.fixture
+def project(tmpdir):
+    project = str(tmpdir)
+    _write(os.path.join(project, 'Dockerfile'),
+           'FROM python:3.6\nADD requirements.txt /src/\nADD . /src/app\n')
+    _write(os.path.join(project, '.dockerignore'),
+           'k8s\nk8s-templates\nmlt.json\n')
+    _write(os.path.join(project, 'mlt.json'), json.dumps(
+        {'name': 'app', 'registry': 'registry',
+         'template_parameters': {'num_ps': 1}}))
+    return project
+
+
+def _classify(project, *paths):
+    return ChangeClassifier(project).classify(
+        [os.path.join(project, path) for path in paths])
+
+
+@pytest.mark.parametrize('paths,changes', [
+    (['main.py'], set([IMAGE])),
+    (['k8s-templates/job.yaml'], set([MANIFESTS])),
+    (['k8s-templates/job.yaml', 'main.py'], set([IMAGE, MANIFESTS])),
+    (['k8s/job.yaml'], set()),
+    (['Dockerfile'], set([IMAGE, MANIFESTS])),
+    (['.dockerignore'], set([IMAGE, MANIFESTS])),
+])
+def test_classify(project, paths, changes):
+    assert _classify(project, *paths) == changes
+
+
+def test_classify_unknown(project):
+    assert ChangeClassifier(project).classify(None) == set([IMAGE, MANIFESTS])
+
+
+def test_classify_templates_in_image(project):
+    """without a .dockerignore `ADD .` puts the templates into the image"""
+    os.remove(os.path.join(project, '.dockerignore'))
+    assert _classify(project, 'k8s-templates/job.yaml') == set(
+        [IMAGE, MANIFESTS])
+
+
+def test_classify_config(project):
+    """template parameters only change manifests, anything else in
+       mlt.json changes the image we deploy
+    """
+    classifier = ChangeClassifier(project)
+    config = os.path.join(project, 'mlt.json')
+    assert classifier.classify([config]) == set()
+
+    _write(config, json.dumps({'name': 'app', 'registry': 'registry',
+                               'template_parameters': {'num_ps': 2}}))
+    assert classifier.classify([config]) == set([MANIFESTS])
+
+    _write(config, json.dumps({'name': 'app', 'registry': 'other',
+                               'template_parameters': {'num_ps': 2}}))
+    assert classifier.classify([config]) == set([IMAGE, MANIFESTS])
@@ -0,0 +1,113 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import base64
+import os
+import pytest
+
+from mlt.utils.docker_api import get_client, PushStream, split_tag
+from mlt.utils.docker_helpers import PushProgress
+from test_utils.fake_server import FakeServer
+
+PUSH_MESSAGES = [
+    {'status': 'The push refers to repository [localhost:5000/app]'},
+    {'status': 'Preparing', 'id': '5f70bf18a086'},
+    {'status': 'Preparing', 'id': 'a1b2c3d4e5f6'},
+    {'status': 'Pushing', 'id': '5f70bf18a086',
+     'progressDetail': {'current': 512, 'total': 2048},
+     'progress': '[=====>     ]  512B/2.048kB'},
+    {'status': 'Layer already exists', 'id': 'a1b2c3d4e5f6'},
+    {'status': 'Pushing', 'id': '5f70bf18a086',
+     'progressDetail': {'current': 2048, 'total': 2048}},
+    {'status': 'Pushed', 'id': '5f70bf18a086'},
+    {'status': '1234: digest: sha256:abc123 size: 735'},
+    {'progressDetail': {},
+     'aux': {'Tag': '1234', 'Digest': 'sha256:abc123', 'Size': 735}},
+]
+
+
+def _docker_routes(push_messages):
+    return {('GET', '/v1.24/_ping'): (200, 'OK'),
+            ('POST', '/v1.24/images/app/tag'): (201, {}),
+            ('POST', '/v1.24/images/localhost%3A5000%2Fapp/push'):
+            (200, push_messages)}
+
+
+@pytest.fixture
+def docker_socket(tmpdir, monkeypatch):
+    path = str(tmpdir.join('docker.sock'))
+    monkeypatch.delenv('MLT_USE_DOCKER_CLI', raising=False)
+    monkeypatch.setenv('DOCKER_HOST', 'unix://' + path)
+    return path
+
+
+@pytest.mark.parametrize('name,split', [
+    ('localhost:5000/app:1234', ('localhost:5000/app', '1234')),
+    ('localhost:5000/app', ('localhost:5000/app', 'latest')),
+    ('app', ('app', 'latest')),
+])
+def test_split_tag(name, split):
+    assert split_tag(name) == split
+
+
+def test_push(docker_socket, tmpdir):
+    """tags and pushes over the socket, and adds up the layers' bytes"""
+    auth = base64.urlsafe_b64encode(b'{}').decode('ascii')
+    log_file = str(tmpdir.join('push.log'))
+    progress = PushProgress()
+    with FakeServer(_docker_routes(PUSH_MESSAGES),
+                    unix_socket=docker_socket) as server:
+        client = get_client()
+        client.tag('app', 'localhost:5000/app', '1234')
+        push = PushStream(client, 'localhost:5000/app:1234', auth,
+                          log_file, on_message=progress.update_message)
+        assert push.wait(5) == 0
+
+    tag, push_request = server.requests[1:]
+    assert tag['url'] == \
+        '/v1.24/images/app/tag?repo=localhost%3A5000%2Fapp&tag=1234'
+    assert push_request['url'].endswith('push?tag=1234')
+    assert push_request['headers']['X-Registry-Auth'] == auth
+    assert progress() == (2048, 2048)
+    assert progress.digest == 'sha256:abc123'
+    with open(log_file) as f:
+        assert '5f70bf18a086: Pushed\n' in f.read()
+
+
+def test_push_error(docker_socket, tmpdir):
+    messages = PUSH_MESSAGES[:3] + [{'error': 'unauthorized: login first'}]
+    with FakeServer(_docker_routes(messages), unix_socket=docker_socket):
+        push = PushStream(get_client(), 'localhost:5000/app:1234', '',
+                          str(tmpdir.join('push.log')))
+        assert push.wait(5) == 1
+    assert push.output_tail().endswith('unauthorized: login first\n')
+
+
+def test_get_client_falls_back_to_cli(docker_socket, monkeypatch):
+    assert not os.path.exists(docker_socket)
+    assert get_client() is None
+
+    with FakeServer(_docker_routes([]), unix_socket=docker_socket):
+        assert get_client() is not None
+        monkeypatch.setenv('DOCKER_HOST', 'tcp://127.0.0.1:2375')
+        assert get_client() is None
+        monkeypatch.setenv('DOCKER_HOST', 'unix://' + docker_socket)
+        monkeypatch.setenv('MLT_USE_DOCKER_CLI', '1')
+        assert get_client() is None
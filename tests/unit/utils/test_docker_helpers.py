@@ -0,0 +1,179 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import os
+from mock import patch
+from subprocess import check_call
+
+from mlt.utils.docker_helpers import (build_context_files, BuildProgress,
+                                      context_digest, dockerfile_sources,
+                                      image_exists, insecure_registries,
+                                      is_copied, PushProgress)
+
+
+def _write(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def test_context_digest_changes_with_content(tmpdir):
+    project = str(tmpdir)
+    _write(os.path.join(project, 'main.py'), 'print("hello")')
+    first = context_digest(project)
+    assert first == context_digest(project)
+
+    _write(os.path.join(project, 'main.py'), 'print("goodbye")')
+    assert context_digest(project) != first
+
+
+def test_context_digest_ignores_mlt_files(tmpdir):
+    project = str(tmpdir)
+    _write(os.path.join(project, 'main.py'), 'print("hello")')
+    first = context_digest(project)
+
+    _write(os.path.join(project, '.build.json'), '{}')
+    _write(os.path.join(project, '.git', 'HEAD'), 'ref: refs/heads/master')
+    assert context_digest(project) == first
+
+
+def test_build_context_dockerignore(tmpdir):
+    project = str(tmpdir)
+    _write(os.path.join(project, '.dockerignore'),
+           'data\n*.pyc\n!keep.pyc\n')
+    _write(os.path.join(project, 'main.py'), '')
+    _write(os.path.join(project, 'main.pyc'), '')
+    _write(os.path.join(project, 'keep.pyc'), '')
+    _write(os.path.join(project, 'lib', 'util.pyc'), '')
+    _write(os.path.join(project, 'data', 'train.csv'), '')
+
+    # `*.pyc` only matches at the root of the context, like docker
+    assert build_context_files(project) == [
+        '.dockerignore', 'keep.pyc', 'lib/util.pyc', 'main.py']
+
+
+def test_build_context_gitignore(tmpdir):
+    project = str(tmpdir)
+    check_call(['git', 'init', '-q', project])
+    _write(os.path.join(project, '.gitignore'), 'checkpoints/\nDockerfile\n')
+    _write(os.path.join(project, 'Dockerfile'), 'FROM python:3')
+    _write(os.path.join(project, 'main.py'), '')
+    _write(os.path.join(project, 'checkpoints', 'model.ckpt'), '')
+
+    # Dockerfile is always part of the context, even when ignored
+    assert build_context_files(project) == [
+        '.gitignore', 'Dockerfile', 'main.py']
+
+
+@patch('mlt.utils.docker_helpers.call')
+def test_image_exists(call):
+    call.return_value = 0
+    assert image_exists('app:1234')
+    assert call.call_args[0][0] == ['docker', 'image', 'inspect', 'app:1234']
+
+    call.return_value = 1
+    assert not image_exists('app:1234')
+
+
+def test_build_progress():
+    progress = BuildProgress()
+    assert progress() is None
+    progress.update('Sending build context to Docker daemon  10.24kB\n')
+    assert progress() is None
+    progress.update('Step 3/7 : RUN pip install -r requirements.txt\n')
+    assert progress() == (2, 7)
+    progress.update('#9 [stage-1 5/7] COPY . /src/app\n')
+    assert progress() == (4, 7)
+
+
+def test_push_progress():
+    progress = PushProgress()
+    assert progress() is None
+    for line in ('The push refers to repository [localhost:5000/app]',
+                 '5f70bf18a086: Preparing', 'a1b2c3d4e5f6: Preparing',
+                 '0123456789ab: Waiting', '5f70bf18a086: Pushed',
+                 'a1b2c3d4e5f6: Layer already exists',
+                 '1234: digest: sha256:{} size: 735'.format('ab' * 32)):
+        progress.update(line + '\n')
+    assert progress() == (2, 3)
+    assert progress.digest == 'sha256:' + 'ab' * 32
+
+
+def test_push_progress_messages():
+    """byte counts from the engine api win over counting layers"""
+    times = iter([0, 4])
+    progress = PushProgress(clock=lambda: next(times))
+    for message in (
+            {'status': 'Preparing', 'id': '5f70bf18a086'},
+            {'status': 'Preparing', 'id': 'a1b2c3d4e5f6'},
+            {'status': 'Pushing', 'id': '5f70bf18a086',
+             'progressDetail': {'current': 512, 'total': 2048}},
+            {'status': 'Layer already exists', 'id': 'a1b2c3d4e5f6'}):
+        progress.update_message(message)
+    assert progress() == (512, 2048)
+    assert progress.throughput() == 128
+
+
+def test_dockerfile_sources(tmpdir):
+    project = str(tmpdir)
+    _write(os.path.join(project, 'Dockerfile'), '\n'.join([
+        'FROM python:3.6 AS base',
+        'ADD requirements.txt /src/deps/requirements.txt',
+        'copy --chown=app src/*.py \\',
+        '     lib /src/app/',
+        'COPY ["conf dir/app.yaml", "/etc/app.yaml"]',
+        'COPY --from=base /src /src',
+        'ADD https://example.com/data.tar.gz /data/',
+        'RUN cp k8s-templates/job.yaml /tmp']))
+    sources = dockerfile_sources(project)
+    for copied in ('requirements.txt', 'src/main.py', 'lib/a/b.py',
+                   'conf dir/app.yaml'):
+        assert is_copied(copied, sources)
+    for not_copied in ('src/a/main.py', 'k8s-templates/job.yaml',
+                       'README.md'):
+        assert not is_copied(not_copied, sources)
+
+
+def test_dockerfile_sources_everything(tmpdir):
+    """`ADD .` copies all of the context, and sources that use build args
+       or a missing Dockerfile mean we can't tell what's copied
+    """
+    project = str(tmpdir)
+    assert dockerfile_sources(project) is None
+    assert is_copied('anything', None)
+
+    _write(os.path.join(project, 'Dockerfile'), 'ADD . /src/app\n')
+    assert is_copied('k8s-templates/job.yaml', dockerfile_sources(project))
+
+    _write(os.path.join(project, 'Dockerfile'), 'COPY $SRC /src/app\n')
+    assert dockerfile_sources(project) is None
+
+
+@patch('mlt.utils.docker_helpers.check_output')
+def test_insecure_registries(check_output):
+    check_output.return_value = (
+        b'{"InsecureRegistryCIDRs": ["127.0.0.0/8"], "IndexConfigs": {'
+        b'"docker.io": {"Secure": true}, "registry.local:5000": '
+        b'{"Secure": false}}}\n')
+    assert insecure_registries() == ({'registry.local:5000'},
+                                     ['127.0.0.0/8'])
+    check_output.side_effect = OSError
+    assert insecure_registries() == (set(), [])
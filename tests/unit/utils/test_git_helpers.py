@@ -0,0 +1,66 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import os
+from subprocess import check_call
+
+from mlt.utils.git_helpers import clone_repo, mirror_repo
+from test_utils.files import commit_file
+
+
+def _template_repo(tmpdir):
+    repo = str(tmpdir.join('repo'))
+    check_call(['git', 'init', '-q', repo])
+    commit_file(repo, 'mlt-templates/hello-world/main.py', 'hello')
+    commit_file(repo, 'mlt-templates/pytorch/main.py', 'torch')
+    return repo
+
+
+def test_clone_repo_paths(tmpdir):
+    """only the requested paths are checked out"""
+    repo = _template_repo(tmpdir)
+    with clone_repo(repo, ['mlt-templates/hello-world']) as clone:
+        assert os.listdir(os.path.join(clone, 'mlt-templates')) == [
+            'hello-world']
+        with open(os.path.join(
+                clone, 'mlt-templates', 'hello-world', 'main.py')) as f:
+            assert f.read() == 'hello'
+    assert not os.path.exists(clone)
+
+
+def test_clone_repo_missing_path(tmpdir):
+    repo = _template_repo(tmpdir)
+    with clone_repo(repo, ['mlt-templates/missing']) as clone:
+        assert os.listdir(clone) == []
+
+
+def test_mirror_repo_ttl(tmpdir, monkeypatch):
+    """remote mirrors are only fetched once they're older than the ttl"""
+    repo = 'file://' + _template_repo(tmpdir)
+    mirror = mirror_repo(repo)
+    assert mirror_repo(repo) == mirror
+
+    commit_file(repo[len('file://'):], 'mlt-templates/new/main.py', 'new')
+    with clone_repo(repo, ['mlt-templates/new']) as clone:
+        assert os.listdir(clone) == []
+
+    monkeypatch.setenv('MLT_TEMPLATE_CACHE_TTL', '0')
+    with clone_repo(repo, ['mlt-templates/new']) as clone:
+        assert os.listdir(os.path.join(clone, 'mlt-templates')) == ['new']
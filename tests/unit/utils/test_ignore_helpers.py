@@ -0,0 +1,120 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import os
+import pytest
+from subprocess import PIPE, Popen, check_call
+
+from mlt.utils.ignore_helpers import IgnoreMatcher
+
+IGNORE_FILES = {
+    '.gitignore': '\n'.join([
+        '# comment', '*.pyc', '/top.txt', 'build/', 'logs/**',
+        '!logs/keep.log', 'docs/**/*.tmp', 'data/*', '!data/keep',
+        'a?c.txt', '[0-9]*.out', '\\#hash', 'trailing.txt   ', '']),
+    'src/.gitignore': 'local.txt\n!keep.pyc\n/only-here\n',
+    '.git/info/exclude': 'excluded.txt\n',
+}
+
+PATHS = [
+    'main.py', 'main.pyc', 'src/main.pyc', 'src/keep.pyc', 'keep.pyc',
+    'top.txt', 'src/top.txt', 'build/out.o', 'src/build/out.o',
+    'logs/a.log', 'logs/keep.log', 'docs/x.tmp', 'docs/a/b/x.tmp',
+    'data/one', 'data/keep', 'abc.txt', 'abbc.txt', '1.out', 'a1.out',
+    '#hash', 'trailing.txt', 'local.txt', 'src/local.txt',
+    'src/only-here', 'src/deeper/only-here', 'excluded.txt',
+    'src/excluded.txt', 'Dockerfile',
+]
+
+
+@pytest.fixture
+def repo(tmpdir):
+    repo = str(tmpdir.join('repo'))
+    check_call(['git', 'init', '-q', repo])
+    for path, content in IGNORE_FILES.items():
+        _write(repo, path, content)
+    for path in PATHS:
+        _write(repo, path, '')
+    return repo
+
+
+def _write(repo, path, content):
+    full_path = os.path.join(repo, path)
+    if not os.path.isdir(os.path.dirname(full_path)):
+        os.makedirs(os.path.dirname(full_path))
+    with open(full_path, 'w') as f:
+        f.write(content)
+
+
+def _git_ignored(repo, paths):
+    git = Popen(['git', 'check-ignore', '--no-index', '--stdin'],
+                cwd=repo, stdin=PIPE, stdout=PIPE)
+    out, _ = git.communicate('\n'.join(paths).encode('utf-8'))
+    return set(out.decode('utf-8').splitlines())
+
+
+def test_matches_git(repo):
+    """agrees with `git check-ignore` on every path"""
+    paths = PATHS + ['build', 'logs', 'data', 'src/build']
+    matcher = IgnoreMatcher(repo)
+    assert set(p for p in paths if matcher.is_ignored(
+        os.path.join(repo, p))) == _git_ignored(repo, paths)
+
+
+def test_git_dir_and_outside_paths(repo, tmpdir):
+    matcher = IgnoreMatcher(repo)
+    assert matcher.is_ignored(os.path.join(repo, '.git', 'index'))
+    assert not matcher.is_ignored(repo)
+    assert not matcher.is_ignored(str(tmpdir.join('elsewhere.pyc')))
+
+
+def test_dockerignore(repo):
+    _write(repo, '.dockerignore', 'models\n*.md\n')
+    matcher = IgnoreMatcher(repo)
+    assert matcher.is_ignored(os.path.join(repo, 'models', 'a.h5'))
+    assert matcher.is_ignored(os.path.join(repo, 'README.md'))
+    assert not matcher.is_ignored(os.path.join(repo, 'docs', 'README.md'))
+
+
+def test_reload(repo):
+    """results are cached until the rules are read again"""
+    matcher = IgnoreMatcher(repo)
+    path = os.path.join(repo, 'main.py')
+    assert not matcher.is_ignored(path)
+
+    _write(repo, '.gitignore', 'main.py\n')
+    assert not matcher.is_ignored(path)
+    assert matcher.is_ignore_file(os.path.join(repo, '.gitignore'))
+    matcher.reload()
+    assert matcher.is_ignored(path)
+
+
+def test_watched_paths(repo):
+    """watched paths and the directories leading to them are never
+       ignored, even if git or docker ignore them
+    """
+    _write(repo, '.dockerignore', 'deploy\n')
+    _write(repo, '.gitignore', 'mlt.json\n')
+    matcher = IgnoreMatcher(repo, watched=('deploy/templates', 'mlt.json'))
+    assert not matcher.is_ignored(os.path.join(repo, 'mlt.json'))
+    assert not matcher.is_ignored(os.path.join(repo, 'deploy'), True)
+    assert not matcher.is_ignored(
+        os.path.join(repo, 'deploy', 'templates', 'job.yaml'))
+    assert matcher.is_ignored(os.path.join(repo, 'deploy', 'other.yaml'))
@@ -0,0 +1,219 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import pytest
+import yaml
+from mock import patch
+
+from mlt.utils import kubernetes_api
+from mlt.utils.kubernetes_api import (get_client, KubeconfigNotSupported,
+                                      KubernetesClient, KubernetesError)
+from test_utils.fake_server import FakeServer
+
+BATCH_DISCOVERY = {'resources': [
+    {'name': 'jobs', 'kind': 'Job', 'namespaced': True},
+    {'name': 'jobs/status', 'kind': 'Job', 'namespaced': True}]}
+
+
+def _kubeconfig(tmpdir, user):
+    kubeconfig = tmpdir.join('config')
+    kubeconfig.write(yaml.safe_dump({
+        'apiVersion': 'v1', 'kind': 'Config',
+        'current-context': 'hyperkube',
+        'clusters': [{'name': 'hyperkube',
+                      'cluster': {'server': 'http://kubernetes:8080'}}],
+        'contexts': [{'name': 'hyperkube',
+                      'context': {'cluster': 'hyperkube',
+                                  'user': 'hyperkube'}}],
+        'users': [{'name': 'hyperkube', 'user': user}]}))
+    return str(kubeconfig)
+
+
+def test_from_kubeconfig(tmpdir):
+    client = KubernetesClient.from_kubeconfig(
+        _kubeconfig(tmpdir, {'token': 'secret'}))
+    assert client.host == 'kubernetes'
+    assert client.port == 8080
+    assert client.context == 'hyperkube'
+    assert client.headers['Authorization'] == 'Bearer secret'
+
+
+def test_from_kubeconfig_auth_provider(tmpdir):
+    """auth plugins refresh their tokens through kubectl, so we don't try"""
+    with pytest.raises(KubeconfigNotSupported):
+        KubernetesClient.from_kubeconfig(
+            _kubeconfig(tmpdir, {'auth-provider': {'name': 'gcp'}}))
+
+
+def test_get_client_kubectl_override(monkeypatch):
+    monkeypatch.setenv('MLT_USE_KUBECTL', '1')
+    assert get_client() is None
+
+
+@patch('mlt.utils.kubernetes_api._client', None)
+def test_get_client_no_kubeconfig(tmpdir, monkeypatch):
+    monkeypatch.delenv('MLT_USE_KUBECTL', raising=False)
+    monkeypatch.setenv('KUBECONFIG', str(tmpdir.join('missing')))
+    assert get_client() is None
+    assert kubernetes_api._client is False
+
+
+def test_requests_share_a_connection():
+    with FakeServer({
+        ('GET', '/api/v1/namespaces/foo'): (200, {'kind': 'Namespace'}),
+        ('POST', '/api/v1/namespaces'): (201, {'kind': 'Namespace'}),
+    }) as server:
+        client = KubernetesClient(server.url)
+        assert client.namespace_exists('foo')
+        assert not client.namespace_exists('bar')
+        client.create_namespace('bar')
+
+    assert server.connections == 1
+    assert server.requests[-1]['body']['metadata'] == {'name': 'bar'}
+
+
+def test_apply_creates_then_patches():
+    job = {'apiVersion': 'batch/v1', 'kind': 'Job',
+           'metadata': {'name': 'app-1234'}}
+    with FakeServer({
+        ('GET', '/apis/batch/v1'): (200, BATCH_DISCOVERY),
+        ('POST', '/apis/batch/v1/namespaces/ns/jobs'): (409, {}),
+        ('PATCH', '/apis/batch/v1/namespaces/ns/jobs/app-1234'): (200, job),
+    }) as server:
+        client = KubernetesClient(server.url)
+        assert client.apply(job, 'ns') == job
+        client.apply(job, 'ns')
+
+    # discovery is only done once per api version
+    assert [r['method'] for r in server.requests] == [
+        'GET', 'POST', 'PATCH', 'POST', 'PATCH']
+    assert server.requests[2]['headers']['Content-Type'] == \
+        'application/merge-patch+json'
+
+
+def test_delete_object():
+    job = {'apiVersion': 'batch/v1', 'kind': 'Job',
+           'metadata': {'name': 'app-1234'}}
+    with FakeServer({
+        ('GET', '/apis/batch/v1'): (200, BATCH_DISCOVERY),
+    }) as server:
+        client = KubernetesClient(server.url)
+        # already deleted objects are fine
+        client.delete_object(job, 'ns')
+
+    assert server.requests[-1]['method'] == 'DELETE'
+    assert server.requests[-1]['body']['propagationPolicy'] == 'Background'
+
+
+def test_delete_collection():
+    """one call deletes the jobs of many runs, and unknown kinds are
+       skipped
+    """
+    with FakeServer({
+        ('GET', '/apis/batch/v1'): (200, BATCH_DISCOVERY),
+        ('DELETE', '/apis/batch/v1/namespaces/ns/jobs'): (200, {}),
+    }) as server:
+        client = KubernetesClient(server.url)
+        client.delete_collection('batch/v1', 'Job', 'ns', 'mlt-app-name=app')
+        client.delete_collection('kubeflow.org/v1alpha2', 'TFJob', 'ns',
+                                 'mlt-app-name=app')
+
+    delete = server.requests[1]
+    assert delete['url'] == \
+        '/apis/batch/v1/namespaces/ns/jobs?labelSelector=mlt-app-name%3Dapp'
+    assert delete['body']['propagationPolicy'] == 'Background'
+    assert len(server.requests) == 3
+
+
+def test_delete_collection_one_at_a_time():
+    """services can't be deleted as a collection"""
+    discovery = {'resources': [{'name': 'services', 'kind': 'Service',
+                                'namespaced': True}]}
+    with FakeServer({
+        ('GET', '/api/v1'): (200, discovery),
+        ('DELETE', '/api/v1/namespaces/ns/services'): (405, {}),
+        ('GET', '/api/v1/namespaces/ns/services'): (200, {'items': [
+            {'metadata': {'name': 'app-1234'}}]}),
+        ('DELETE', '/api/v1/namespaces/ns/services/app-1234'): (200, {}),
+    }) as server:
+        client = KubernetesClient(server.url)
+        client.delete_collection('v1', 'Service', 'ns', 'mlt-app-name=app')
+
+    assert server.requests[-1]['path'] == \
+        '/api/v1/namespaces/ns/services/app-1234'
+
+
+def test_request_error():
+    with FakeServer({
+        ('GET', '/api/v1/namespaces/ns/pods'): (403, {'reason': 'Forbidden'})
+    }) as server:
+        client = KubernetesClient(server.url)
+        with pytest.raises(KubernetesError) as error:
+            client.list_pods('ns')
+    assert error.value.status == 403
+
+
+def test_list_pods_label_selector():
+    pod = {'metadata': {'name': 'app-1234-abcde'}}
+    with FakeServer({
+        ('GET', '/api/v1/namespaces/ns/pods?labelSelector=run%3D1234'):
+            (200, {'items': [pod]}),
+    }) as server:
+        client = KubernetesClient(server.url)
+        assert client.list_pods('ns', 'run=1234') == [pod]
+
+
+def test_list_crd_names_metadata_only():
+    crds = {'kind': 'PartialObjectMetadataList',
+            'items': [{'metadata': {'name': 'tfjobs.kubeflow.org'}}]}
+    with FakeServer({
+        ('GET', '/apis/apiextensions.k8s.io/v1beta1/'
+                'customresourcedefinitions'): (200, crds),
+    }) as server:
+        client = KubernetesClient(server.url)
+        assert client.list_crd_names() == {'tfjobs.kubeflow.org'}
+    assert 'as=PartialObjectMetadataList' in \
+        server.requests[0]['headers']['Accept']
+
+
+def test_stream():
+    events = [{'type': 'ADDED', 'object': {'kind': 'Pod'}},
+              {'type': 'MODIFIED', 'object': {'kind': 'Pod'}}]
+    with FakeServer({
+        ('GET', '/api/v1/namespaces/ns/pods'): (200, events),
+    }) as server:
+        client = KubernetesClient(server.url)
+        assert list(client.stream('/api/v1/namespaces/ns/pods',
+                                  {'watch': 'true'})) == events
+    assert server.requests[0]['url'] == \
+        '/api/v1/namespaces/ns/pods?watch=true'
+
+
+def test_stream_lines():
+    log = (b'2018-04-10T12:00:00.1Z step 1\n'
+           b'2018-04-10T12:00:01.2Z step 2\n')
+    with FakeServer({
+        ('GET', '/api/v1/namespaces/ns/pods/app-1234/log'): (200, log),
+    }) as server:
+        client = KubernetesClient(server.url)
+        assert list(client.stream_lines(
+            '/api/v1/namespaces/ns/pods/app-1234/log')) == [
+            '2018-04-10T12:00:00.1Z step 1\n',
+            '2018-04-10T12:00:01.2Z step 2\n']
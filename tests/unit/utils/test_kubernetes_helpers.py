@@ -18,16 +18,50 @@
 # SPDX-License-Identifier: EPL-2.0
 #
 
+import itertools
+import json
+import pytest
+import socket
 import uuid
-from mock import patch
+import yaml
+from mock import MagicMock, patch
 
-from mlt.utils.kubernetes_helpers import ensure_namespace_exists
+from mlt.utils.kubernetes_api import HTTPException, KubernetesError
+from mlt.utils.kubernetes_helpers import (add_labels, apply_files,
+                                          apply_objects,
+                                          checking_crds_on_k8,
+                                          delete_collection,
+                                          delete_files,
+                                          ensure_namespace_exists,
+                                          list_active_pods, list_nodes,
+                                          list_objects, load_objects,
+                                          RateLimiter, wait_for_pod_changes,
+                                          wait_for_pod_running,
+                                          watch_objects, watch_pods)
+from test_utils.io import catch_stdout
+
+JOB = """apiVersion: batch/v1
+kind: Job
+metadata:
+  name: app-1234
+"""
+
+
+@pytest.fixture
+def no_client(patch):
+    return patch('kubernetes_api.get_client', MagicMock(return_value=None))
+
+
+@pytest.fixture
+def client(patch):
+    return patch('kubernetes_api.get_client').return_value
 
 
 @patch('mlt.utils.kubernetes_helpers.call')
 @patch('mlt.utils.kubernetes_helpers.open')
 @patch('mlt.utils.kubernetes_helpers.process_helpers')
-def test_ensure_namespace_no_exist(proc_helpers, open_mock, call):
+def test_ensure_namespace_no_exist(proc_helpers, open_mock, call,
+                                   no_client):
     call.return_value = 0
 
     ensure_namespace_exists(str(uuid.uuid4()))
@@ -37,8 +71,383 @@ def test_ensure_namespace_no_exist(proc_helpers, open_mock, call):
 @patch('mlt.utils.kubernetes_helpers.call')
 @patch('mlt.utils.kubernetes_helpers.open')
 @patch('mlt.utils.kubernetes_helpers.process_helpers')
-def test_ensure_namespace_already_exists(proc_helpers, open_mock, call):
+def test_ensure_namespace_already_exists(proc_helpers, open_mock, call,
+                                         no_client):
     call.return_value = 1
 
     ensure_namespace_exists(str(uuid.uuid4()))
     proc_helpers.run.assert_called_once()
+
+
+def test_ensure_namespace_api(client):
+    client.namespace_exists.return_value = False
+    ensure_namespace_exists('foo')
+    client.create_namespace.assert_called_once_with('foo')
+
+
+def test_load_objects(tmpdir):
+    manifest = tmpdir.join('job.yaml')
+    manifest.write(JOB + '---\n' + JOB.replace('1234', '5678') + '---\n')
+    names = [o['metadata']['name'] for o in load_objects([str(manifest)])]
+    assert names == ['app-1234', 'app-5678']
+
+
+def test_apply_files_api(tmpdir, client):
+    manifest = tmpdir.join('job.yaml')
+    manifest.write(JOB)
+    apply_files('ns', [str(manifest)])
+    assert client.apply.call_args[0][0]['metadata']['name'] == 'app-1234'
+    assert client.apply.call_args[0][1] == 'ns'
+
+
+def test_apply_files_api_error(tmpdir, client):
+    """api errors end the command, just like kubectl errors do"""
+    manifest = tmpdir.join('job.yaml')
+    manifest.write(JOB)
+    client.apply.side_effect = KubernetesError(422, 'Unprocessable Entity')
+    with catch_stdout() as caught_output:
+        with pytest.raises(SystemExit):
+            apply_files('ns', [str(manifest)])
+        assert '422 Unprocessable Entity' in caught_output.getvalue()
+
+
+@patch('mlt.utils.kubernetes_helpers.process_helpers')
+def test_apply_files_kubectl(proc_helpers, no_client):
+    apply_files('ns', ['k8s/a.yaml', 'k8s/b.yaml'])
+    proc_helpers.run.assert_called_once_with(
+        ['kubectl', '--namespace', 'ns', 'apply',
+         '-f', 'k8s/a.yaml', '-f', 'k8s/b.yaml'])
+
+
+def _jobs(count):
+    return [{'apiVersion': 'batch/v1', 'kind': 'Job',
+             'metadata': {'name': 'app-{}'.format(i)}} for i in range(count)]
+
+
+def test_apply_objects_api(client):
+    """every object is applied, side by side, and failures are returned
+       instead of ending the command
+    """
+    def apply(obj, namespace):
+        if obj['metadata']['name'] == 'app-3':
+            raise KubernetesError(422, 'Unprocessable Entity')
+    client.apply.side_effect = apply
+
+    objects = _jobs(20)
+    failures = apply_objects('ns', objects, concurrency=4)
+    assert client.apply.call_count == 20
+    assert [(obj['metadata']['name'], error[:3])
+            for obj, error in failures] == [('app-3', '422')]
+
+
+def test_apply_objects_unexpected_errors(client):
+    """a dropped connection or a garbled response fails only that object,
+       the worker goes on with the rest of the queue
+    """
+    def apply(obj, namespace):
+        name = obj['metadata']['name']
+        if name == 'app-2':
+            raise HTTPException('bad status line')
+        if name == 'app-5':
+            raise ValueError('No JSON object could be decoded')
+    client.apply.side_effect = apply
+
+    failures = apply_objects('ns', _jobs(10), concurrency=1)
+    assert client.apply.call_count == 10
+    assert sorted((obj['metadata']['name'], error)
+                  for obj, error in failures) == [
+        ('app-2', 'bad status line'),
+        ('app-5', 'ValueError: No JSON object could be decoded')]
+
+
+@patch('mlt.utils.kubernetes_helpers.process_helpers')
+def test_apply_objects_kubectl_batches(proc_helpers, no_client):
+    process = proc_helpers.run_popen.return_value
+    process.communicate.return_value = (b'', b'')
+    process.returncode = 0
+
+    assert apply_objects('ns', _jobs(250), concurrency=2) == []
+    assert proc_helpers.run_popen.call_count == 3
+    assert proc_helpers.run_popen.call_args[0][0] == \
+        ['kubectl', '--namespace', 'ns', 'apply', '-f', '-']
+    batch_sizes = sorted(
+        len(json.loads(call[0][0].decode('utf-8'))['items'])
+        for call in process.communicate.call_args_list)
+    assert batch_sizes == [50, 100, 100]
+
+
+def test_rate_limiter():
+    """bursts of a second's worth go through, then callers are spaced
+       out to the rate
+    """
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(10, clock=lambda: now[0], sleep=sleep)
+    for _ in range(10):
+        limiter.acquire()
+    assert waits == []
+    limiter.acquire(5)
+    assert waits == [0.5]
+    now[0] += 1.0
+    limiter.acquire()
+    assert len(waits) == 1
+
+
+def test_delete_files_api(tmpdir, client):
+    """only manifests are deleted, like `kubectl delete -f <dir>` does"""
+    tmpdir.join('job.yaml').write(JOB)
+    tmpdir.join('README.md').write('# k8s')
+    delete_files('ns', str(tmpdir))
+    client.delete_object.assert_called_once()
+
+
+@pytest.fixture
+def crd_cache(tmpdir, monkeypatch):
+    """a kube context of our own, so crd lists are cached under tmpdir"""
+    kubeconfig = tmpdir.join('kubeconfig')
+    kubeconfig.write(yaml.safe_dump({
+        'current-context': 'hyperkube',
+        'clusters': [{'name': 'hyperkube',
+                      'cluster': {'server': 'http://kubernetes:8080'}}],
+        'contexts': [{'name': 'hyperkube',
+                      'context': {'cluster': 'hyperkube'}}]}))
+    monkeypatch.setenv('KUBECONFIG', str(kubeconfig))
+    monkeypatch.setenv('MLT_CACHE_DIR', str(tmpdir.join('cache')))
+    monkeypatch.delenv('MLT_CRD_CACHE_TTL', raising=False)
+    return tmpdir.join('cache', 'crds')
+
+
+def test_checking_crds_api(client, crd_cache):
+    client.list_crd_names.return_value = {'tfjobs.kubeflow.org'}
+    assert checking_crds_on_k8(
+        {'tfjobs.kubeflow.org', 'pytorchjobs.kubeflow.org'}) == \
+        {'pytorchjobs.kubeflow.org'}
+
+
+def test_checking_crds_cached(client, crd_cache):
+    client.list_crd_names.return_value = {'tfjobs.kubeflow.org'}
+    assert checking_crds_on_k8({'tfjobs.kubeflow.org'}) == set()
+    assert checking_crds_on_k8({'tfjobs.kubeflow.org'}) == set()
+    assert client.list_crd_names.call_count == 1
+    assert len(crd_cache.listdir()) == 1
+
+    # a crd that isn't in the cache may have been installed since
+    client.list_crd_names.return_value = {'tfjobs.kubeflow.org',
+                                          'pytorchjobs.kubeflow.org'}
+    assert checking_crds_on_k8({'pytorchjobs.kubeflow.org'}) == set()
+    assert client.list_crd_names.call_count == 2
+
+
+def test_checking_crds_cache_expired(client, crd_cache, monkeypatch):
+    monkeypatch.setenv('MLT_CRD_CACHE_TTL', '0')
+    client.list_crd_names.return_value = {'tfjobs.kubeflow.org'}
+    checking_crds_on_k8({'tfjobs.kubeflow.org'})
+    checking_crds_on_k8({'tfjobs.kubeflow.org'})
+    assert client.list_crd_names.call_count == 2
+
+
+@patch('mlt.utils.kubernetes_helpers.check_output')
+def test_checking_crds_kubectl(check_output, no_client, crd_cache):
+    check_output.return_value = (
+        b'customresourcedefinition.apiextensions.k8s.io/tfjobs.kubeflow.org\n')
+    assert checking_crds_on_k8(
+        {'tfjobs.kubeflow.org', 'pytorchjobs.kubeflow.org'}) == \
+        {'pytorchjobs.kubeflow.org'}
+    assert check_output.call_args[0][0] == \
+        ['kubectl', 'get', 'crd', '-o', 'name']
+
+
+def _pod(phase, waiting_reason=None):
+    pod = {'metadata': {'name': 'app-1234-abcde'},
+           'status': {'phase': phase}}
+    if waiting_reason:
+        pod['status']['containerStatuses'] = [
+            {'state': {'waiting': {'reason': waiting_reason}}}]
+    return pod
+
+
+def test_wait_for_pod_running_watch(client):
+    """the pod isn't running when listed, so we follow it with a watch"""
+    client.get.return_value = {'metadata': {'resourceVersion': '42'},
+                               'items': [_pod('Pending')]}
+    client.stream.return_value = iter([
+        {'type': 'MODIFIED', 'object': _pod('Pending')},
+        {'type': 'MODIFIED', 'object': _pod('Running')}])
+
+    assert wait_for_pod_running(
+        'ns', 60, label_selector='run=1234') == 'app-1234-abcde'
+    query = client.stream.call_args[0][1]
+    assert query['watch'] == 'true'
+    assert query['resourceVersion'] == '42'
+    assert query['labelSelector'] == 'run=1234'
+
+
+def test_wait_for_pod_running_image_pull_failure(client):
+    """we don't wait out the timeout for a pod that can't pull its image"""
+    client.get.return_value = {'metadata': {'resourceVersion': '42'},
+                               'items': []}
+    client.stream.return_value = iter([
+        {'type': 'ADDED', 'object': _pod('Pending')},
+        {'type': 'MODIFIED', 'object': _pod('Pending', 'ImagePullBackOff')}])
+
+    with pytest.raises(ValueError) as error:
+        wait_for_pod_running('ns', 60, podname='app-1234-abcde')
+    assert 'ImagePullBackOff' in str(error.value)
+
+
+@patch('mlt.utils.kubernetes_helpers.time')
+def test_wait_for_pod_running_dropped_connection(time_mock, client):
+    """a failed listing or a watch that's cut off is retried until the
+       deadline
+    """
+    time_mock.time.return_value = 0
+    listing = {'metadata': {'resourceVersion': '42'},
+               'items': [_pod('Pending')]}
+    client.get.side_effect = [
+        socket.error(111, 'Connection refused'), listing, listing]
+
+    def stream(path, query, timeout):
+        if client.stream.call_count == 1:
+            raise HTTPException('IncompleteRead')
+        return iter([{'type': 'MODIFIED', 'object': _pod('Running')}])
+    client.stream.side_effect = stream
+
+    assert wait_for_pod_running(
+        'ns', 60, podname='app-1234-abcde') == 'app-1234-abcde'
+    assert client.get.call_count == 3
+    time_mock.sleep.assert_called_once_with(1)
+
+
+@patch('mlt.utils.kubernetes_helpers.time')
+def test_wait_for_pod_running_timeout(time_mock, no_client, patch):
+    """without the api we poll once a second until the timeout"""
+    time_mock.time.side_effect = [0, 0, 0, 1, 1, 2]
+    get_pod = patch('get_pod', MagicMock(return_value=_pod('Pending')))
+
+    with pytest.raises(ValueError):
+        wait_for_pod_running('ns', 2, podname='app-1234-abcde')
+    assert get_pod.call_count == 2
+    time_mock.sleep.assert_called_with(1)
+
+
+def test_wait_for_pod_changes_watch(client):
+    """returns on the first event that changes a pod's phase"""
+    client.get.return_value = {'metadata': {'resourceVersion': '42'},
+                               'items': [_pod('Running')]}
+    client.stream.return_value = iter([
+        {'type': 'MODIFIED', 'object': _pod('Running')},
+        {'type': 'MODIFIED', 'object': _pod('Succeeded')},
+        {'type': 'MODIFIED', 'object': _pod('Succeeded')}])
+
+    wait_for_pod_changes('ns', 'app=app', {'app-1234-abcde': 'Running'}, 30)
+    assert client.stream.call_args[0][1]['resourceVersion'] == '42'
+    assert next(client.stream.return_value)['type'] == 'MODIFIED'
+
+
+def test_wait_for_pod_changes_already_changed(client):
+    """no watch if the pods changed before we got to it"""
+    client.get.return_value = {'metadata': {'resourceVersion': '42'},
+                               'items': []}
+    wait_for_pod_changes('ns', 'app=app', {'app-1234-abcde': 'Running'}, 30)
+    client.stream.assert_not_called()
+
+
+def test_list_nodes_forbidden(client):
+    """users that may not list nodes get None rather than an error"""
+    client.get.side_effect = KubernetesError(403, 'Forbidden')
+    assert list_nodes() is None
+
+
+def test_list_active_pods_namespace_only(client):
+    """without access to every namespace, we look at our own"""
+    client.get.side_effect = [KubernetesError(403, 'Forbidden'),
+                              {'items': [_pod('Running')]}]
+    assert list_active_pods('ns') == [_pod('Running')]
+    assert client.get.call_args[0][0] == '/api/v1/namespaces/ns/pods'
+
+
+def test_watch_pods_resumes(client):
+    """an expired watch is resumed from the last version it saw; when
+       that version is gone the pods are listed again
+    """
+    client.get.return_value = {'metadata': {'resourceVersion': '1'},
+                               'items': [_pod('Pending')]}
+    running = _pod('Running')
+    running['metadata']['resourceVersion'] = '2'
+    client.stream.side_effect = [
+        iter([{'type': 'MODIFIED', 'object': running}]),
+        iter([{'type': 'ERROR', 'object': {'metadata': {}, 'code': 410}}])]
+
+    events = list(itertools.islice(
+        watch_pods('ns', 'app=app'), 3))
+    assert [event['type'] for event in events] == ['SYNC', 'MODIFIED', 'SYNC']
+    versions = [c[0][1]['resourceVersion']
+                for c in client.stream.call_args_list]
+    assert versions == ['1', '2']
+
+
+def test_watch_objects_unknown_kind(client):
+    """a kind the cluster doesn't have is one empty sync, and no watch"""
+    client.resource_path.side_effect = KubernetesError(404, 'Not Found')
+    assert list(watch_objects('ns', 'kubeflow.org/v1alpha1', 'TFJob',
+                              'app=app')) == [{'type': 'SYNC', 'items': []}]
+    client.stream.assert_not_called()
+
+
+def test_list_objects_unknown_kind(client):
+    """clusters without the TFJob CRD just have no TFJobs"""
+    client.resource_path.side_effect = KubernetesError(404, 'Not Found')
+    assert list_objects('ns', 'kubeflow.org/v1alpha2', 'TFJob') == []
+
+
+@patch('mlt.utils.kubernetes_helpers.process_helpers')
+def test_list_objects_kubectl(proc_helpers, no_client):
+    proc_helpers.run_popen.return_value.stdout.read.return_value = \
+        b'{"items": [{"kind": "Job"}]}'
+    proc_helpers.run_popen.return_value.wait.return_value = 0
+    assert list_objects('ns', 'batch/v1', 'Job', 'app=app') == \
+        [{'kind': 'Job'}]
+    assert proc_helpers.run_popen.call_args[0][0] == [
+        'kubectl', 'get', 'job.v1.batch', '--namespace', 'ns', '-o', 'json',
+        '-l', 'app=app']
+
+
+@patch('mlt.utils.kubernetes_helpers.process_helpers')
+def test_delete_collection_kubectl(proc_helpers, no_client):
+    """kinds the cluster doesn't have are no error"""
+    process = proc_helpers.run_popen.return_value
+    process.stderr.read.return_value = \
+        b'error: the server doesn\'t have a resource type "tfjob"'
+    process.wait.return_value = 1
+    delete_collection('ns', 'kubeflow.org/v1alpha2', 'TFJob', 'app=app')
+    assert proc_helpers.run_popen.call_args[0][0][:3] == \
+        ['kubectl', 'delete', 'tfjob.v1alpha2.kubeflow.org']
+
+    process.stderr.read.return_value = b'error: Unauthorized'
+    with catch_stdout():
+        with pytest.raises(SystemExit):
+            delete_collection('ns', 'batch/v1', 'Job', 'app=app')
+
+
+def test_add_labels():
+    """the object and the pod templates inside it get labelled"""
+    tfjob = {'kind': 'TFJob', 'metadata': {'labels': {'mlt-app-name': 'x'}},
+             'spec': {'replicaSpecs': [
+                 {'tfReplicaType': 'PS', 'template': {'spec': {}}},
+                 {'tfReplicaType': 'WORKER', 'template': {
+                     'metadata': {'labels': {'role': 'worker'}},
+                     'spec': {}}}]}}
+    add_labels([tfjob], {'mlt-app-name': 'app', 'mlt-run-id': '1234'})
+
+    assert tfjob['metadata']['labels'] == {
+        'mlt-app-name': 'app', 'mlt-run-id': '1234'}
+    ps, worker = tfjob['spec']['replicaSpecs']
+    assert ps['template']['metadata']['labels'] == {
+        'mlt-app-name': 'app', 'mlt-run-id': '1234'}
+    assert worker['template']['metadata']['labels'] == {
+        'role': 'worker', 'mlt-app-name': 'app', 'mlt-run-id': '1234'}
@@ -0,0 +1,85 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import threading
+
+from mlt.utils.log_helpers import END, LogMerger, split_timestamp
+
+
+def test_split_timestamp():
+    """trailing zeros are left off, but lines still sort by time"""
+    early, message = split_timestamp('2018-04-10T12:00:00.9Z step 1\n')
+    late, _ = split_timestamp('2018-04-10T12:00:00.123456789Z step 2\n')
+    assert message == 'step 1'
+    assert early > late
+
+
+def _drain(merger):
+    lines = []
+    while True:
+        item = merger.get(timeout=5)
+        if item is END:
+            return lines
+        lines.append(item)
+
+
+def test_merge_in_time_order():
+    """lines come out in time order across logs, each log in order"""
+    merger = LogMerger()
+    merger.open('ps')
+    merger.open('worker')
+    merger.put('worker', '1', 'worker 1')
+    merger.put('worker', '3', 'worker 3')
+    # the ps log could still have an earlier line, so nothing goes out
+    assert merger.get(timeout=0) is None
+    merger.put('ps', '2', 'ps 2')
+    merger.close('ps')
+    merger.close('worker')
+    assert _drain(merger) == [('worker', 'worker 1'), ('ps', 'ps 2'),
+                              ('worker', 'worker 3')]
+
+
+def test_backpressure():
+    """a log that is far ahead waits until its lines are written"""
+    merger = LogMerger(buffer_size=2)
+    merger.open('worker')
+
+    def read():
+        for n in range(10):
+            merger.put('worker', str(n), n)
+        merger.close('worker')
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    lines = _drain(merger)
+    reader.join()
+    assert lines == [('worker', n) for n in range(10)]
+
+
+def test_lag():
+    """when following, a quiet log only holds the others back for a bit"""
+    now = [0.0]
+    merger = LogMerger(lag=1.0, clock=lambda: now[0])
+    merger.open('ps')
+    merger.open('worker')
+    merger.put('worker', '1', 'worker 1')
+    assert merger.get(timeout=0) is None
+    now[0] = 1.5
+    assert merger.get(timeout=0) == ('worker', 'worker 1')
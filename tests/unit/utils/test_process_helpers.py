@@ -19,10 +19,11 @@
 #
 
 import pytest
+import sys
 from mock import patch
 from subprocess import CalledProcessError
 
-from mlt.utils.process_helpers import run, run_popen
+from mlt.utils.process_helpers import run, run_popen, StreamingProcess
 from test_utils.io import catch_stdout
 
 
@@ -74,3 +75,62 @@ def test_run_popen_shell(popen):
     popen.return_value = 0
     result = run_popen('ls /tmp', shell=True)
     assert result == 0
+
+
+def test_streaming_process_drains_output(tmpdir):
+    """Output larger than a pipe buffer must not stall the process, while
+       only the tail is kept in memory and everything goes to the log
+    """
+    log_file = str(tmpdir.join('.build.log'))
+    process = StreamingProcess(
+        [sys.executable, '-c',
+         'for i in range(20000): print("line %d" % i)'],
+        log_file, tail_lines=3)
+    assert process.wait() == 0
+    assert process.output_tail() == 'line 19997\nline 19998\nline 19999\n'
+    with open(log_file) as f:
+        assert len(f.read().splitlines()) == 20000
+
+
+def test_streaming_process_verbose(tmpdir):
+    """verbose echoes the output live, stderr included"""
+    process = StreamingProcess(
+        [sys.executable, '-c', 'import sys; sys.stderr.write("oops\\n")'],
+        str(tmpdir.join('.build.log')), verbose=True)
+    with catch_stdout() as caught_output:
+        assert process.wait() == 0
+        output = caught_output.getvalue()
+    assert output == 'oops\n'
+
+
+def test_streaming_process_wait_timeout(tmpdir):
+    """wait with a timeout returns None while the process is running"""
+    lines = []
+    process = StreamingProcess(
+        [sys.executable, '-c',
+         'import time; print("ready"); time.sleep(0.5)'],
+        str(tmpdir.join('.push.log')), on_line=lines.append)
+    assert process.wait(0.01) is None
+    assert process.wait() == 0
+    assert lines == ['ready\n']
+
+
+def test_streaming_process_terminate_group(tmpdir):
+    """terminate stops the children of a shell command too; the reader
+       only finishes once every process holding the output pipe is gone
+    """
+    process = StreamingProcess(
+        'sleep 30 & echo started; wait', str(tmpdir.join('.build.log')),
+        shell=True, process_group=True)
+    assert process.wait(0.2) is None
+    process.terminate()
+    assert process.wait(5) not in (None, 0)
+
+
+def test_streaming_process_start_failure(tmpdir):
+    """the log file is closed again when the command can't be started"""
+    with patch('mlt.utils.process_helpers.open', create=True) as open_mock:
+        with pytest.raises(OSError):
+            StreamingProcess(['/nonexistent/command'],
+                             str(tmpdir.join('.build.log')))
+    open_mock.return_value.close.assert_called_once_with()
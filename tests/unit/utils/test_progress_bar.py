@@ -20,54 +20,61 @@
 
 from mock import patch, MagicMock
 
-from mlt.utils.progress_bar import duration_progress
+from mlt.utils.progress_bar import process_progress
 
 
+def _process(running_frames):
+    """a process that is still running for `running_frames` waits"""
+    return MagicMock(wait=MagicMock(
+        side_effect=[None] * running_frames + [0]))
+
+
+@patch('mlt.utils.progress_bar.time')
 @patch('mlt.utils.progress_bar.progressbar')
-def test_duration_progress_not_done(progressbar):
-    """We have a duration of 1 and then we aren't done once
-       and then we finish, which means bar.next() is called twice inside
-       of the for loop and and update happens once as we're done early
+def test_process_progress_duration(progressbar, time):
+    """We have a previous duration of 10s and finish after 2 frames,
+       so we get an ETA bar that gets completed once the process exits
     """
-    duration_progress('activity', 1, MagicMock(
-        side_effect=[False, True, True]))
+    time.time.side_effect = [0, 1, 2]
+    process = _process(2)
+    process_progress('activity', 10, process)
 
-    progressbar_obj = progressbar.ProgressBar.return_value.return_value
-    assert progressbar_obj.next.call_count == 2
-    assert progressbar_obj.update.call_count == 1
+    bar = progressbar.ProgressBar.return_value
+    assert progressbar.ProgressBar.call_args[1]['max_value'] == 100
+    assert [c[0][0] for c in bar.update.call_args_list] == [10, 20, 100]
+    bar.finish.assert_called_once()
+    # we block on the process between frames rather than spinning
+    assert all(c[0][0] > 0 for c in process.wait.call_args_list)
 
 
+@patch('mlt.utils.progress_bar.time')
 @patch('mlt.utils.progress_bar.progressbar')
-def test_duration_progress_duration_done(progressbar):
-    """We have a duration of 1 but then terminate immediately
-       So we have a bar.next() call, then we update as we're done early
-       and then `if not is_done()` is not called so func terminates
-    """
-    duration_progress('activity', 1, lambda: True)
+def test_process_progress_duration_exceeded(progressbar, time):
+    """We're past the previous duration, so we fall back to a spinner"""
+    time.time.side_effect = [0, 11, 12]
+    bar = progressbar.ProgressBar.return_value
+    bar.max_value = progressbar.UnknownLength
+    process_progress('activity', 10, _process(2))
 
-    progressbar_obj = progressbar.ProgressBar.return_value.return_value
-    assert progressbar_obj.next.call_count == 1
-    assert progressbar_obj.update.call_count == 1
+    assert progressbar.ProgressBar.call_args[1]['max_value'] is \
+        progressbar.UnknownLength
+    assert [c[0][0] for c in bar.update.call_args_list] == [0, 1]
 
 
+@patch('mlt.utils.progress_bar.time')
 @patch('mlt.utils.progress_bar.progressbar')
-def test_duration_progress_no_duration_not_done(progressbar):
-    """We have no duration, then we aren't done yet, then we enter the while
-       loop for one iteration to update the bar and then terminate
-    """
-    duration_progress('activity', None, MagicMock(
-        side_effect=[False, False, False, True]))
+def test_process_progress_real_progress(progressbar, time):
+    """Real progress wins over the duration estimate"""
+    time.time.side_effect = [0, 1, 2]
+    progress = MagicMock(side_effect=[(1, 4), (3, 4)])
+    process_progress('activity', 10, _process(2), progress)
 
-    progressbar_obj = progressbar.ProgressBar.return_value.return_value
-    progressbar_obj.next.assert_not_called()
-    progressbar_obj.update.call_count == 3
+    bar = progressbar.ProgressBar.return_value
+    assert [c[0][0] for c in bar.update.call_args_list] == [25, 75, 100]
 
 
 @patch('mlt.utils.progress_bar.progressbar')
-def test_duration_progress_no_duration_done(progressbar):
-    """Duration is None and we are done so nothing is called in the func"""
-    duration_progress('activity', None, lambda: True)
-
-    progressbar_obj = progressbar.ProgressBar.return_value.return_value
-    progressbar_obj.next.assert_not_called()
-    progressbar_obj.update.assert_not_called()
+def test_process_progress_done(progressbar):
+    """Process is already done so no bar is drawn"""
+    process_progress('activity', 10, _process(0))
+    progressbar.ProgressBar.assert_not_called()
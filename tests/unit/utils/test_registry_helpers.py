@@ -0,0 +1,176 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import base64
+import json
+import pytest
+import socket
+from mock import MagicMock, patch
+
+from mlt.utils.registry_helpers import (_allows_http, has_image,
+                                        parse_image_name, push_auth,
+                                        remote_config_digest)
+from test_utils.fake_server import FakeServer
+
+MANIFEST = {
+    'schemaVersion': 2,
+    'mediaType': 'application/vnd.docker.distribution.manifest.v2+json',
+    'config': {'digest': 'sha256:abc123'},
+    'layers': [],
+}
+
+
+@pytest.mark.parametrize('name,parsed', [
+    ('localhost:5000/app:1234', ('localhost:5000', 'app', '1234')),
+    ('gcr.io/project/app:1234', ('gcr.io', 'project/app', '1234')),
+    ('user/app:1234', ('registry-1.docker.io', 'user/app', '1234')),
+    ('app', ('registry-1.docker.io', 'library/app', 'latest')),
+])
+def test_parse_image_name(name, parsed):
+    assert parse_image_name(name) == parsed
+
+
+def test_remote_config_digest():
+    """plain http registries, like registry:2, work after https fails"""
+    with FakeServer({('GET', '/v2/team/app/manifests/1234'):
+                     (200, MANIFEST)}) as server:
+        host = server.url[len('http://'):]
+        assert remote_config_digest(host + '/team/app:1234') == \
+            'sha256:abc123'
+        assert remote_config_digest(host + '/team/app:5678') is None
+    assert 'manifest.v2+json' in server.requests[0]['headers']['Accept']
+
+
+def test_remote_config_digest_token(tmpdir, monkeypatch):
+    """a registry asking for a bearer token gets one from its token
+       service; the stored docker login only goes to it over https
+    """
+    auth = base64.b64encode(b'user:secret').decode('ascii')
+
+    def manifest(request):
+        if request['headers'].get('Authorization') == 'Bearer t0k3n':
+            return 200, MANIFEST
+        return 401, {}, {'WWW-Authenticate': (
+            'Bearer realm="{}/token",service="registry"'.format(
+                server.url))}
+
+    with FakeServer({}) as server:
+        host = server.url[len('http://'):]
+        server.routes[('GET', '/v2/app/manifests/1')] = manifest
+        server.routes[('GET', '/token')] = (200, {'token': 't0k3n'})
+        tmpdir.join('config.json').write(json.dumps(
+            {'auths': {host: {'auth': auth}}}))
+        monkeypatch.setenv('DOCKER_CONFIG', str(tmpdir))
+        assert remote_config_digest(host + '/app:1') == 'sha256:abc123'
+
+    token_request = [r for r in server.requests if r['path'] == '/token'][0]
+    assert token_request['url'] == \
+        '/token?scope=repository%3Aapp%3Apull&service=registry'
+    assert 'Authorization' not in token_request['headers']
+
+
+def test_remote_config_digest_no_token(monkeypatch):
+    """a token service that answers without a token gets us nowhere"""
+    with FakeServer({}) as server:
+        host = server.url[len('http://'):]
+        server.routes[('GET', '/v2/app/manifests/1')] = (
+            401, {}, {'WWW-Authenticate': 'Bearer realm="{}/token"'.format(
+                server.url)})
+        server.routes[('GET', '/token')] = (200, {'expires_in': 60})
+        assert remote_config_digest(host + '/app:1') is None
+
+
+def test_remote_config_digest_basic_over_http(tmpdir, monkeypatch):
+    """the docker login is never sent over plain http"""
+    auth = base64.b64encode(b'user:secret').decode('ascii')
+    with FakeServer({}) as server:
+        host = server.url[len('http://'):]
+        server.routes[('GET', '/v2/app/manifests/1')] = (
+            401, {}, {'WWW-Authenticate': 'Basic realm="registry"'})
+        tmpdir.join('config.json').write(json.dumps(
+            {'auths': {host: {'auth': auth}}}))
+        monkeypatch.setenv('DOCKER_CONFIG', str(tmpdir))
+        assert remote_config_digest(host + '/app:1') is None
+    assert all('Authorization' not in r['headers'] for r in server.requests)
+
+
+@patch('mlt.utils.registry_helpers._get')
+@patch('mlt.utils.registry_helpers.docker_helpers')
+def test_remote_config_digest_no_http_fallback(docker_helpers, get):
+    """like docker, only local and insecure registries get plain http"""
+    docker_helpers.insecure_registries.return_value = (set(), [])
+    get.side_effect = socket.error('certificate verify failed')
+    assert remote_config_digest('registry.example.com/app:1') is None
+    assert [c[0][0] for c in get.call_args_list] == ['https']
+
+    get.reset_mock()
+    docker_helpers.insecure_registries.return_value = (
+        {'registry.example.com:5000'}, [])
+    assert remote_config_digest('registry.example.com:5000/app:1') is None
+    assert [c[0][0] for c in get.call_args_list] == ['https', 'http']
+
+
+@patch('mlt.utils.registry_helpers.socket.gethostbyname',
+       MagicMock(return_value='10.0.3.7'))
+@patch('mlt.utils.registry_helpers.docker_helpers')
+def test_allows_http_cidr(docker_helpers):
+    docker_helpers.insecure_registries.return_value = (
+        set(), ['127.0.0.0/8', '10.0.0.0/16'])
+    assert _allows_http('registry.internal:5000')
+    docker_helpers.insecure_registries.return_value = (set(), ['10.1.0.0/16'])
+    assert not _allows_http('registry.internal:5000')
+    assert _allows_http('localhost:5000')
+
+
+def test_remote_config_digest_unreachable():
+    with FakeServer({}) as server:
+        host = server.url[len('http://'):]
+    assert remote_config_digest(host + '/app:1') is None
+
+
+@patch('mlt.utils.registry_helpers.remote_config_digest')
+@patch('mlt.utils.registry_helpers.docker_helpers')
+def test_has_image(docker_helpers, remote_config_digest):
+    remote_config_digest.return_value = 'sha256:abc123'
+    docker_helpers.image_id.return_value = 'sha256:abc123'
+    assert has_image('registry/app:1', 'app:1')
+
+    docker_helpers.image_id.return_value = 'sha256:def456'
+    assert not has_image('registry/app:1', 'app:1')
+
+    docker_helpers.image_id.return_value = None
+    assert not has_image('registry/app:1', 'app:1')
+
+
+def test_push_auth(tmpdir, monkeypatch):
+    monkeypatch.setenv('DOCKER_CONFIG', str(tmpdir))
+    auth = base64.b64encode(b'user:secret').decode('ascii')
+    tmpdir.join('config.json').write(json.dumps(
+        {'auths': {'localhost:5000': {'auth': auth}},
+         'credHelpers': {'gcr.io': 'gcloud'}}))
+
+    decoded = json.loads(base64.urlsafe_b64decode(
+        push_auth('localhost:5000/app:1').encode('ascii')).decode('utf-8'))
+    assert decoded == {'username': 'user', 'password': 'secret',
+                       'serveraddress': 'localhost:5000'}
+    assert base64.urlsafe_b64decode(
+        push_auth('registry.local/app:1').encode('ascii')) == b'{}'
+    # only the docker cli can run credential helpers
+    assert push_auth('gcr.io/project/app:1') is None
@@ -0,0 +1,119 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import json
+import threading
+
+from mlt.utils.state_helpers import (load_state, ProjectState, QUEUED,
+                                     SUBMITTED)
+
+
+def test_record_and_reopen(tmpdir):
+    path = str(tmpdir.join('.mlt.db'))
+    state = ProjectState(path)
+    assert state.last_build() is None
+    assert state.expected_duration('build') is None
+
+    state.record_build('app:1', 10.0, image_id='sha256:1')
+    state.record_push('app:1', 'registry/app:1', 4.0, digest='sha256:2')
+    state.record_deploy('registry/app:1', 'run-1', 'ns', 2.0)
+    assert state.last_build()['image'] == 'app:1'
+
+    reopened = ProjectState(path)
+    for kind in ('build', 'push', 'deploy'):
+        assert reopened._latest[kind] == state._latest[kind]
+    assert reopened.last_push()['digest'] == 'sha256:2'
+    assert reopened.last_deploy()['run_id'] == 'run-1'
+
+
+def test_expected_duration(tmpdir):
+    """the median of recent runs; skipped steps don't count"""
+    state = ProjectState(str(tmpdir.join('.mlt.db')))
+    for duration in (10.0, 12.0, 100.0):
+        state.record_build('app:1', duration)
+    state.record_build('app:2')
+    assert state.last_build()['duration'] is None
+    assert state.expected_duration('build') == 12.0
+    assert ProjectState(state.path).expected_duration('build') == 12.0
+
+
+def test_concurrent_records(tmpdir):
+    """separate mlt processes, and the threads of watch mode, can all
+       record into the same project
+    """
+    path = str(tmpdir.join('.mlt.db'))
+    states = [ProjectState(path) for _ in range(4)]
+
+    def record(state):
+        for i in range(25):
+            state.record_build('app:{}'.format(i), 1.0)
+
+    threads = [threading.Thread(target=record, args=(state,))
+               for state in states]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    count = states[0]._connection.execute(
+        'SELECT COUNT(*) FROM builds').fetchone()[0]
+    assert count == 100
+
+
+def test_imports_json_files(tmpdir):
+    tmpdir.join('.build.json').write(json.dumps(
+        {'last_container': 'app:1', 'last_build_duration': 10.0}))
+    tmpdir.join('.push.json').write(json.dumps(
+        {'last_remote_container': 'registry/app:1',
+         'last_push_duration': 4.0}))
+    state = ProjectState(str(tmpdir.join('.mlt.db')))
+    assert state.last_build()['image'] == 'app:1'
+    assert state.last_push()['remote_image'] == 'registry/app:1'
+    assert state.expected_duration('push') == 4.0
+
+
+def test_load_state_once(tmpdir):
+    path = str(tmpdir.join('.mlt.db'))
+    assert load_state(path) is load_state(path)
+
+
+def test_record_deploys(tmpdir):
+    """the runs of a sweep go in together"""
+    state = ProjectState(str(tmpdir.join('.mlt.db')))
+    state.record_deploys('registry/app:1', ['run-1', 'run-2'], 'ns', 3.0)
+    assert state.last_deploy()['run_id'] == 'run-2'
+    assert ProjectState(state.path)._connection.execute(
+        'SELECT COUNT(*) FROM deploys').fetchone()[0] == 2
+
+
+def test_queue(tmpdir):
+    """runs come out of the queue in the order they went in"""
+    state = ProjectState(str(tmpdir.join('.mlt.db')))
+    demand = {'cpu': 1.0, 'memory': 0.0, 'nvidia.com/gpu': 0.0, 'pods': 1.0}
+    state.enqueue('registry/app:1', 'ns',
+                  [('run-1', [{'kind': 'Job'}], demand),
+                   ('run-2', [{'kind': 'Job'}], demand)])
+    state.set_run_status('run-1', SUBMITTED)
+
+    waiting = ProjectState(state.path).queued_runs([QUEUED])
+    assert [run['run_id'] for run in waiting] == ['run-2']
+    assert waiting[0]['objects'] == [{'kind': 'Job'}]
+    assert waiting[0]['demand'] == demand
+    assert state.clear_queue() == 1
+    assert [run['run_id'] for run in state.queued_runs()] == ['run-1']
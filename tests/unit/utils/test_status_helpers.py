@@ -0,0 +1,172 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import calendar
+import time
+
+from mlt.utils.status_helpers import format_age, object_state, RunStatus
+
+NOW = calendar.timegm(time.strptime('2018-04-10T12:00:00Z',
+                                    '%Y-%m-%dT%H:%M:%SZ'))
+
+
+def _pod(name, run_id, phase, replica=None, owner=('TFJob', 'app-1234')):
+    labels = {'mlt-app-name': 'app', 'mlt-run-id': run_id}
+    if replica:
+        labels['tf-replica-type'] = replica
+    return {'metadata': {'name': name, 'labels': labels,
+                         'creationTimestamp': '2018-04-10T11:58:00Z',
+                         'ownerReferences': [{'kind': owner[0],
+                                              'name': owner[1]}]},
+            'status': {'phase': phase}}
+
+
+# what a watch on the pods of a distributed TFJob run sent, in order
+TFJOB_EVENTS = [
+    {'type': 'SYNC', 'items': []},
+    {'type': 'ADDED', 'object': _pod('app-1234-ps-0', 'run-1', 'Pending',
+                                     'PS')},
+    {'type': 'ADDED', 'object': _pod('app-1234-worker-0', 'run-1', 'Pending',
+                                     'Worker')},
+    {'type': 'ADDED', 'object': _pod('app-1234-worker-1', 'run-1', 'Pending',
+                                     'Worker')},
+    {'type': 'MODIFIED', 'object': _pod('app-1234-ps-0', 'run-1',
+                                        'Running', 'PS')},
+    {'type': 'MODIFIED', 'object': _pod('app-1234-worker-0', 'run-1',
+                                        'Running', 'Worker')},
+    {'type': 'MODIFIED', 'object': _pod('app-1234-worker-0', 'run-1',
+                                        'Running', 'Worker')},
+]
+
+
+def test_tfjob_run():
+    status = RunStatus()
+    status.apply({'type': 'SYNC', 'items': [{'metadata': {
+        'name': 'app-1234', 'labels': {'mlt-run-id': 'run-1'},
+        'creationTimestamp': '2018-04-10T11:57:30Z'}, 'status': {}}]},
+        'kubeflow.org/v1alpha2', 'TFJob')
+    changes = [status.apply(event) for event in TFJOB_EVENTS]
+
+    # the repeated event doesn't change anything
+    assert changes == [False, True, True, True, True, True, False]
+    assert status.rows(NOW) == [
+        ['run-1', 'TFJob', 'Running',
+         'ps: 1 Running, worker: 1 Running 1 Pending', '2m']]
+
+    for name in ('app-1234-ps-0', 'app-1234-worker-0', 'app-1234-worker-1'):
+        status.apply({'type': 'MODIFIED', 'object': _pod(
+            name, 'run-1', 'Succeeded', name.split('-')[2].upper())})
+    assert status.rows(NOW)[0][2:4] == [
+        'Succeeded', 'ps: 1 Succeeded, worker: 2 Succeeded']
+
+
+def _job(event_type, active=0, conditions=()):
+    return {'type': event_type, 'object': {
+        'apiVersion': 'batch/v1', 'kind': 'Job',
+        'metadata': {'name': 'app-5678', 'labels': {'mlt-run-id': 'run-2'},
+                     'creationTimestamp': '2018-04-10T11:57:50Z'},
+        'status': {'active': active, 'conditions': [
+            {'type': condition, 'status': 'True'}
+            for condition in conditions]}}}
+
+
+# what watches on the jobs and on the pods of the app sent, in order, for
+# a job submitted after `mlt status --watch` started, that completed and
+# had its pod cleaned up
+JOB_EVENTS = [
+    ('Job', {'type': 'SYNC', 'items': []}),
+    ('Pod', {'type': 'SYNC', 'items': []}),
+    ('Job', _job('ADDED')),
+    ('Pod', {'type': 'ADDED', 'object': _pod(
+        'app-5678-abcde', 'run-2', 'Pending', owner=('Job', 'app-5678'))}),
+    ('Job', _job('MODIFIED', active=1)),
+    ('Pod', {'type': 'MODIFIED', 'object': _pod(
+        'app-5678-abcde', 'run-2', 'Running', owner=('Job', 'app-5678'))}),
+    ('Pod', {'type': 'MODIFIED', 'object': _pod(
+        'app-5678-abcde', 'run-2', 'Succeeded', owner=('Job', 'app-5678'))}),
+    ('Job', _job('MODIFIED', conditions=['Complete'])),
+    ('Pod', {'type': 'DELETED', 'object': _pod(
+        'app-5678-abcde', 'run-2', 'Succeeded', owner=('Job', 'app-5678'))}),
+]
+
+
+def test_job_completes_after_start():
+    """the job's own state is followed too, so it stays done once its
+       pods are gone
+    """
+    status = RunStatus()
+    for kind, event in JOB_EVENTS[:6]:
+        status.apply(event, 'batch/v1' if kind == 'Job' else 'v1', kind)
+    assert status.rows(NOW) == [
+        ['run-2', 'Job', 'Running', 'job: 1 Running', '2m']]
+
+    for kind, event in JOB_EVENTS[6:]:
+        status.apply(event, 'batch/v1' if kind == 'Job' else 'v1', kind)
+    assert status.rows(NOW) == [['run-2', 'Job', 'Succeeded', '-', '2m']]
+
+    # and the run goes with its job
+    assert status.apply(_job('DELETED'), 'batch/v1', 'Job')
+    assert status.rows(NOW) == []
+
+
+def test_sync_per_kind():
+    """a sync of one kind doesn't drop the objects of another"""
+    status = RunStatus()
+    status.apply({'type': 'SYNC', 'items': [_job('ADDED')['object']]},
+                 'batch/v1', 'Job')
+    assert not status.apply({'type': 'SYNC', 'items': []},
+                            'kubeflow.org/v1alpha1', 'TFJob')
+    assert [row[0] for row in status.rows(NOW)] == ['run-2']
+
+
+def test_runs_newest_first():
+    """runs show up from their pods too, and go when their pods do"""
+    status = RunStatus()
+    old = _pod('app-1-abcde', 'run-1', 'Failed', owner=('Job', 'app-1'))
+    new = _pod('app-2-abcde', 'run-2', 'Running', owner=('Job', 'app-2'))
+    new['metadata']['creationTimestamp'] = '2018-04-10T11:59:15Z'
+    status.apply({'type': 'SYNC', 'items': [old, new]})
+    assert status.rows(NOW) == [
+        ['run-2', 'Job', 'Running', 'job: 1 Running', '45s'],
+        ['run-1', 'Job', 'Failed', 'job: 1 Failed', '2m']]
+
+    assert status.apply({'type': 'DELETED', 'object': old})
+    assert [row[0] for row in status.rows(NOW)] == ['run-2']
+    # pods that are gone by the next sync are dropped
+    assert status.apply({'type': 'SYNC', 'items': []})
+    assert status.rows(NOW) == []
+
+
+def test_object_state():
+    job = {'kind': 'Job', 'status': {'active': 1}}
+    assert object_state(job) == 'Running'
+    job['status']['conditions'] = [{'type': 'Complete', 'status': 'True'}]
+    assert object_state(job) == 'Succeeded'
+    assert object_state({'kind': 'TFJob', 'status': {
+        'phase': 'Done', 'state': 'Failed'}}) == 'Failed'
+    assert object_state({'kind': 'TFJob', 'status': {'conditions': [
+        {'type': 'Created', 'status': 'True'},
+        {'type': 'Running', 'status': 'True'}]}}) == 'Running'
+
+
+def test_format_age():
+    assert format_age('2018-04-08T11:00:00Z', NOW) == '2d'
+    assert format_age('2018-04-10T09:00:00Z', NOW) == '3h'
+    assert format_age(None, NOW) == '-'
@@ -0,0 +1,83 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import json
+import pytest
+
+from mlt.utils.sweep_helpers import expand_sweep, load_sweep
+
+
+def test_grid():
+    trials = expand_sweep({'grid': {'num_workers': [1, 2],
+                                    'optimizer': ['adam', 'sgd']}})
+    assert trials == [
+        {'num_workers': 1, 'optimizer': 'adam'},
+        {'num_workers': 1, 'optimizer': 'sgd'},
+        {'num_workers': 2, 'optimizer': 'adam'},
+        {'num_workers': 2, 'optimizer': 'sgd'}]
+
+
+def test_random_search():
+    spec = {'random': {'samples': 50, 'seed': 7, 'parameters': {
+        'learning_rate': {'min': 0.0001, 'max': 0.1, 'scale': 'log'},
+        'batch_size': {'min': 16, 'max': 128},
+        'optimizer': ['adam', 'sgd']}}}
+    trials = expand_sweep(spec)
+    assert len(trials) == 50
+    # a seed makes the search repeatable
+    assert trials == expand_sweep(spec)
+    for trial in trials:
+        assert 0.0001 <= trial['learning_rate'] <= 0.1
+        assert isinstance(trial['batch_size'], int)
+        assert trial['optimizer'] in ('adam', 'sgd')
+    # log scale: about half the samples fall below the geometric middle
+    assert 10 < sum(t['learning_rate'] < 0.0032 for t in trials) < 40
+
+
+def test_grid_and_random():
+    trials = expand_sweep({
+        'grid': {'num_workers': [1, 2, 4]},
+        'random': {'samples': 5, 'parameters': {'dropout': {'min': 0.0,
+                                                            'max': 0.5}}}})
+    assert len(trials) == 15
+    assert [t['num_workers'] for t in trials[:6]] == [1] * 5 + [2]
+
+
+@pytest.mark.parametrize('spec', [
+    {},
+    {'grid': {'num_workers': []}},
+    {'random': {'parameters': {'dropout': [0.1]}}},
+    {'random': {'samples': 2, 'parameters': {'dropout': {'min': 0.1}}}},
+    {'random': {'samples': 2, 'parameters': {
+        'learning_rate': {'min': 0, 'max': 1, 'scale': 'log'}}}},
+])
+def test_invalid_sweeps(spec):
+    with pytest.raises(ValueError):
+        expand_sweep(spec)
+
+
+def test_load_sweep(tmpdir):
+    sweep = tmpdir.join('sweep.json')
+    sweep.write(json.dumps({'grid': {'greeting': ['hi', 'hello']}}))
+    assert len(load_sweep(str(sweep))) == 2
+
+    sweep.write('{"grid": ')
+    with pytest.raises(ValueError):
+        load_sweep(str(sweep))
@@ -0,0 +1,114 @@
+#
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# SPDX-License-Identifier: EPL-2.0
+#
+
+import fcntl
+import glob
+import json
+import os
+import pytest
+from mock import patch
+from subprocess import check_call
+
+from mlt.utils import git_helpers
+
+from mlt.utils.template_helpers import template_catalog
+from test_utils.files import commit_file
+from test_utils.io import catch_stdout
+
+
+def test_template_catalog(tmpdir):
+    repo = str(tmpdir.join('repo'))
+    check_call(['git', 'init', '-q', repo])
+    commit_file(repo, 'mlt-templates/__init__.py', '')
+    commit_file(repo, 'mlt-templates/tf-dist/README.md',
+                '# TF\n\nDistributed TensorFlow.\nMore text\n')
+    commit_file(repo, 'mlt-templates/tf-dist/parameters.json', json.dumps(
+        {'template_parameters': [{'name': 'num_ps', 'value': '1'}]}))
+    commit_file(repo, 'mlt-templates/tf-dist/crd-requirements.txt',
+                'tfjobs.kubeflow.org\n')
+    commit_file(repo, 'mlt-templates/bare/main.py', '')
+    commit_file(repo, 'mlt-templates/plain/README.md', '# Plain\n')
+
+    # only directories with a README are templates
+    catalog = template_catalog(repo)
+    assert [t['name'] for t in catalog] == ['plain', 'tf-dist']
+    plain, tf_dist = catalog
+    assert plain['description'] == '<none>'
+    assert plain['parameters'] == [] and plain['crds'] == []
+    assert tf_dist['description'] == 'Distributed TensorFlow.'
+    assert tf_dist['parameters'] == [{'name': 'num_ps', 'value': '1'}]
+    assert tf_dist['crds'] == ['tfjobs.kubeflow.org']
+
+    # the same revision is served from the stored catalog
+    with patch('mlt.utils.template_helpers._build_catalog') as build:
+        assert template_catalog(repo) == catalog
+    build.assert_not_called()
+
+    # a new revision gets a new catalog
+    commit_file(repo, 'mlt-templates/bare/README.md', 'Bare template.')
+    catalog = template_catalog(repo)
+    assert [t['name'] for t in catalog] == ['bare', 'plain', 'tf-dist']
+    assert catalog[0]['description'] == 'Bare template.'
+
+
+def test_template_catalog_bad_parameters(tmpdir):
+    """a template with a broken parameters.json is still listed, without
+       parameters
+    """
+    repo = str(tmpdir.join('repo'))
+    check_call(['git', 'init', '-q', repo])
+    commit_file(repo, 'mlt-templates/broken/README.md', 'Broken template.')
+    commit_file(repo, 'mlt-templates/broken/parameters.json', '{"a": ')
+
+    with catch_stdout() as caught_output:
+        catalog = template_catalog(repo)
+        output = caught_output.getvalue()
+    assert [(t['name'], t['parameters']) for t in catalog] == \
+        [('broken', [])]
+    assert 'Ignoring the parameters of template broken' in output
+
+
+def test_template_catalog_cleanup_locked(tmpdir):
+    """old catalogs are removed under the mirror lock, so overlapping runs
+       on a new revision don't both try to remove them
+    """
+    repo = str(tmpdir.join('repo'))
+    check_call(['git', 'init', '-q', repo])
+    commit_file(repo, 'mlt-templates/bare/main.py', '')
+    template_catalog(repo)
+    commit_file(repo, 'mlt-templates/bare/README.md', 'Bare template.')
+    mirror = git_helpers.mirror_repo(repo)
+    removed = []
+
+    def remove(path):
+        fd = os.open(mirror + '.lock', os.O_RDWR)
+        try:
+            with pytest.raises(IOError):
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        finally:
+            os.close(fd)
+        removed.append(path)
+        os_remove(path)
+
+    os_remove = os.remove
+    with patch('mlt.utils.template_helpers.os.remove', remove):
+        template_catalog(repo)
+    assert len(removed) == 1
+    assert len(glob.glob(os.path.join(mirror, 'mlt-catalog-*.json'))) == 1